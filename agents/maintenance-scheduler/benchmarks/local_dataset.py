@@ -0,0 +1,204 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+  Synthetic bus_stop_image_processing dataset in SQLite, with the tables the
+  agent tools query: bus_stops, image_reports, incidents and
+  ridership_forecasts.
+"""
+
+import datetime
+import json
+import sqlite3
+from dataclasses import dataclass
+from typing import ContextManager, List
+from unittest import mock
+
+import numpy as np
+
+from benchmarks.sqlite_executor import SQLiteQueryExecutor
+from maintenance_scheduler.shared_libraries.ridership_simulator import \
+    simulate_ridership
+from maintenance_scheduler.tools import tools
+from maintenance_scheduler.tools.forecast_cache import ForecastCache
+from maintenance_scheduler.tools.forecasting import create_forecasting_backend
+
+SCHEMA = """
+CREATE TABLE bus_stops (
+    bus_stop_id TEXT PRIMARY KEY,
+    address TEXT NOT NULL
+);
+CREATE TABLE image_reports (
+    report_id TEXT PRIMARY KEY,
+    bus_stop_id TEXT NOT NULL,
+    uri TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    description TEXT,
+    safety_level INTEGER,
+    cleanliness_level INTEGER
+);
+CREATE TABLE incidents (
+    incident_id TEXT PRIMARY KEY,
+    bus_stop_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    open_report_id TEXT,
+    maintenance_details TEXT
+);
+CREATE INDEX incidents_by_status ON incidents (status, incident_id);
+CREATE INDEX incidents_by_bus_stop ON incidents (bus_stop_id, status);
+CREATE TABLE ridership_forecasts (
+    forecast_run_ts INTEGER NOT NULL,
+    bus_stop_id TEXT NOT NULL,
+    forecast_timestamp INTEGER NOT NULL,
+    expected_number_of_passengers INTEGER NOT NULL
+);
+CREATE INDEX forecasts_by_bus_stop
+    ON ridership_forecasts (bus_stop_id, forecast_run_ts, forecast_timestamp);
+"""
+
+STRUCT_COLUMNS = ("address", "maintenance_details")
+TIMESTAMP_COLUMNS = ("forecast_run_ts", "forecast_timestamp")
+
+CITIES = [("New York", "NY", "100"), ("Buffalo", "NY", "142"),
+          ("Newark", "NJ", "071"), ("Stamford", "CT", "069")]
+DESCRIPTIONS = [
+    "Broken glass on the ground next to the bench.",
+    "Litter around the bus stop and a damaged bench.",
+    "Graffiti on the shelter walls. The trash can is overflowing.",
+    "The bus stop is covered with fallen leaves and some litter.",
+]
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+@dataclass
+class LocalDataset:
+    """Seeded database and the ids the benchmarks use."""
+    connection: sqlite3.Connection
+    # Bus stops with an open incident
+    incident_bus_stop_ids: List[str]
+    # Bus stops with a materialized ridership forecast
+    forecast_bus_stop_ids: List[str]
+    zip_codes: List[str]
+
+    def executor(self) -> SQLiteQueryExecutor:
+        return SQLiteQueryExecutor(self.connection,
+                                   struct_columns=STRUCT_COLUMNS,
+                                   timestamp_columns=TIMESTAMP_COLUMNS)
+
+    def patch_tools(self, executor: SQLiteQueryExecutor) -> ContextManager:
+        """
+          Patches the tools module so that the tools query the dataset
+          through the executor, read its materialized forecasts and start
+          with an empty forecast cache.
+        """
+        return mock.patch.multiple(
+            tools,
+            bigquery_executor=executor,
+            forecasting_backend=create_forecasting_backend(
+                "bigquery", executor=executor,
+                ridership_table="bus_ridership",
+                forecasts_table="ridership_forecasts"),
+            forecast_cache=ForecastCache(
+                ttl_secs=tools.config.forecast_cache_ttl_secs,
+                max_bus_stops=tools.config.forecast_cache_max_bus_stops))
+
+    def reopen_incidents(self, bus_stop_ids: List[str]) -> None:
+        """Reverts the scheduling of the incidents of the bus stops."""
+        self.connection.executemany(
+            "UPDATE incidents SET status = 'OPEN', maintenance_details = NULL "
+            "WHERE bus_stop_id = ?",
+            [(bus_stop_id,) for bus_stop_id in bus_stop_ids])
+        self.connection.commit()
+
+
+def create_dataset(num_bus_stops: int,
+                   incident_ratio: float = .1,
+                   max_forecast_bus_stops: int = 2000,
+                   forecast_interval_minutes: int = 15,
+                   path: str = ":memory:",
+                   seed: int = 0) -> LocalDataset:
+    """
+      Creates and seeds the dataset.
+
+      Args:
+          num_bus_stops: number of bus stops
+          incident_ratio: share of the bus stops with an open incident
+          max_forecast_bus_stops: maximum number of bus stops with incidents
+            which get a materialized three day ridership forecast
+          forecast_interval_minutes: minutes between the forecast points
+          path: SQLite database file, in memory by default
+          seed: seed of the random generator
+    """
+    rng = np.random.default_rng(seed)
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.executescript(SCHEMA)
+
+    bus_stop_ids = [f"stop-{i}" for i in range(1, num_bus_stops + 1)]
+    cities = rng.integers(0, len(CITIES), num_bus_stops)
+    zip_suffixes = rng.integers(0, 100, num_bus_stops)
+    zip_codes = [f"{CITIES[city][2]}{suffix:02d}"
+                 for city, suffix in zip(cities.tolist(),
+                                         zip_suffixes.tolist())]
+    connection.executemany("INSERT INTO bus_stops VALUES (?, ?)", (
+        (bus_stop_id, json.dumps({
+            "street": f"{i} Main Street", "city": CITIES[city][0],
+            "state": CITIES[city][1], "zip": zip_code}))
+        for i, (bus_stop_id, city, zip_code)
+        in enumerate(zip(bus_stop_ids, cities.tolist(), zip_codes))))
+
+    num_incidents = max(1, int(num_bus_stops * incident_ratio))
+    incident_stops = rng.choice(num_bus_stops, num_incidents, replace=False)
+    incident_ids = [f"{value:016x}" for value in
+                    rng.integers(0, 2 ** 63, num_incidents).tolist()]
+    safety_levels = rng.integers(1, 4, num_incidents).tolist()
+    descriptions = rng.integers(0, len(DESCRIPTIONS), num_incidents).tolist()
+    connection.executemany(
+        "INSERT INTO image_reports VALUES (?, ?, ?, ?, ?, ?, ?)", (
+            (f"report-{incident_id}", bus_stop_ids[stop],
+             f"gs://bus-stop-images/images/{incident_id}.jpg",
+             "image/jpeg", DESCRIPTIONS[description], safety_level, 1)
+            for incident_id, stop, safety_level, description
+            in zip(incident_ids, incident_stops.tolist(), safety_levels,
+                   descriptions)))
+    connection.executemany(
+        "INSERT INTO incidents VALUES (?, ?, 'OPEN', ?, NULL)", (
+            (incident_id, bus_stop_ids[stop], f"report-{incident_id}")
+            for incident_id, stop in zip(incident_ids,
+                                         incident_stops.tolist())))
+
+    incident_bus_stop_ids = [bus_stop_ids[stop]
+                             for stop in incident_stops.tolist()]
+    forecast_bus_stop_ids = incident_bus_stop_ids[:max_forecast_bus_stops]
+    now = datetime.datetime.now(datetime.timezone.utc)
+    start = now.replace(minute=0, second=0, microsecond=0)
+    run_micros = (now - _EPOCH) // _MICROSECOND - 60 * 60 * 1_000_000
+    for chunk in simulate_ridership(forecast_bus_stop_ids, start, days=3,
+                                    interval_minutes=forecast_interval_minutes,
+                                    seed=seed):
+        connection.executemany(
+            "INSERT INTO ridership_forecasts VALUES (?, ?, ?, ?)",
+            zip([run_micros] * len(chunk["bus_stop_id"]),
+                chunk["bus_stop_id"].tolist(),
+                chunk["event_ts"].astype(np.int64).tolist(),
+                chunk["num_riders"].tolist()))
+    connection.commit()
+    connection.execute("ANALYZE")
+
+    return LocalDataset(connection=connection,
+                        incident_bus_stop_ids=incident_bus_stop_ids,
+                        forecast_bus_stop_ids=forecast_bus_stop_ids,
+                        zip_codes=sorted(set(zip_codes)))
+
@@ -0,0 +1,322 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+  Local SQLite stand-in for BigQuery, used to benchmark the agent tools.
+
+  The executor translates the GoogleSQL constructs the tools use to SQLite:
+  fully qualified table names, query parameters, UNNEST of array parameters
+  and script variables, STRUCT values, timestamp arithmetic, QUALIFY, and
+  scripts with DECLARE, SET, transactions and MERGE ... WHEN MATCHED THEN
+  UPDATE. It's not a general GoogleSQL implementation.
+
+  STRUCT columns are stored as JSON text and TIMESTAMP columns as
+  microseconds since the epoch. Both are converted back in the result rows.
+"""
+
+import asyncio
+import datetime
+import json
+import re
+import sqlite3
+import threading
+from types import SimpleNamespace
+from typing import (
+    Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+)
+
+from google.cloud import bigquery
+
+from maintenance_scheduler.tools.bigquery_executor import QueryExecutor
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_INTERVAL_MICROS = {
+    "DAY": 24 * 60 * 60 * 1_000_000,
+    "HOUR": 60 * 60 * 1_000_000,
+    "MINUTE": 60 * 1_000_000,
+    "SECOND": 1_000_000,
+}
+
+
+class Row(dict):
+    """Result row with the attribute and item access of bigquery.Row."""
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self[name]
+        except KeyError as ex:
+            raise AttributeError(name) from ex
+
+
+class SQLiteQueryExecutor(QueryExecutor):
+    """
+      Runs the GoogleSQL queries of the tools against a SQLite database.
+
+      Queries run on a single connection, one at a time, on worker threads so
+      that the tools await them the same way as BigQuery queries.
+    """
+
+    def __init__(self, connection: sqlite3.Connection,
+                 struct_columns: Iterable[str] = (),
+                 timestamp_columns: Iterable[str] = (),
+                 clock: Callable[[], datetime.datetime] = lambda:
+                 datetime.datetime.now(datetime.timezone.utc)):
+        """
+          Args:
+              connection: SQLite connection, created with
+                check_same_thread=False
+              struct_columns: names of the columns holding STRUCT values
+              timestamp_columns: names of the columns holding TIMESTAMP values
+              clock: returns CURRENT_TIMESTAMP()
+        """
+        self._connection = connection
+        self._struct_columns = set(struct_columns)
+        self._timestamp_columns = set(timestamp_columns)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._table_versions: Dict[str, int] = {}
+        self.queries = 0
+        self.rows = 0
+
+    async def query(
+        self,
+        query: str,
+        query_parameters: Optional[Sequence] = None,
+        timeout_secs: Optional[float] = None,
+        row_mapper: Optional[Callable[[bigquery.Row], Any]] = None,
+        max_results: Optional[int] = None,
+        cancellable: bool = False
+    ) -> List[Any]:
+        rows = await asyncio.wait_for(
+            asyncio.to_thread(self.query_sync, query, query_parameters),
+            timeout=timeout_secs)
+        if max_results is not None:
+            rows = rows[:max_results]
+        if row_mapper is None:
+            return rows
+        return [row_mapper(row) for row in rows]
+
+    async def get_table(self, table_id: str,
+                        timeout_secs: Optional[float] = None) -> Any:
+        return SimpleNamespace(
+            table_id=table_id,
+            modified=self._table_versions.get(_table_name(table_id), 0))
+
+    def query_sync(self, query: str,
+                   query_parameters: Optional[Sequence] = None) -> List[Row]:
+        """
+          Runs a query or a script and returns the rows of its last
+          statement.
+        """
+        parameters, arrays = _to_sqlite_parameters(query_parameters or [])
+        parameters["_now"] = ((self._clock() - _EPOCH)
+                              // datetime.timedelta(microseconds=1))
+        statements = [statement.strip() for statement in query.split(";")]
+        statements = [statement for statement in statements if statement]
+
+        with self._lock:
+            self.queries += 1
+            variables = set()
+            cursor = None
+            try:
+                for statement in statements:
+                    cursor = self._execute(statement, parameters, arrays,
+                                           variables)
+                rows = self._to_rows(cursor) if cursor is not None else []
+            except BaseException:
+                if self._connection.in_transaction:
+                    self._connection.rollback()
+                raise
+            if self._connection.in_transaction:
+                self._connection.commit()
+        self.rows += len(rows)
+        return rows
+
+    def _execute(self, statement: str, parameters: Dict[str, Any],
+                 arrays: Dict[str, List[str]],
+                 variables: Set[str]) -> Optional[sqlite3.Cursor]:
+        keyword = statement.split(None, 1)[0].upper()
+        if keyword == "DECLARE":
+            name = statement.split()[1]
+            variables.add(name)
+            parameters[name] = "[]"
+            return None
+        if keyword == "BEGIN":
+            if not self._connection.in_transaction:
+                self._connection.execute("BEGIN")
+            return None
+        if keyword == "COMMIT":
+            self._connection.commit()
+            return None
+        if keyword == "SET":
+            match = re.match(r"SET\s+(\w+)\s*=\s*\((.*)\)\s*$", statement,
+                             re.DOTALL | re.IGNORECASE)
+            row = self._connection.execute(
+                translate(match.group(2), arrays, variables),
+                parameters).fetchone()
+            parameters[match.group(1)] = row[0] if row else None
+            return None
+
+        if keyword in ("UPDATE", "INSERT", "DELETE", "MERGE"):
+            target = re.match(r"\w+\s+(?:INTO\s+|FROM\s+)?(\S+)", statement,
+                              re.IGNORECASE).group(1)
+            name = _table_name(target)
+            self._table_versions[name] = self._table_versions.get(name, 0) + 1
+        return self._connection.execute(
+            translate(statement, arrays, variables), parameters)
+
+    def _to_rows(self, cursor: sqlite3.Cursor) -> List[Row]:
+        if cursor.description is None:
+            return []
+        names = [column[0] for column in cursor.description]
+        structs = [i for i, name in enumerate(names)
+                   if name in self._struct_columns]
+        timestamps = [i for i, name in enumerate(names)
+                      if name in self._timestamp_columns]
+        rows = []
+        for values in cursor.fetchall():
+            if structs or timestamps:
+                values = list(values)
+                for i in structs:
+                    if values[i] is not None:
+                        values[i] = json.loads(values[i])
+                for i in timestamps:
+                    if values[i] is not None:
+                        values[i] = _EPOCH + datetime.timedelta(
+                            microseconds=values[i])
+            rows.append(Row(zip(names, values)))
+        return rows
+
+
+def translate(statement: str, arrays: Dict[str, List[str]],
+              variables: Set[str]) -> str:
+    """
+      Translates a GoogleSQL statement to SQLite.
+
+      Args:
+          statement: GoogleSQL statement
+          arrays: field names of the STRUCT array parameters, keyed by
+            parameter name; an empty list for arrays of scalars
+          variables: names of the script variables
+    """
+    statement = statement.strip()
+    # `project.dataset.table` -> "table"
+    statement = re.sub(r"`[^`]*?\.?([\w-]+)`", r'"\1"', statement)
+    statement = re.sub(r"CURRENT_TIMESTAMP\(\)", ":_now", statement,
+                       flags=re.IGNORECASE)
+    statement = re.sub(
+        r"TIMESTAMP_(ADD|SUB)\(([^,()]+),\s*INTERVAL\s+(\S+)\s+(\w+)\)",
+        _timestamp_arithmetic, statement, flags=re.IGNORECASE)
+    statement = re.sub(r"STRUCT\(([^()]*)\)", _struct_to_json, statement,
+                       flags=re.IGNORECASE)
+    statement = re.sub(r"ARRAY_AGG\(DISTINCT\s+([^()]+)\)",
+                       r"json_group_array(DISTINCT \1)", statement,
+                       flags=re.IGNORECASE)
+
+    def unnest_variable(match):
+        return (f"(SELECT value AS {match.group(2)} "
+                f"FROM json_each(:{match.group(1)})) AS {match.group(2)}")
+
+    for variable in variables:
+        statement = re.sub(rf"UNNEST\(({variable})\)\s+AS\s+(\w+)",
+                           unnest_variable, statement, flags=re.IGNORECASE)
+
+    def unnest_parameter(match):
+        fields = arrays.get(match.group(1))
+        if not fields:
+            return f"(SELECT value FROM json_each(:{match.group(1)}))"
+        columns = ", ".join(f"json_extract(value, '$.{field}') AS {field}"
+                            for field in fields)
+        return f"(SELECT {columns} FROM json_each(:{match.group(1)}))"
+
+    statement = re.sub(r"UNNEST\(@(\w+)\)", unnest_parameter, statement,
+                       flags=re.IGNORECASE)
+    statement = re.sub(r"@(\w+)", r":\1", statement)
+    # table.struct_column.field -> json_extract(table.struct_column, '$.field')
+    statement = re.sub(r"\b(\w+\.\w+)\.(\w+)\b(?!\s*\()",
+                       _struct_field, statement)
+    statement = _merge_to_update(statement)
+    statement = _qualify_to_subquery(statement)
+    return statement
+
+
+def _table_name(table_id: str) -> str:
+    return table_id.strip('`"').split(".")[-1]
+
+
+def _timestamp_arithmetic(match: re.Match) -> str:
+    sign = "+" if match.group(1).upper() == "ADD" else "-"
+    interval = _INTERVAL_MICROS[match.group(4).upper()]
+    return f"({match.group(2)} {sign} {match.group(3)} * {interval})"
+
+
+def _struct_to_json(match: re.Match) -> str:
+    fields = []
+    for field in match.group(1).split(","):
+        value, name = re.split(r"\s+as\s+", field.strip(), flags=re.IGNORECASE)
+        fields.append(f"'{name}', {value}")
+    return f"json_object({', '.join(fields)})"
+
+
+def _struct_field(match: re.Match) -> str:
+    # Qualified columns, e.g. reports.uri, are two part names; three part
+    # names which aren't numbers are STRUCT field accesses.
+    if match.group(0).replace(".", "").isdigit():
+        return match.group(0)
+    return f"json_extract({match.group(1)}, '$.{match.group(2)}')"
+
+
+def _merge_to_update(statement: str) -> str:
+    match = re.match(
+        r"MERGE\s+(\S+)\s+AS\s+(\w+)\s+USING\s+(.*?)\s+AS\s+(\w+)\s+"
+        r"ON\s+(.*?)\s+WHEN\s+MATCHED\s+THEN\s+UPDATE\s+SET\s+(.*)$",
+        statement, re.DOTALL | re.IGNORECASE)
+    if not match:
+        return statement
+    target, target_alias, source, source_alias, condition, assignments = \
+        match.groups()
+    return (f"UPDATE {target} AS {target_alias} SET {assignments} "
+            f"FROM {source} AS {source_alias} WHERE {condition}")
+
+
+def _qualify_to_subquery(statement: str) -> str:
+    match = re.match(
+        r"SELECT\s+(.*?)\s+FROM\s+(.*?)\s+QUALIFY\s+(.*?)"
+        r"(\s+ORDER\s+BY\s+.*)?$",
+        statement, re.DOTALL | re.IGNORECASE)
+    if not match:
+        return statement
+    columns, source, condition, order_by = match.groups()
+    return (f"SELECT {columns} FROM (SELECT *, ({condition}) AS _qualify "
+            f"FROM {source}) WHERE _qualify{order_by or ''}")
+
+
+def _to_sqlite_parameters(
+    query_parameters: Sequence
+) -> Tuple[Dict[str, Any], Dict[str, List[str]]]:
+    parameters = {}
+    arrays = {}
+    for parameter in query_parameters:
+        if isinstance(parameter, bigquery.ArrayQueryParameter):
+            if parameter.array_type == "STRUCT":
+                values = [value.struct_values for value in parameter.values]
+                arrays[parameter.name] = list(
+                    parameter.values[0].struct_values) if values else []
+            else:
+                values = list(parameter.values)
+                arrays[parameter.name] = []
+            parameters[parameter.name] = json.dumps(values)
+        else:
+            parameters[parameter.name] = parameter.value
+    return parameters, arrays
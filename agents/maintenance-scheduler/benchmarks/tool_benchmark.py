@@ -0,0 +1,318 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+  Benchmarks the agent tools against a local SQLite stand-in for BigQuery.
+
+  Every tool runs against a synthetic dataset of the given number of bus
+  stops. The benchmark reports the p50 and p95 latency, the number of result
+  rows read per second and the peak Python memory of every tool, and compares
+  them with the regression thresholds.
+
+  Usage:
+      python -m benchmarks.tool_benchmark --scales 1000 100000
+      python -m benchmarks.tool_benchmark --scales 1000 --update-thresholds
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from benchmarks.local_dataset import LocalDataset, create_dataset
+from maintenance_scheduler.entities.maintenance_request import \
+    MaintenanceRequest
+from benchmarks.sqlite_executor import SQLiteQueryExecutor
+from maintenance_scheduler.tools import tools
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCALES = (1000, 100_000, 1_000_000)
+DEFAULT_THRESHOLDS_PATH = os.path.join(os.path.dirname(__file__),
+                                       "thresholds.json")
+BUS_STOPS_PER_CALL = 20
+
+# Prepares the given iteration and returns its tool call. Only the tool call
+# is timed.
+Workload = Callable[[int], Awaitable[dict]]
+
+
+@dataclass
+class BenchmarkResult:
+    """Measurements of a tool at a scale."""
+    scale: int
+    tool: str
+    iterations: int
+    errors: int
+    p50_ms: float
+    p95_ms: float
+    rows_per_sec: float
+    queries_per_call: float
+    peak_memory_mb: float
+
+
+def create_workloads(dataset: LocalDataset) -> Dict[str, Workload]:
+    """Creates the tool calls to measure, keyed by benchmark name."""
+    forecast_stops = dataset.forecast_bus_stop_ids
+    incident_stops = dataset.incident_bus_stop_ids
+    page_tokens = {"token": ""}
+
+    def stops(ids: List[str], iteration: int, count: int) -> List[str]:
+        start = iteration * count % len(ids)
+        return (ids + ids)[start:start + min(count, len(ids))]
+
+    async def next_page() -> dict:
+        # Walks through the pages like the agent does
+        result = await tools.get_unresolved_incidents(
+            page_size=50, page_token=page_tokens["token"])
+        page_tokens["token"] = result.get("next_page_token", "")
+        return result
+
+    def unresolved_incidents(iteration: int) -> Awaitable[dict]:
+        return next_page()
+
+    def unresolved_incidents_by_zip(iteration: int) -> Awaitable[dict]:
+        return tools.get_unresolved_incidents(
+            page_size=50, include_descriptions=False,
+            zip_code=dataset.zip_codes[iteration % len(dataset.zip_codes)])
+
+    def expected_number_of_passengers(iteration: int) -> Awaitable[dict]:
+        # Cold cache, so that every call reads the forecasts
+        tools.forecast_cache.invalidate()
+        return tools.get_expected_number_of_passengers(
+            stops(forecast_stops, iteration, BUS_STOPS_PER_CALL))
+
+    def expected_number_of_passengers_cached(
+        iteration: int) -> Awaitable[dict]:
+        return tools.get_expected_number_of_passengers(
+            forecast_stops[:BUS_STOPS_PER_CALL])
+
+    def maintenance_windows(iteration: int) -> Awaitable[dict]:
+        return tools.find_maintenance_windows(
+            forecast_stops[:BUS_STOPS_PER_CALL], duration_minutes=120)
+
+    def schedule_maintenance(iteration: int) -> Awaitable[dict]:
+        bus_stop_ids = stops(incident_stops, iteration, 1)
+        dataset.reopen_incidents(bus_stop_ids)
+        return tools.schedule_maintenance(
+            bus_stop_ids[0], "April 2, 2025, at 3:00 PM EST", "Broken glass",
+            "Bus stop maintenance required", "Notification content")
+
+    def schedule_maintenance_batch(iteration: int) -> Awaitable[dict]:
+        bus_stop_ids = stops(incident_stops, iteration, BUS_STOPS_PER_CALL)
+        dataset.reopen_incidents(bus_stop_ids)
+        return tools.schedule_maintenance_batch([
+            MaintenanceRequest(
+                bus_stop_id=bus_stop_id,
+                maintenance_start="April 2, 2025, at 3:00 PM EST",
+                reason="Graffiti", notification_subject="Subject",
+                notification_content="Content")
+            for bus_stop_id in bus_stop_ids])
+
+    return {
+        "get_unresolved_incidents": unresolved_incidents,
+        "get_unresolved_incidents_by_zip": unresolved_incidents_by_zip,
+        "get_expected_number_of_passengers": expected_number_of_passengers,
+        "get_expected_number_of_passengers_cached":
+            expected_number_of_passengers_cached,
+        "find_maintenance_windows": maintenance_windows,
+        "schedule_maintenance": schedule_maintenance,
+        "schedule_maintenance_batch": schedule_maintenance_batch,
+    }
+
+
+async def measure(scale: int, name: str, workload: Workload,
+                  executor: SQLiteQueryExecutor, iterations: int,
+                  warmup_iterations: int = 2,
+                  memory_iterations: int = 3) -> BenchmarkResult:
+    """
+      Runs a workload and measures it. Memory is traced in separate
+      iterations, since tracing slows down the code.
+    """
+    for iteration in range(warmup_iterations):
+        await workload(iteration)
+
+    rows_before = executor.rows
+    queries_before = executor.queries
+    latencies = []
+    errors = 0
+    for iteration in range(warmup_iterations,
+                           warmup_iterations + iterations):
+        call = workload(iteration)
+        start = time.perf_counter()
+        result = await call
+        latencies.append(time.perf_counter() - start)
+        if result.get("status") != "success":
+            errors += 1
+    rows = executor.rows - rows_before
+    queries = executor.queries - queries_before
+
+    tracemalloc.start()
+    try:
+        for iteration in range(memory_iterations):
+            await workload(warmup_iterations + iterations + iteration)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    latencies_ms = np.array(latencies) * 1000
+    return BenchmarkResult(
+        scale=scale,
+        tool=name,
+        iterations=iterations,
+        errors=errors,
+        p50_ms=round(float(np.percentile(latencies_ms, 50)), 3),
+        p95_ms=round(float(np.percentile(latencies_ms, 95)), 3),
+        rows_per_sec=round(rows / sum(latencies), 1),
+        queries_per_call=round(queries / iterations, 2),
+        peak_memory_mb=round(peak_memory / 2 ** 20, 3))
+
+
+async def run_benchmarks(scales: Sequence[int], iterations: int,
+                         tool_names: Optional[Sequence[str]] = None
+                         ) -> List[BenchmarkResult]:
+    """Seeds a dataset of every scale and measures the tools against it."""
+    tools.config.mock_tools = False
+    results = []
+    for scale in scales:
+        start = time.perf_counter()
+        dataset = create_dataset(scale)
+        logger.info("Seeded %d bus stops in %.1fs", scale,
+                    time.perf_counter() - start)
+        executor = dataset.executor()
+        with dataset.patch_tools(executor):
+            for name, workload in create_workloads(dataset).items():
+                if tool_names and name not in tool_names:
+                    continue
+                results.append(await measure(scale, name, workload, executor,
+                                             iterations))
+                logger.info("%s", results[-1])
+        dataset.connection.close()
+    return results
+
+
+def check_thresholds(results: Sequence[BenchmarkResult],
+                     thresholds: Dict[str, Dict[str, Dict[str, float]]]
+                     ) -> List[str]:
+    """
+      Compares the results with the thresholds.
+
+      Args:
+          results: benchmark results
+          thresholds: maximum values of the p95_ms and peak_memory_mb
+            metrics, keyed by scale and tool
+
+      Returns:
+          descriptions of the regressions, empty if there are none
+    """
+    regressions = []
+    for result in results:
+        if result.errors:
+            regressions.append(
+                f"{result.tool} at {result.scale} bus stops: "
+                f"{result.errors} calls failed")
+        limits = thresholds.get(str(result.scale), {}).get(result.tool, {})
+        for metric, limit in limits.items():
+            value = getattr(result, metric)
+            if value > limit:
+                regressions.append(
+                    f"{result.tool} at {result.scale} bus stops: {metric} "
+                    f"{value} exceeds {limit}")
+    return regressions
+
+
+def updated_thresholds(results: Sequence[BenchmarkResult],
+                       thresholds: Dict[str, Dict[str, Dict[str, float]]],
+                       headroom: float
+                       ) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Returns the thresholds with the results' values times the headroom."""
+    thresholds = {scale: dict(tools_thresholds)
+                  for scale, tools_thresholds in thresholds.items()}
+    for result in results:
+        thresholds.setdefault(str(result.scale), {})[result.tool] = {
+            "p95_ms": round(result.p95_ms * headroom, 1),
+            "peak_memory_mb": round(result.peak_memory_mb * headroom, 2)
+        }
+    return thresholds
+
+
+def format_results(results: Sequence[BenchmarkResult]) -> str:
+    columns = ["scale", "tool", "p50_ms", "p95_ms", "rows_per_sec",
+               "queries_per_call", "peak_memory_mb", "errors"]
+    table = [columns] + [[str(getattr(result, column)) for column in columns]
+                         for result in results]
+    widths = [max(len(row[i]) for row in table) for i in range(len(columns))]
+    return "\n".join("  ".join(value.ljust(width)
+                               for value, width in zip(row, widths))
+                     for row in table)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the agent tools against a local SQLite "
+                    "stand-in for BigQuery")
+    parser.add_argument("--scales", type=int, nargs="+",
+                        default=list(DEFAULT_SCALES),
+                        help="Numbers of bus stops")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--tools", nargs="+",
+                        help="Benchmarks to run, all by default")
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS_PATH,
+                        help="JSON file with the regression thresholds")
+    parser.add_argument("--update-thresholds", action="store_true",
+                        help="Write the results, times the headroom, to the "
+                             "thresholds file instead of checking them")
+    parser.add_argument("--headroom", type=float, default=2.)
+    parser.add_argument("--output", help="JSON file to write the results to")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run_benchmarks(args.scales, args.iterations,
+                                         args.tools))
+    print(format_results(results))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump([asdict(result) for result in results], output,
+                      indent=2)
+
+    thresholds = {}
+    if os.path.exists(args.thresholds):
+        with open(args.thresholds) as thresholds_file:
+            thresholds = json.load(thresholds_file)
+    if args.update_thresholds:
+        with open(args.thresholds, "w") as thresholds_file:
+            json.dump(updated_thresholds(results, thresholds, args.headroom),
+                      thresholds_file, indent=2)
+            thresholds_file.write("\n")
+        return 0
+
+    regressions = check_thresholds(results, thresholds)
+    for regression in regressions:
+        print(f"REGRESSION: {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    # The tools log every call
+    logging.getLogger("maintenance_scheduler").setLevel(logging.WARNING)
+    logging.getLogger("google").setLevel(logging.WARNING)
+    sys.exit(main())
@@ -0,0 +1,230 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Persistent cache of search query embeddings."""
+
+import array
+import contextlib
+import logging
+import re
+import sqlite3
+import unicodedata
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Sequence
+
+from google.cloud import bigquery
+
+logger = logging.getLogger(__name__)
+
+# Same whitespace class as RE2's \s used by the normalize_search_terms SQL
+# function, so that both produce the same cache keys.
+_WHITESPACE = re.compile(r"[\t\n\f\r ]+")
+
+
+def normalize_query_text(text: str) -> str:
+    """
+      Normalizes search terms so that trivially different queries share the
+      cached embedding. Mirrors the normalize_search_terms SQL function. Only
+      the cache key is normalized; the model embeds the original text.
+    """
+    return unicodedata.normalize(
+        "NFKC", _WHITESPACE.sub(" ", text).strip().casefold())
+
+
+@dataclass(frozen=True)
+class QueryEmbeddingKey:
+    """Cache key of a query embedding."""
+    model_id: str
+    # Empty if the model doesn't take a task type, e.g. multimodal embeddings
+    task_type: str
+    normalized_text: str
+
+
+class QueryEmbeddingCacheBackend(ABC):
+    """Storage of cached query embeddings."""
+
+    @abstractmethod
+    def get(self, key: QueryEmbeddingKey) -> Optional[List[float]]:
+        """Returns the cached embedding or None."""
+
+    @abstractmethod
+    def put(self, key: QueryEmbeddingKey, embedding: Sequence[float]) -> None:
+        """Stores the embedding."""
+
+
+class SQLiteQueryEmbeddingCache(QueryEmbeddingCacheBackend):
+    """Query embeddings cached in a local SQLite database file."""
+
+    def __init__(self, path: str):
+        self._path = path
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "model_id TEXT NOT NULL, task_type TEXT NOT NULL, "
+                "normalized_text TEXT NOT NULL, embedding BLOB NOT NULL, "
+                "PRIMARY KEY (model_id, task_type, normalized_text))")
+
+    def get(self, key: QueryEmbeddingKey) -> Optional[List[float]]:
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT embedding FROM query_embeddings WHERE model_id = ? "
+                "AND task_type = ? AND normalized_text = ?",
+                (key.model_id, key.task_type, key.normalized_text)).fetchone()
+        if row is None:
+            return None
+        return array.array("d", row[0]).tolist()
+
+    def put(self, key: QueryEmbeddingKey, embedding: Sequence[float]) -> None:
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO query_embeddings (model_id, task_type, "
+                "normalized_text, embedding) VALUES (?, ?, ?, ?)",
+                (key.model_id, key.task_type, key.normalized_text,
+                 array.array("d", embedding).tobytes()))
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        connection = sqlite3.connect(self._path, timeout=10)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+
+class BigQueryQueryEmbeddingCache(QueryEmbeddingCacheBackend):
+    """
+      Query embeddings cached in the query_embeddings BigQuery table. The
+      semantic search routines read the same table, so embeddings cached by
+      any client are reused by the routines.
+    """
+
+    def __init__(self, client: bigquery.Client, table_id: str):
+        self._client = client
+        self._table_id = table_id
+
+    def get(self, key: QueryEmbeddingKey) -> Optional[List[float]]:
+        query = f"""
+            SELECT embedding FROM `{self._table_id}`
+            WHERE model_id = @model_id AND task_type = @task_type
+              AND normalized_text = @normalized_text
+            LIMIT 1
+        """
+        rows = list(self._client.query(
+            query,
+            job_config=bigquery.QueryJobConfig(
+                query_parameters=self._key_parameters(key))).result())
+        return list(rows[0].embedding) if rows else None
+
+    def put(self, key: QueryEmbeddingKey, embedding: Sequence[float]) -> None:
+        query = f"""
+            MERGE `{self._table_id}` cache
+            USING (SELECT @model_id AS model_id, @task_type AS task_type,
+                          @normalized_text AS normalized_text) new_entry
+            ON cache.model_id = new_entry.model_id
+              AND cache.task_type = new_entry.task_type
+              AND cache.normalized_text = new_entry.normalized_text
+            WHEN NOT MATCHED THEN
+              INSERT (model_id, task_type, normalized_text, embedding)
+              VALUES (@model_id, @task_type, @normalized_text, @embedding)
+        """
+        parameters = self._key_parameters(key) + [
+            bigquery.ArrayQueryParameter("embedding", "FLOAT64",
+                                         list(embedding))
+        ]
+        self._client.query(
+            query,
+            job_config=bigquery.QueryJobConfig(
+                query_parameters=parameters)).result()
+
+    @staticmethod
+    def _key_parameters(key: QueryEmbeddingKey) -> list:
+        return [
+            bigquery.ScalarQueryParameter("model_id", "STRING", key.model_id),
+            bigquery.ScalarQueryParameter("task_type", "STRING",
+                                          key.task_type),
+            bigquery.ScalarQueryParameter("normalized_text", "STRING",
+                                          key.normalized_text),
+        ]
+
+
+class CachedQueryEmbedder:
+    """
+      Generates query embeddings with a BigQuery remote embedding model and
+      caches them.
+
+      Backends are checked in order, so a local backend should be listed
+      before the BigQuery one. An embedding found in a slower backend is copied to the faster
+      ones.
+    """
+
+    def __init__(self, client: bigquery.Client, model: str, model_id: str,
+                 task_type: str,
+                 backends: Sequence[QueryEmbeddingCacheBackend]):
+        """
+          Args:
+              client: BigQuery client
+              model: fully qualified id of the BigQuery remote model
+              model_id: Vertex AI model the remote model uses, part of the
+                cache key so that embeddings of different models don't mix
+              task_type: embedding task type, empty for models without one
+              backends: cache backends
+        """
+        self._client = client
+        self._model = model
+        self._model_id = model_id
+        self._task_type = task_type
+        self._backends = list(backends)
+        self.hits = 0
+        self.misses = 0
+
+    def embed(self, text: str) -> List[float]:
+        """Returns the embedding of the search terms."""
+        key = QueryEmbeddingKey(self._model_id, self._task_type,
+                                normalize_query_text(text))
+        for i, backend in enumerate(self._backends):
+            embedding = backend.get(key)
+            if embedding is not None:
+                self.hits += 1
+                for faster_backend in self._backends[:i]:
+                    faster_backend.put(key, embedding)
+                return embedding
+
+        self.misses += 1
+        embedding = self._generate(text)
+        for backend in self._backends:
+            backend.put(key, embedding)
+        return embedding
+
+    def _generate(self, text: str) -> List[float]:
+        task_type = (f", STRUCT('{self._task_type}' AS task_type)"
+                     if self._task_type else "")
+        query = f"""
+            SELECT ml_generate_embedding_result AS embedding,
+                   ml_generate_embedding_status AS status
+            FROM ML.GENERATE_EMBEDDING(
+              MODEL `{self._model}`,
+              (SELECT @content AS content){task_type})
+        """
+        row = next(iter(self._client.query(
+            query,
+            job_config=bigquery.QueryJobConfig(query_parameters=[
+                bigquery.ScalarQueryParameter("content", "STRING",
+                                              text)
+            ])).result()))
+        if row.status:
+            raise RuntimeError(
+                f"Failed to generate query embedding: {row.status}")
+        return list(row.embedding)
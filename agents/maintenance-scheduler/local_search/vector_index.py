@@ -0,0 +1,534 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Local approximate nearest neighbour index of report embeddings."""
+
+import datetime
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+from google.cloud import bigquery
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATIONS = ("float32", "int8")
+
+_META_FILE = "meta.json"
+_MAIN_SEGMENT = "main"
+_DELTA_SEGMENT = "delta"
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+@dataclass
+class SearchResult:
+    """Single search result, same shape as the semantic search routines."""
+    report_id: str
+    distance: float
+    rank: int
+
+
+@dataclass
+class _Segment:
+    ids: np.ndarray
+    vectors: np.ndarray
+    scales: Optional[np.ndarray]
+    created_micros: np.ndarray
+
+    @classmethod
+    def empty(cls, dimension: int, quantization: str) -> "_Segment":
+        return cls(
+            ids=np.empty(0, dtype="U1"),
+            vectors=np.empty((0, dimension), dtype=quantization),
+            scales=(np.empty(0, dtype=np.float32)
+                    if quantization == "int8" else None),
+            created_micros=np.empty(0, dtype=np.int64))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def select(self, rows) -> "_Segment":
+        return _Segment(
+            ids=self.ids[rows],
+            vectors=self.vectors[rows],
+            scales=None if self.scales is None else self.scales[rows],
+            created_micros=self.created_micros[rows])
+
+    def scores(self, query: np.ndarray,
+               rows: Optional[np.ndarray] = None) -> np.ndarray:
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        scores = vectors.astype(np.float32, copy=False) @ query
+        if self.scales is not None:
+            scores *= self.scales if rows is None else self.scales[rows]
+        return scores
+
+
+class VectorIndex:
+    """
+      IVF (inverted file) index of normalized embeddings for top-k cosine
+      search.
+
+      The main segment is stored in .npy files which are memory-mapped, so
+      opening an index doesn't read the vectors into memory. Its vectors are
+      grouped by the nearest of `num_lists` centroids; a search scans only the
+      lists of the `num_probes` centroids nearest to the query. Vectors can be
+      stored as float32 or as int8 with a per-vector scale, which takes a
+      quarter of the space at a small cost in recall.
+
+      New embeddings are added to a delta segment which is searched
+      exhaustively. `rebuild()` merges the delta into the main segment and
+      retrains the centroids. Every rebuild writes a new generation of the
+      main segment; the metadata file names the live generation, so
+      replacing it is a single atomic rename.
+    """
+
+    def __init__(self, directory: str):
+        """
+          Opens an index previously saved to the directory.
+
+          Args:
+              directory: directory of the index files
+        """
+        self.directory = directory
+        meta = _read_meta(directory)
+        self.dimension: int = meta["dimension"]
+        self.quantization: str = meta["quantization"]
+        self._lock = threading.Lock()
+        # Serializes the rebuilds; add() and search() don't wait for them
+        self._rebuild_lock = threading.Lock()
+        main_segment = _main_segment(meta.get("generation", 0))
+        self._main = self._load_segment(main_segment, mmap_mode="r")
+        self._centroids = np.load(self._path(main_segment, "centroids"))
+        self._list_offsets = np.load(self._path(main_segment, "offsets"))
+        if os.path.exists(self._path(_DELTA_SEGMENT, "ids")):
+            delta = self._load_segment(_DELTA_SEGMENT)
+            # A rebuild which stopped after switching to the new main
+            # segment leaves the merged embeddings in the delta files
+            self._delta = delta.select(~np.isin(delta.ids, self._main.ids))
+        else:
+            self._delta = _Segment.empty(self.dimension, self.quantization)
+        self._known_ids = set(self._main.ids.tolist())
+        self._known_ids.update(self._delta.ids.tolist())
+
+    @classmethod
+    def build(cls, directory: str, ids: Sequence[str], vectors: np.ndarray,
+              created: Sequence[datetime.datetime],
+              num_lists: Optional[int] = None,
+              quantization: str = "float32",
+              seed: int = 0) -> "VectorIndex":
+        """
+          Builds a new index and saves it to the directory.
+
+          Args:
+              directory: directory of the index files, created if missing
+              ids: report ids
+              vectors: embeddings, one row per report id
+              created: creation time of each embedding, used to refresh the
+                index incrementally
+              num_lists: number of IVF lists, defaults to sqrt(len(ids))
+              quantization: "float32" or "int8"
+              seed: random seed of the centroid training
+
+          Returns:
+              the opened index
+        """
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError(
+                "Expected a matrix with one embedding vector per id.")
+        os.makedirs(directory, exist_ok=True)
+        # An index previously saved to the directory stays readable until
+        # the metadata names the new main segment
+        generation = (_read_meta(directory).get("generation", 0) + 1
+                      if os.path.exists(os.path.join(directory, _META_FILE))
+                      else 0)
+        created_micros = np.array([_to_micros(ts) for ts in created],
+                                  dtype=np.int64)
+        cls._write_main_segment(directory, _main_segment(generation),
+                                np.asarray(ids, dtype=str),
+                                _normalize(vectors), created_micros,
+                                num_lists, quantization, seed)
+        _remove_segment(directory, _DELTA_SEGMENT)
+        _atomic_write_json(os.path.join(directory, _META_FILE), {
+            "dimension": vectors.shape[1],
+            "quantization": quantization,
+            "num_lists": num_lists,
+            "seed": seed,
+            "generation": generation,
+        })
+        _remove_stale_main_segments(directory, generation)
+        return cls(directory)
+
+    def __len__(self):
+        return len(self._main) + len(self._delta)
+
+    @property
+    def watermark(self) -> Optional[datetime.datetime]:
+        """Creation time of the newest embedding in the index."""
+        latest = max((int(segment.created_micros.max())
+                      for segment in (self._main, self._delta)
+                      if len(segment)), default=None)
+        if latest is None:
+            return None
+        return _EPOCH + datetime.timedelta(microseconds=latest)
+
+    @property
+    def delta_size(self) -> int:
+        """Number of embeddings which are not yet merged into the main segment."""
+        return len(self._delta)
+
+    def search(self, query: Sequence[float], top_k: int = 10,
+               num_probes: int = 8) -> List[SearchResult]:
+        """
+          Finds the embeddings nearest to the query.
+
+          Args:
+              query: query embedding
+              top_k: maximum number of results
+              num_probes: number of IVF lists to scan; more lists improve
+                recall at the cost of latency
+
+          Returns:
+              results ordered by ascending cosine distance
+        """
+        query = _normalize(np.asarray(query, dtype=np.float32)[None, :])[0]
+        with self._lock:
+            main, delta = self._main, self._delta
+            centroids, offsets = self._centroids, self._list_offsets
+
+        candidate_ids = []
+        candidate_scores = []
+        if len(main):
+            num_probes = min(num_probes, len(centroids))
+            nearest_lists = np.argpartition(-(centroids @ query),
+                                            num_probes - 1)[:num_probes]
+            rows = np.concatenate([
+                np.arange(offsets[i], offsets[i + 1]) for i in nearest_lists
+            ])
+            candidate_ids.append(main.ids[rows])
+            candidate_scores.append(main.scores(query, rows))
+        if len(delta):
+            candidate_ids.append(delta.ids)
+            candidate_scores.append(delta.scores(query))
+        if not candidate_ids:
+            return []
+
+        ids = np.concatenate(candidate_ids)
+        scores = np.concatenate(candidate_scores)
+        top_k = min(top_k, len(scores))
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            SearchResult(report_id=str(ids[i]),
+                         distance=float(1 - scores[i]),
+                         rank=rank)
+            for rank, i in enumerate(top, start=1)
+        ]
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray,
+            created: Sequence[datetime.datetime]) -> int:
+        """
+          Adds embeddings to the delta segment and saves it. Ids which are
+          already in the index are skipped.
+
+          Returns:
+              number of added embeddings
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(
+            len(ids), self.dimension)
+        new_rows = [
+            i for i, report_id in enumerate(ids)
+            if report_id not in self._known_ids
+        ]
+        if not new_rows:
+            return 0
+        new_ids = np.asarray([ids[i] for i in new_rows], dtype=str)
+        new_vectors, new_scales = _quantize(_normalize(vectors[new_rows]),
+                                            self.quantization)
+        new_created = np.array([_to_micros(created[i]) for i in new_rows],
+                               dtype=np.int64)
+        with self._lock:
+            delta = _Segment(
+                ids=np.concatenate([self._delta.ids, new_ids]),
+                vectors=np.concatenate([self._delta.vectors, new_vectors]),
+                scales=(None if new_scales is None else
+                        np.concatenate([self._delta.scales, new_scales])),
+                created_micros=np.concatenate(
+                    [self._delta.created_micros, new_created]))
+            self._save_segment(self.directory, _DELTA_SEGMENT, delta)
+            self._delta = delta
+            self._known_ids.update(new_ids.tolist())
+        return len(new_rows)
+
+    def rebuild(self) -> None:
+        """
+          Merges the delta segment into the main segment. Embeddings added
+          while the rebuild runs stay in the delta segment.
+        """
+        with self._rebuild_lock:
+            with self._lock:
+                main, delta = self._main, self._delta
+            meta = _read_meta(self.directory)
+            generation = meta.get("generation", 0) + 1
+            main_segment = _main_segment(generation)
+            vectors = np.concatenate([
+                _dequantize(main.vectors, main.scales),
+                _dequantize(delta.vectors, delta.scales)
+            ])
+            created_micros = np.concatenate(
+                [main.created_micros, delta.created_micros])
+            self._write_main_segment(self.directory, main_segment,
+                                     np.concatenate([main.ids, delta.ids]),
+                                     vectors, created_micros,
+                                     meta["num_lists"], self.quantization,
+                                     meta["seed"])
+            with self._lock:
+                # add() only appends to the delta segment
+                remaining = self._delta.select(slice(len(delta), None))
+                # Switching to the new main segment comes first; the merged
+                # embeddings left in the delta files are dropped on load
+                _atomic_write_json(os.path.join(self.directory, _META_FILE),
+                                   {**meta, "generation": generation})
+                if len(remaining):
+                    self._save_segment(self.directory, _DELTA_SEGMENT,
+                                       remaining)
+                else:
+                    _remove_segment(self.directory, _DELTA_SEGMENT)
+                self._main = self._load_segment(main_segment, mmap_mode="r")
+                self._centroids = np.load(self._path(main_segment,
+                                                     "centroids"))
+                self._list_offsets = np.load(self._path(main_segment,
+                                                        "offsets"))
+                self._delta = remaining
+            # Searches which already took the old segment keep their
+            # memory maps of the removed files
+            _remove_stale_main_segments(self.directory, generation)
+
+    def refresh_from_bigquery(self, client: bigquery.Client,
+                              embeddings_table: str,
+                              max_delta_fraction: float = 0.1) -> int:
+        """
+          Adds the embeddings created since the index watermark. Embeddings
+          created at the watermark itself are read again and skipped by id.
+
+          Args:
+              client: BigQuery client
+              embeddings_table: fully qualified id of the text_embeddings or
+                multimodal_embeddings table
+              max_delta_fraction: the delta segment is merged into the main
+                segment once it exceeds this fraction of the index
+
+          Returns:
+              number of added embeddings
+        """
+        ids, vectors, created = load_embeddings(client, embeddings_table,
+                                                since=self.watermark)
+        added = self.add(ids, vectors, created) if ids else 0
+        if self.delta_size > max_delta_fraction * len(self):
+            self.rebuild()
+        logger.info("Added %d embeddings from %s", added, embeddings_table)
+        return added
+
+    def _path(self, segment: str, name: str) -> str:
+        return os.path.join(self.directory, f"{segment}_{name}.npy")
+
+    def _load_segment(self, segment: str,
+                      mmap_mode: Optional[str] = None) -> _Segment:
+        scales_path = self._path(segment, "scales")
+        return _Segment(
+            ids=np.load(self._path(segment, "ids")),
+            vectors=np.load(self._path(segment, "vectors"),
+                            mmap_mode=mmap_mode),
+            scales=(np.load(scales_path, mmap_mode=mmap_mode)
+                    if self.quantization == "int8" else None),
+            created_micros=np.load(self._path(segment, "created")))
+
+    @staticmethod
+    def _save_segment(directory: str, segment: str, data: _Segment) -> None:
+        arrays = {
+            "ids": data.ids,
+            "vectors": data.vectors,
+            "created": data.created_micros,
+        }
+        if data.scales is not None:
+            arrays["scales"] = data.scales
+        for name, array in arrays.items():
+            _atomic_save(os.path.join(directory, f"{segment}_{name}.npy"),
+                         array)
+
+    @classmethod
+    def _write_main_segment(cls, directory: str, segment: str,
+                            ids: np.ndarray,
+                            vectors: np.ndarray, created_micros: np.ndarray,
+                            num_lists: Optional[int], quantization: str,
+                            seed: int) -> None:
+        if num_lists is None:
+            num_lists = max(1, int(np.sqrt(len(ids))))
+        num_lists = min(num_lists, len(ids))
+        if num_lists:
+            centroids = _train_centroids(vectors, num_lists,
+                                         np.random.default_rng(seed))
+        else:
+            centroids = np.empty((0, vectors.shape[1]), dtype=np.float32)
+        assignments = _nearest_centroids(vectors, centroids)
+        # Vectors of each list are stored contiguously so that scanning a list
+        # is a sequential read of the memory-mapped file.
+        order = np.argsort(assignments, kind="stable")
+        offsets = np.searchsorted(assignments[order],
+                                  np.arange(num_lists + 1))
+        quantized, scales = _quantize(vectors[order], quantization)
+        cls._save_segment(directory, segment, _Segment(
+            ids=ids[order], vectors=quantized, scales=scales,
+            created_micros=created_micros[order]))
+        _atomic_save(os.path.join(directory, f"{segment}_centroids.npy"),
+                     centroids)
+        _atomic_save(os.path.join(directory, f"{segment}_offsets.npy"),
+                     offsets)
+
+
+def load_embeddings(client: bigquery.Client, embeddings_table: str,
+                    since: Optional[datetime.datetime] = None):
+    """
+      Reads embeddings from a BigQuery embeddings table.
+
+      Args:
+          client: BigQuery client
+          embeddings_table: fully qualified id of the text_embeddings or
+            multimodal_embeddings table
+          since: only embeddings created at or after this time are read
+
+      Returns:
+          tuple of report ids, embedding matrix and creation times
+    """
+    query = f"""
+        SELECT report_id, embedding, created_ts
+        FROM `{embeddings_table}`
+        WHERE ARRAY_LENGTH(embedding) > 0
+          AND (@since IS NULL OR created_ts >= @since)
+        ORDER BY created_ts
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter("since", "TIMESTAMP", since)
+    ])
+    ids = []
+    vectors = []
+    created = []
+    for row in client.query(query, job_config=job_config).result():
+        ids.append(row.report_id)
+        vectors.append(row.embedding)
+        created.append(row.created_ts)
+    return ids, np.asarray(vectors, dtype=np.float32), created
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, np.finfo(np.float32).tiny)
+
+
+def _quantize(vectors: np.ndarray, quantization: str):
+    if quantization == "float32":
+        return vectors.astype(np.float32), None
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales = np.maximum(scales, np.finfo(np.float32).tiny).astype(np.float32)
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales
+
+
+def _dequantize(vectors: np.ndarray,
+                scales: Optional[np.ndarray]) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if scales is None:
+        return vectors
+    return vectors * np.asarray(scales)[:, None]
+
+
+def _train_centroids(vectors: np.ndarray, num_lists: int,
+                     rng: np.random.Generator,
+                     iterations: int = 10,
+                     max_training_vectors_per_list: int = 256) -> np.ndarray:
+    """Spherical k-means on a sample of the vectors."""
+    sample_size = min(len(vectors), num_lists * max_training_vectors_per_list)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(len(sample), num_lists, replace=False)]
+    for _ in range(iterations):
+        assignments = _nearest_centroids(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        empty = ~sums.any(axis=1)
+        # Empty lists keep their previous centroid
+        sums[empty] = centroids[empty]
+        centroids = _normalize(sums)
+    return centroids.astype(np.float32)
+
+
+def _nearest_centroids(vectors: np.ndarray, centroids: np.ndarray,
+                       batch_size: int = 65536) -> np.ndarray:
+    return np.concatenate([
+        np.argmax(vectors[start:start + batch_size] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), batch_size)
+    ]) if len(vectors) else np.empty(0, dtype=np.int64)
+
+
+def _main_segment(generation: int) -> str:
+    # Generation 0 keeps the file names of indexes without generations
+    return f"{_MAIN_SEGMENT}-{generation}" if generation else _MAIN_SEGMENT
+
+
+def _read_meta(directory: str) -> dict:
+    with open(os.path.join(directory, _META_FILE)) as f:
+        return json.load(f)
+
+
+def _remove_segment(directory: str, segment: str) -> None:
+    for name in ("ids", "vectors", "scales", "created"):
+        path = os.path.join(directory, f"{segment}_{name}.npy")
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _remove_stale_main_segments(directory: str, generation: int) -> None:
+    live_segment = _main_segment(generation)
+    for file_name in os.listdir(directory):
+        segment = file_name.split("_", 1)[0]
+        if (file_name.endswith(".npy") and segment != live_segment
+                and (segment == _MAIN_SEGMENT
+                     or segment.startswith(f"{_MAIN_SEGMENT}-"))):
+            os.remove(os.path.join(directory, file_name))
+
+
+def _to_micros(timestamp: datetime.datetime) -> int:
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+    return (timestamp - _EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def _atomic_save(path: str, array: np.ndarray) -> None:
+    # np.save appends .npy to names without it, so the temporary file keeps
+    # the extension.
+    temp_path = f"{path[:-len('.npy')]}.tmp.npy"
+    np.save(temp_path, array)
+    os.replace(temp_path, path)
+
+
+def _atomic_write_json(path: str, data: dict) -> None:
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
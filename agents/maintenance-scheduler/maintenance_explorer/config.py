@@ -70,6 +70,33 @@ class Config(BaseSettings):
     #Conversational analtyics API configuration 
     CA_API_AGENT_ID: str = Field(default="data_agent_ca_bigquery")
     BQ_DATASET: str = Field(default="bus_stop_image_processing")  
+    ca_agent_cache_ttl_seconds: int = Field(
+        default=600,
+        description="Seconds for which the existence of the data agent is remembered")
+    ca_chat_client_pool_size: int = Field(
+        default=4,
+        description="Number of async Conversational Analytics chat clients per event loop")
+    ask_lakehouse_max_rows: int = Field(
+        default=50,
+        description="Maximum number of rows of every query result returned by ask_lakehouse")
+    image_max_dimension: int = Field(
+        default=1024,
+        description="Maximum width and height of the bus stop images saved as artifacts, 0 keeps the original size")
+    image_workers: int = Field(
+        default=4,
+        description="Number of threads which download and downscale the bus stop images")
+    image_cache_size_mb: int = Field(
+        default=64,
+        description="Maximum total size of the downscaled bus stop images kept in memory")
+    chart_format: str = Field(
+        default="png",
+        description="Format of the saved charts: png, svg, or vega for clients which render Vega-Lite themselves")
+    chart_render_workers: int = Field(
+        default=2,
+        description="Number of processes which render the charts")
+    chart_cache_size: int = Field(
+        default=128,
+        description="Maximum number of rendered charts kept in memory")
     use_mcp_toolbox: bool = Field(
         default=True,
         description="Indicates if the MCP server should be used instead of the local tools"
@@ -0,0 +1,223 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+  Process-wide bootstrap of the Conversational Analytics data agent and of the
+  conversations of the sessions.
+
+  The API clients are created once per process. The existence of the data
+  agent is checked with a single lookup and remembered for
+  ca_agent_cache_ttl_seconds. The conversation of a session is only created
+  when a tool first talks to the data agent, so starting a session doesn't
+  call the API at all.
+
+  The tools chat with the data agent through a pool of async clients, which
+  stream the replies without blocking the event loop.
+"""
+
+import asyncio
+import itertools
+import logging
+import threading
+import time
+import weakref
+from functools import lru_cache
+from typing import Any, Dict, List, MutableMapping
+
+from google.api_core import exceptions
+from google.cloud import geminidataanalytics
+
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+configs = Config()
+
+TABLE_NAMES = ["bus_stops", "image_reports", "incidents", "report_watermark",
+               "bus_ridership"]
+SYSTEM_INSTRUCTION = (
+    "Table incidents and image_reports contains information about bus stop "
+    "incidents. and field resolved indicate if there is an open incident that "
+    "required mantainence. Table bus_stops contain information address, city, "
+    "etc for bus stops. When refering to descriptions of the incidents this "
+    "information should be in table image_reports")
+
+# Session state key set once the session's conversation exists
+CONVERSATION_CREATED_KEY = "conversation_created"
+
+# Data agent name -> time.monotonic() of the last successful check
+_data_agents_checked_at: Dict[str, float] = {}
+_data_agents_lock = threading.Lock()
+
+# Event loop -> its async chat clients and the index of the next one. Async
+# gRPC channels are bound to the event loop which created them.
+_async_chat_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+@lru_cache(maxsize=None)
+def get_data_agent_client() -> geminidataanalytics.DataAgentServiceClient:
+    return geminidataanalytics.DataAgentServiceClient()
+
+
+@lru_cache(maxsize=None)
+def get_data_chat_client() -> geminidataanalytics.DataChatServiceClient:
+    return geminidataanalytics.DataChatServiceClient()
+
+
+def get_async_data_chat_client(
+) -> geminidataanalytics.DataChatServiceAsyncClient:
+    """
+      Returns the next client of the running event loop's pool. Each client
+      has its own channel, so that long chat streams of concurrent sessions
+      don't share a single connection.
+    """
+    loop = asyncio.get_running_loop()
+    pool = _async_chat_clients.get(loop)
+    if pool is None:
+        clients = [geminidataanalytics.DataChatServiceAsyncClient()
+                   for _ in range(configs.ca_chat_client_pool_size)]
+        pool = (clients, itertools.cycle(range(len(clients))))
+        _async_chat_clients[loop] = pool
+    clients, indexes = pool
+    return clients[next(indexes)]
+
+
+def add_tables(table_names: List[str], bq_dataset_id: str,
+               billing_project: str
+               ) -> List[geminidataanalytics.BigQueryTableReference]:
+    bigquery_table_references = []
+    for table_name in table_names:
+        bigquery_table_reference = geminidataanalytics.BigQueryTableReference()
+        bigquery_table_reference.project_id = billing_project
+        bigquery_table_reference.dataset_id = bq_dataset_id
+        bigquery_table_reference.table_id = table_name
+        bigquery_table_references.append(bigquery_table_reference)
+    return bigquery_table_references
+
+
+def create_ca_agent(parent_agent_name: str, agent_id: str, agent_name: str,
+                    billing_project: str) -> None:
+    """Creates the data agent with the dataset's tables."""
+    logger.info("Creating a new agent %s", agent_name)
+    datasource_references = geminidataanalytics.DatasourceReferences()
+    datasource_references.bq.table_references = add_tables(
+        TABLE_NAMES, configs.BQ_DATASET, billing_project)
+
+    # Set up context for stateful chat
+    published_context = geminidataanalytics.Context()
+    published_context.system_instruction = SYSTEM_INSTRUCTION
+    published_context.datasource_references = datasource_references
+    # Optional: To enable advanced analysis with Python, include the following line:
+    published_context.options.analysis.python.enabled = True
+
+    data_agent = geminidataanalytics.DataAgent()
+    data_agent.data_analytics_agent.published_context = published_context
+    data_agent.name = agent_name
+
+    request = geminidataanalytics.CreateDataAgentRequest(
+        parent=parent_agent_name,
+        data_agent_id=agent_id,
+        data_agent=data_agent,
+    )
+    get_data_agent_client().create_data_agent(request=request)
+    logger.info("Data Agent created: %s", agent_name)
+
+
+def ensure_data_agent(parent_agent_name: str, agent_id: str, agent_name: str,
+                      billing_project: str) -> bool:
+    """
+      Creates the data agent unless it exists. A data agent which was found
+      or created isn't checked again for ca_agent_cache_ttl_seconds.
+
+      Returns:
+          whether the data agent exists
+    """
+    with _data_agents_lock:
+        checked_at = _data_agents_checked_at.get(agent_name)
+        if (checked_at is not None and time.monotonic() - checked_at
+                < configs.ca_agent_cache_ttl_seconds):
+            return True
+        try:
+            try:
+                get_data_agent_client().get_data_agent(name=agent_name)
+                logger.info("Data Agent %s already exists", agent_name)
+            except exceptions.NotFound:
+                create_ca_agent(parent_agent_name, agent_id, agent_name,
+                                billing_project)
+        except Exception as e:
+            logger.error("Error creating Data Agent: %s", str(e))
+            return False
+        _data_agents_checked_at[agent_name] = time.monotonic()
+        return True
+
+
+def invalidate_data_agents() -> None:
+    """Forgets the checked data agents, e.g. after one was deleted."""
+    with _data_agents_lock:
+        _data_agents_checked_at.clear()
+
+
+def create_ca_conversation(agent_name: str, parent_agent_name: str,
+                           conversation_name: str,
+                           conversation_id: str) -> bool:
+    """
+      Creates the conversation. An existing conversation is kept.
+
+      Returns:
+          whether the conversation exists
+    """
+    conversation = geminidataanalytics.Conversation()
+    conversation.agents = [agent_name]
+    conversation.name = conversation_name
+    request = geminidataanalytics.CreateConversationRequest(
+        parent=parent_agent_name,
+        conversation_id=conversation_id,
+        conversation=conversation,
+    )
+    try:
+        response = get_data_chat_client().create_conversation(request=request)
+        logger.info("Conversation created: %s", response.name)
+    except exceptions.AlreadyExists:
+        logger.info("Conversation %s already exists", conversation_name)
+    except Exception as e:
+        logger.error("Error creating conversation: %s", str(e))
+        return False
+    return True
+
+
+def _bootstrap_conversation(state: Dict[str, Any]) -> bool:
+    if not ensure_data_agent(state["agent_parent"], state["agent_id"],
+                             state["agent_name"], configs.CLOUD_PROJECT):
+        return False
+    return create_ca_conversation(state["agent_name"], state["agent_parent"],
+                                  state["conversation_name"],
+                                  state["conversation_id"])
+
+
+async def ensure_conversation(state: MutableMapping[str, Any]) -> None:
+    """
+      Makes sure that the data agent and the conversation of the session
+      exist. Only the first call of a session calls the API; failures are
+      logged and retried by the next call.
+
+      Args:
+          state: session state with the names set by setup_before_agent_call
+    """
+    if state.get(CONVERSATION_CREATED_KEY):
+        return
+    names = {key: state[key] for key in ("agent_parent", "agent_id",
+                                         "agent_name", "conversation_name",
+                                         "conversation_id")}
+    # The clients are synchronous, the event loop keeps serving other sessions
+    if await asyncio.to_thread(_bootstrap_conversation, names):
+        state[CONVERSATION_CREATED_KEY] = True
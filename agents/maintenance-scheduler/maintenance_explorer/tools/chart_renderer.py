@@ -0,0 +1,187 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+  Renders the Vega-Lite charts of the Conversational Analytics API.
+
+  Rasterizing a chart takes a CPU core for a noticeable time, so the charts
+  are converted in a process pool instead of on the event loop. Charts are
+  addressed by the hash of their normalized specification; a chart which
+  was rendered before is served from memory.
+"""
+
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+import vl_convert
+
+logger = logging.getLogger(__name__)
+
+CHART_FORMATS = {
+    "png": ("image/png", "png"),
+    "svg": ("image/svg+xml", "svg"),
+    # Vega-Lite specification, for clients which render charts themselves
+    "vega": ("application/json", "vl.json"),
+}
+
+
+@dataclass(frozen=True)
+class RenderedChart:
+    """Chart in one of the CHART_FORMATS."""
+    data: bytes
+    mime_type: str
+    file_extension: str
+    # Hash of the normalized Vega-Lite specification
+    spec_hash: str
+
+
+def normalize_vega_spec(spec: Dict[str, Any]) -> str:
+    """Serializes the specification so that equal charts are equal strings."""
+    return json.dumps(spec, sort_keys=True, separators=(",", ":"),
+                      ensure_ascii=False)
+
+
+def _to_bytes(data) -> bytes:
+    # SVGs are returned as text
+    return data.encode("utf-8") if isinstance(data, str) else data
+
+
+class ChartRenderer:
+    """
+      Converts Vega-Lite charts in a process pool and caches the results.
+
+      Concurrent requests for the same chart share a single conversion. If
+      a rendering process dies, the pool is replaced and the conversion is
+      retried once.
+    """
+
+    def __init__(self, max_workers: int = 2, cache_size: int = 128,
+                 png_scale: float = 1.):
+        """
+          Args:
+              max_workers: number of rendering processes, created on the
+                first conversion
+              cache_size: maximum number of rendered charts kept in memory
+              png_scale: scale factor of the PNG images
+        """
+        self._max_workers = max_workers
+        self._cache_size = cache_size
+        self._png_scale = png_scale
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._in_flight: Dict[tuple, asyncio.Future] = {}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                # gRPC channels don't survive fork(), spawn clean workers
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self._max_workers,
+                    mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def _replace_broken_executor(self, executor: ProcessPoolExecutor) -> None:
+        with self._executor_lock:
+            # Another conversion may have replaced it already
+            if self._executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    async def _run(self, convert: Callable[[], Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            return await loop.run_in_executor(executor, convert)
+        except BrokenProcessPool:
+            # e.g. a worker was killed by the OOM killer; a broken pool
+            # rejects all further work
+            logger.warning("Chart rendering process died, restarting the "
+                           "process pool")
+            self._replace_broken_executor(executor)
+            return await loop.run_in_executor(self._get_executor(), convert)
+
+    async def render(self, spec: Dict[str, Any],
+                     chart_format: str = "png") -> RenderedChart:
+        """
+          Renders the chart.
+
+          Args:
+              spec: Vega-Lite specification
+              chart_format: one of CHART_FORMATS
+        """
+        if chart_format not in CHART_FORMATS:
+            raise ValueError(f"Unsupported chart format '{chart_format}'. "
+                             f"Use one of {', '.join(CHART_FORMATS)}")
+        normalized_spec = normalize_vega_spec(spec)
+        spec_hash = hashlib.sha256(normalized_spec.encode("utf-8")).hexdigest()
+        mime_type, file_extension = CHART_FORMATS[chart_format]
+        if chart_format == "vega":
+            data = normalized_spec.encode("utf-8")
+        else:
+            data = await self._convert(spec_hash, normalized_spec,
+                                       chart_format)
+        return RenderedChart(data=data, mime_type=mime_type,
+                             file_extension=file_extension,
+                             spec_hash=spec_hash)
+
+    async def _convert(self, spec_hash: str, normalized_spec: str,
+                       chart_format: str) -> bytes:
+        key = (spec_hash, chart_format)
+        data = self._cache.get(key)
+        if data is not None:
+            self._cache.move_to_end(key)
+            logger.debug("Chart %s served from the cache", spec_hash)
+            return data
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            return _to_bytes(await asyncio.shield(in_flight))
+
+        # The workers run the vl_convert functions directly, so that they
+        # don't import the agent
+        if chart_format == "png":
+            convert = functools.partial(vl_convert.vegalite_to_png,
+                                        normalized_spec, scale=self._png_scale)
+        else:
+            convert = functools.partial(vl_convert.vegalite_to_svg,
+                                        normalized_spec)
+        future = asyncio.ensure_future(self._run(convert))
+        self._in_flight[key] = future
+        try:
+            data = await asyncio.shield(future)
+        finally:
+            self._in_flight.pop(key, None)
+        data = _to_bytes(data)
+
+        self._cache[key] = data
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return data
+
+    def shutdown(self) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,194 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+  Fetches the bus stop images from GCS, sized for display.
+
+  An image is downloaded with a single request, which also returns its
+  generation and content type. Images larger than the maximum dimension are
+  downscaled and recompressed on worker threads. The result is cached by
+  URI; later requests only send a conditional download, which the server
+  answers with "304 Not Modified" while the object's generation is
+  unchanged.
+"""
+
+import asyncio
+import hashlib
+import io
+import logging
+import mimetypes
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from google.api_core import exceptions
+from google.cloud import storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Pillow format -> MIME type of the recompressed images
+_OUTPUT_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png",
+                   "WEBP": "image/webp"}
+
+
+@dataclass(frozen=True)
+class GcsImage:
+    """Image prepared for display."""
+    data: bytes
+    mime_type: str
+    # Generation of the GCS object the image was made from
+    generation: int
+    # SHA-256 of the data
+    sha256: str
+
+
+def parse_gcs_uri(gs_uri: str) -> Tuple[str, str]:
+    """Returns the bucket and the object name of a gs:// URI."""
+    if not gs_uri.startswith("gs://"):
+        raise ValueError("Invalid GCS URI format. Must start with 'gs://'")
+    parts = gs_uri[len("gs://"):].split("/", 1)
+    if len(parts) < 2 or not parts[1]:
+        raise ValueError(
+            "Invalid GCS URI format. Must include bucket and object.")
+    return parts[0], parts[1]
+
+
+def downscale_image(data: bytes, mime_type: str,
+                    max_dimension: int) -> Tuple[bytes, str]:
+    """
+      Downscales the image to fit in max_dimension x max_dimension pixels.
+      Images which fit, or aren't in a format which can be recompressed,
+      are returned unchanged. The EXIF orientation of downscaled images is
+      applied to the pixels, since the recompressed image has no EXIF data.
+
+      Returns:
+          the image and its MIME type
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        if (max_dimension <= 0 or image.format not in _OUTPUT_FORMATS
+                or max(image.size) <= max_dimension):
+            return data, mime_type
+        image_format = image.format
+        # Camera images are often stored sideways with an orientation tag
+        oriented = ImageOps.exif_transpose(image)
+        oriented.thumbnail((max_dimension, max_dimension))
+        buffer = io.BytesIO()
+        if image_format == "JPEG":
+            oriented.save(buffer, format=image_format, quality=85,
+                          optimize=True)
+        else:
+            oriented.save(buffer, format=image_format)
+    logger.debug("Downscaled the image from %d to %d bytes", len(data),
+                 buffer.tell())
+    return buffer.getvalue(), _OUTPUT_FORMATS[image_format]
+
+
+class GcsImageFetcher:
+    """
+      Downloads the images and keeps the prepared ones in memory.
+
+      Only the images are cached, not the GCS objects' bytes. The cache is
+      bounded by the total size of the images.
+    """
+
+    def __init__(self, client: storage.Client, max_dimension: int = 1024,
+                 max_workers: int = 4,
+                 max_cache_bytes: int = 64 * 1024 * 1024):
+        """
+          Args:
+              client: GCS client
+              max_dimension: maximum width and height of the images, 0
+                keeps the original size
+              max_workers: number of threads which download and downscale
+                the images
+              max_cache_bytes: maximum total size of the cached images
+        """
+        self._client = client
+        self._max_dimension = max_dimension
+        self._max_cache_bytes = max_cache_bytes
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="gcs-image")
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, GcsImage]" = OrderedDict()
+        self._cache_bytes = 0
+
+    async def fetch(self, gs_uri: str) -> Optional[GcsImage]:
+        """
+          Returns the image, or None if the object doesn't exist.
+
+          Raises:
+              ValueError: if the URI is invalid
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._fetch, gs_uri)
+
+    def _fetch(self, gs_uri: str) -> Optional[GcsImage]:
+        bucket_name, object_name = parse_gcs_uri(gs_uri)
+        with self._lock:
+            cached = self._cache.get(gs_uri)
+
+        blob = self._client.bucket(bucket_name).blob(object_name)
+        try:
+            # The response headers set the blob's generation and content type
+            data = blob.download_as_bytes(
+                if_generation_not_match=cached.generation if cached else None)
+        except exceptions.NotModified:
+            logger.info("Image %s is unchanged, using the cached image",
+                        gs_uri)
+            with self._lock:
+                if gs_uri in self._cache:
+                    self._cache.move_to_end(gs_uri)
+            return cached
+        except exceptions.NotFound:
+            self._evict(gs_uri)
+            return None
+        logger.info("Downloaded %d bytes of %s", len(data), gs_uri)
+
+        mime_type = (blob.content_type
+                     or mimetypes.guess_type(object_name)[0]
+                     or "application/octet-stream")
+        if mime_type.startswith("image/"):
+            try:
+                data, mime_type = downscale_image(data, mime_type,
+                                                  self._max_dimension)
+            except (OSError, Image.DecompressionBombError) as e:
+                # Kept as is, the UI may still be able to display it
+                logger.warning("Can't downscale %s: %s", gs_uri, e)
+        image = GcsImage(data=data, mime_type=mime_type,
+                         generation=blob.generation or 0,
+                         sha256=hashlib.sha256(data).hexdigest())
+        self._store(gs_uri, image)
+        return image
+
+    def _store(self, gs_uri: str, image: GcsImage) -> None:
+        if len(image.data) > self._max_cache_bytes:
+            return
+        with self._lock:
+            previous = self._cache.pop(gs_uri, None)
+            if previous is not None:
+                self._cache_bytes -= len(previous.data)
+            self._cache[gs_uri] = image
+            self._cache_bytes += len(image.data)
+            while self._cache_bytes > self._max_cache_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted.data)
+
+    def _evict(self, gs_uri: str) -> None:
+        with self._lock:
+            previous = self._cache.pop(gs_uri, None)
+            if previous is not None:
+                self._cache_bytes -= len(previous.data)
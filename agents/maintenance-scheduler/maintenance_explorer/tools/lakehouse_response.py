@@ -0,0 +1,114 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+  Condenses the streamed replies of the Conversational Analytics data agent
+  into what the explorer agent needs to answer: the final text answer, the
+  generated SQL and the result tables.
+
+  Schema resolution, thoughts, progress messages and the chart
+  specifications are dropped, the suggested follow-up questions are returned
+  separately, and the result tables are returned as columns and capped rows
+  instead of the text dumps of the protobuf messages.
+"""
+
+import itertools
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, List
+
+from google.cloud import geminidataanalytics
+
+# Older API versions don't have text types, their texts are unspecified
+_ANSWER_TEXT_TYPES = ("", "TEXT_TYPE_UNSPECIFIED", "FINAL_RESPONSE")
+
+
+class LakehouseResponse:
+    """Collects the parts of the replies which are passed to the model."""
+
+    def __init__(self, max_rows: int):
+        """
+          Args:
+              max_rows: maximum number of rows of every result table
+        """
+        self._max_rows = max_rows
+        self._answer: List[str] = []
+        self._followup_questions: List[str] = []
+        self._sql: List[str] = []
+        self._results: List[Dict[str, Any]] = []
+        self._errors: List[str] = []
+
+    def add(self, reply: geminidataanalytics.Message) -> None:
+        message = reply.system_message
+        if "text" in message:
+            self._add_text(message.text)
+        elif "data" in message:
+            self._add_data(message.data)
+        elif "error" in message:
+            self._errors.append(message.error.text)
+
+    def _add_text(self, text: Any) -> None:
+        text_type = getattr(getattr(text, "text_type", None), "name", "")
+        if text_type in _ANSWER_TEXT_TYPES:
+            # The parts of a message are fragments of the same text
+            answer = "".join(text.parts)
+            if answer:
+                self._answer.append(answer)
+        elif text_type == "FOLLOWUP_QUESTIONS":
+            self._followup_questions.extend(
+                part for part in text.parts if part)
+
+    def _add_data(self, data: Any) -> None:
+        if data.generated_sql and data.generated_sql not in self._sql:
+            self._sql.append(data.generated_sql)
+        if "result" not in data:
+            return
+        columns = [field.name for field in data.result.schema.fields]
+        # Slices of repeated Struct fields can't be converted by proto-plus
+        rows = [[_compact(row.get(column)) for column in columns]
+                for row in itertools.islice(data.result.data, self._max_rows)]
+        result = {
+            "columns": columns,
+            "rows": rows,
+            "total_rows": len(data.result.data),
+        }
+        if data.result.name:
+            result["name"] = data.result.name
+        self._results.append(result)
+
+    def to_dict(self) -> Dict[str, Any]:
+        response: Dict[str, Any] = {
+            "status": "error" if self._errors and not self._answer
+            else "success",
+            "answer": "\n".join(self._answer),
+        }
+        if self._followup_questions:
+            response["followup_questions"] = self._followup_questions
+        if self._sql:
+            response["sql"] = self._sql
+        if self._results:
+            response["results"] = self._results
+        if self._errors:
+            response["errors"] = self._errors
+        return response
+
+
+def _compact(value: Any) -> Any:
+    # google.protobuf.Struct numbers are doubles
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, Mapping):
+        return {key: _compact(item) for key, item in value.items()}
+    if isinstance(value, Sequence) and not isinstance(value, str):
+        return [_compact(item) for item in value]
+    return value
@@ -4,7 +4,6 @@ import os
 import re
 from ..config import Config
 from google.protobuf.json_format import MessageToDict
-import altair as alt
 import proto
 from google.adk.tools import FunctionTool, ToolContext
 from google.genai import types
@@ -13,14 +12,67 @@ import io
 from google.adk.tools import FunctionTool, ToolContext
 from google.cloud import geminidataanalytics
 from google.genai.types import Part, Blob
-import altair as alt
-from io import BytesIO
-from typing import Dict, Any
+from contextlib import aclosing
+from typing import AsyncIterator, Dict, Any
 from google.cloud import geminidataanalytics
+from .ca_bootstrap import ensure_conversation, get_async_data_chat_client
+from .chart_renderer import ChartRenderer
+from .gcs_images import GcsImageFetcher
+from .lakehouse_response import LakehouseResponse
 
 logger = logging.getLogger(__name__)
-data_chat_client = geminidataanalytics.DataChatServiceClient()
 configs = Config()
+chart_renderer = ChartRenderer(max_workers=configs.chart_render_workers,
+                               cache_size=configs.chart_cache_size)
+
+
+SYSTEM_MESSAGE_KINDS = ("text", "schema", "data", "analysis", "chart", "error")
+
+
+async def chat_with_data_agent(
+    question: str,
+    tool_context: ToolContext
+) -> AsyncIterator[geminidataanalytics.Message]:
+    """
+    Asks the data agent of the session a question and streams its replies.
+    The replies are read with an async client, so the event loop keeps
+    serving other sessions while the data agent works.
+    """
+    await ensure_conversation(tool_context.state)
+
+    messages = [geminidataanalytics.Message()]
+    messages[0].user_message.text = question
+
+    # Create a conversation_reference
+    conversation_reference = geminidataanalytics.ConversationReference()
+    conversation_reference.conversation = tool_context.state["conversation_name"]
+    conversation_reference.data_agent_context.data_agent = tool_context.state["agent_name"]
+
+    request = geminidataanalytics.ChatRequest(
+        parent=tool_context.state["agent_parent"],
+        messages=messages,
+        conversation_reference=conversation_reference
+    )
+    stream = await get_async_data_chat_client().chat(request=request)
+    async for reply in stream:
+        # Progress of the data agent, e.g. the schema was resolved or the
+        # query returned data
+        kind = next((kind for kind in SYSTEM_MESSAGE_KINDS
+                     if kind in reply.system_message), None)
+        logger.info("Data agent replied with a %s message", kind or "system")
+        yield reply
+
+
+# Function to safely convert protobuf map/composite types to Python dicts
+def _convert_proto(v):
+    if isinstance(v, proto.marshal.collections.maps.MapComposite):
+        return {k: _convert_proto(v) for k, v in v.items()}
+    elif isinstance(v, proto.marshal.collections.RepeatedComposite):
+        return [_convert_proto(el) for el in v]
+    elif isinstance(v, (int, float, str, bool)):
+        return v
+    else:
+        return MessageToDict(v)
 
 
 # Define the ADK Function Tool (Must be async since client.chat streams)
@@ -30,74 +82,32 @@ async def query_and_save_chart(
 ) -> Dict[str, Any]:
     """
     Queries the Conversational Analytics API, extracts chart data (Vega-Lite), 
-    renders it as a PNG, and saves the image to ADK artifact storage.
+    renders it as a PNG (or SVG, or keeps the Vega-Lite JSON, see
+    chart_format) and saves the chart to ADK artifact storage.
     """
     try:
-        # --- 1. Your Existing API Call Logic ---
-        input_message = [geminidataanalytics.Message(
-            user_message=geminidataanalytics.UserMessage(text=question)
-        )]
-        
-        # Ensure 'agent_parent' is available in context (e.g., from agent setup)
-        parent_name = tool_context.state["agent_parent"]
-        data_agent_id = tool_context.state["agent_name"]
-        
-        billing_project =configs.CLOUD_PROJECT
-        location = configs.CLOUD_LOCATION
-        conversation_id= tool_context.state["conversation_name"]
-
-        # Create a conversation_reference
-        conversation_reference = geminidataanalytics.ConversationReference()
-        conversation_reference.conversation = conversation_id
-        conversation_reference.data_agent_context.data_agent = data_agent_id
-
-        client = geminidataanalytics.DataChatServiceClient()
-        request = geminidataanalytics.ChatRequest(
-            messages=input_message,
-            parent=parent_name,
-            conversation_reference=conversation_reference, # messages field expects a list
-        )
-        # Use a synchronous client.chat call within an async function
-        stream = client.chat(request=request)
-
-        chart_data = None
-        # --- 2. Process the Streaming Response ---
-        for reply in stream:
-            if reply.system_message and reply.system_message.chart:
-                if "result" in reply.system_message.chart:
+        # --- 1. Stream the replies of the data agent ---
+        async with aclosing(chat_with_data_agent(question, tool_context)) as replies:
+            # --- 2. Process the Streaming Response ---
+            async for reply in replies:
+                if reply.system_message and reply.system_message.chart:
+                    if "result" not in reply.system_message.chart:
+                        continue
                     # --- 3. Extract and Render the Chart ---
-                    # Function to safely convert protobuf map/composite types to Python dicts
-                    def _convert_proto(v):
-                        if isinstance(v, proto.marshal.collections.maps.MapComposite):
-                            return {k: _convert_proto(v) for k, v in v.items()}
-                        elif isinstance(v, proto.marshal.collections.RepeatedComposite):
-                            return [_convert_proto(el) for el in v]
-                        elif isinstance(v, (int, float, str, bool)):
-                            return v
-                        else:
-                            return MessageToDict(v)
-
                     # Extract the Vega-Lite specification
                     vega_config = _convert_proto(reply.system_message.chart.result.vega_config)
-                    
-                    # Use Altair to create the chart object from the Vega-Lite spec
-                    chart = alt.Chart.from_dict(vega_config)
+                    # Rendered off the event loop, or reused if rendered before
+                    chart = await chart_renderer.render(vega_config, configs.chart_format)
 
-                    # Save the chart as a PNG to an in-memory buffer
-                    buffer = BytesIO()
-                    chart.save(buffer, format='png')
-                    buffer.seek(0)
-                    chart.display()
-
-                    # --- 4. Save the PNG to ADK Artifacts ---
+                    # --- 4. Save the chart to ADK Artifacts ---
                     # Create the ADK Part object for binary data
                     chart_artifact = Part(
                         inline_data=Blob(
-                            mime_type="image/png",
-                            data=buffer.read()
+                            mime_type=chart.mime_type,
+                            data=chart.data
                         )
                     )
-                    filename = f"analytics_chart.png"                    
+                    filename = f"analytics_chart.{chart.file_extension}"
                     # Save the artifact using the ToolContext (must use await)
                     version = await tool_context.save_artifact(
                         filename=filename,
@@ -125,89 +135,77 @@ analytics_chart_tool = FunctionTool(func=query_and_save_chart)
 async def  ask_lakehouse(
     question: str,
     tool_context: ToolContext,
-) -> str:
-    
-    messages = [geminidataanalytics.Message()]
-    messages[0].user_message.text = question
-
-    agent_name = tool_context.state["agent_name"] 
-    conversation_name = tool_context.state["conversation_name"]
-    parent = tool_context.state["agent_parent"]
-
-    billing_project =configs.CLOUD_PROJECT
-    # Create a conversation_reference
-    conversation_reference = geminidataanalytics.ConversationReference()
-    conversation_reference.conversation = conversation_name
-    conversation_reference.data_agent_context.data_agent = agent_name
-
-    # Form the request
-    request = geminidataanalytics.ChatRequest(
-        parent = parent,
-        messages = messages,
-        conversation_reference = conversation_reference
-    )
+) -> Dict[str, Any]:
+    """
+    Answers a question about the bus stops, incidents and image reports in the lakehouse.
 
-    # Make the request
-    stream = data_chat_client.chat(request=request)
-    # Handle the response
-    responses = []
-    for response in stream:
-        responses.append(str(response.system_message))
-    
-    return responses
+    Returns:
+        the answer, the SQL queries which were run and their results as columns and
+        rows. A result has at most ask_lakehouse_max_rows rows; total_rows is the
+        number of rows the query returned. followup_questions are questions
+        the data agent suggests asking next.
+    """
+    response = LakehouseResponse(max_rows=configs.ask_lakehouse_max_rows)
+    async for reply in chat_with_data_agent(question, tool_context):
+        response.add(reply)
+    return response.to_dict()
 
 
 # Initialize GCS client (Authenticates using Application Default Credentials)
 gcs_client = storage.Client()
+image_fetcher = GcsImageFetcher(gcs_client,
+                                max_dimension=configs.image_max_dimension,
+                                max_workers=configs.image_workers,
+                                max_cache_bytes=configs.image_cache_size_mb * 1024 * 1024)
+
+# Session state key of the saved images: SHA-256 -> artifact filename and version
+IMAGE_ARTIFACTS_KEY = "image_artifacts"
 
 async def save_image_from_gcs(
     gs_uri: str, 
     tool_context: ToolContext ) -> dict:
     """
-    1. Reads image data from GCS.
-    2. Saves the image data as an ADK artifact.
+    1. Reads image data from GCS, downscaled to image_max_dimension.
+    2. Saves the image data as an ADK artifact, unless the session already has it.
     """
     try:
-        # 1. Download the image blob from GCS
+        # 1. Download the image blob from GCS, or reuse the unchanged cached image
         logger.info(f"Attempting to download {gs_uri} from GCS bucket...")
-        if not gs_uri.startswith("gs://"):
-                raise ValueError("Invalid GCS URI format. Must start with 'gs://'")
-            # Remove the "gs://" prefix
-        path_without_prefix = gs_uri[len("gs://"):]
-                # Split the path into bucket and object parts
-        parts = path_without_prefix.split("/", 1)
-        if len(parts) < 2:
-                raise ValueError("Invalid GCS URI format. Must include bucket and object.")
-        bucket_name = parts[0]
-        image_name = parts[1]
-        file_name= os.path.basename(gs_uri)
-        gcs_bucket = gcs_client.bucket(bucket_name)
-        gcs_blob = gcs_bucket.blob(image_name)
-
-        if not gcs_blob.exists():
+        image = await image_fetcher.fetch(gs_uri)
+        if image is None:
             return {
                 "status": "error",
-                "message": f"Error: GCS object gs://{bucket_name}/{image_name} not found."
+                "message": f"Error: GCS object {gs_uri} not found."
             }
 
-        # Download the content bytes
-        image_bytes = gcs_blob.download_as_bytes()
-        logger.info(f"Successfully downloaded {len(image_bytes)} bytes.")
+        # 2. Skip images which were already saved in this session
+        saved_images = tool_context.state.get(IMAGE_ARTIFACTS_KEY) or {}
+        saved = saved_images.get(image.sha256)
+        if saved:
+            return {
+                "status": "success",
+                "message": f"Image '{saved['filename']}' is already saved in Artifact Service (Version {saved['version']}).",
+                "image_filename": saved["filename"]
+            }
 
-        # 2. Create a types.Part object for the artifact
+        # 3. Create a types.Part object for the artifact
+        file_name = os.path.basename(gs_uri)
         image_artifact_part = types.Part.from_bytes(
-            data=image_bytes,
-            mime_type="image/jpg"
+            data=image.data,
+            mime_type=image.mime_type
         )
 
-        # 3. Save the Part to the ADK Artifact Service
+        # 4. Save the Part to the ADK Artifact Service
         # The artifact_service is configured on the ADK Runner.
         version = await tool_context.save_artifact(
             filename=file_name,
             artifact=image_artifact_part
         )
+        tool_context.state[IMAGE_ARTIFACTS_KEY] = {
+            **saved_images,
+            image.sha256: {"filename": file_name, "version": version}}
         
-        # 4. Construct a response that the agent can use to show the image
+        # 5. Construct a response that the agent can use to show the image
         return {
             "status": "success",
             "message": f"Image '{file_name}' saved to Artifact Service (Version {version}).",
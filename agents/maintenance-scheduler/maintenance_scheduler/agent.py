@@ -25,16 +25,19 @@ from google.genai.types import ThinkingConfig, HttpRetryOptions
 
 from .config import Config
 from .prompts import GLOBAL_INSTRUCTION, INSTRUCTION, AUTONOMOUS_INSTRUCTIONS, \
-    INTERACTIVE_INSTRUCTIONS
+    INTERACTIVE_INSTRUCTIONS, FIND_MAINTENANCE_WINDOWS_INSTRUCTION
 from .shared_libraries.callbacks import (
     rate_limit_callback,
+    record_token_usage,
     after_tool,
 )
 from .tools.email_content_generator import email_content_generator_tool
 from .tools.tools import (
     get_unresolved_incidents_tool,
     get_expected_number_of_passengers_tool,
+    find_maintenance_windows,
     schedule_maintenance_tool,
+    schedule_maintenance_batch_tool,
     get_current_time,
     is_time_on_weekend
 )
@@ -78,19 +81,28 @@ root_agent = Agent(
     ),
     description=configs.root_agent_settings.description,
     global_instruction=GLOBAL_INSTRUCTION
-                       + (AUTONOMOUS_INSTRUCTIONS if configs.autonomous
+                       + (AUTONOMOUS_INSTRUCTIONS.format(
+                           # The toolbox tools have their own names
+                           schedule_maintenance_batch=
+                           schedule_maintenance_batch_tool.__name__)
+                          if configs.autonomous
                           else INTERACTIVE_INSTRUCTIONS),
-    instruction=INSTRUCTION,
+    instruction=INSTRUCTION + ("" if configs.use_mcp_toolbox
+                               else FIND_MAINTENANCE_WINDOWS_INSTRUCTION),
     planner=BuiltInPlanner(
         thinking_config=ThinkingConfig(include_thoughts=configs.show_thoughts)),
     tools=[
         get_unresolved_incidents_tool,
         get_expected_number_of_passengers_tool,
         schedule_maintenance_tool,
+        schedule_maintenance_batch_tool,
         get_current_time,
         email_content_generator_tool,
         is_time_on_weekend
-    ],
+    ] + ([] if configs.use_mcp_toolbox
+         # The MCP toolbox has no equivalent of this tool
+         else [find_maintenance_windows]),
     after_tool_callback=after_tool,
     before_model_callback=rate_limit_callback,
+    after_model_callback=record_token_usage,
 )
\ No newline at end of file
@@ -30,6 +30,12 @@ class AgentModel(BaseModel):
     name: str = Field(description="Agent name. Must be a valid identifier")
     description: str = Field(description="Agent description")
     model: str = Field(description="Model used by the agent")
+    rpm_quota: int = Field(
+        default=10,
+        description="Maximum number of model requests per minute")
+    tpm_quota: int = Field(
+        default=1_000_000,
+        description="Maximum number of model tokens per minute")
 
 
 class Config(BaseSettings):
@@ -75,6 +81,50 @@ class Config(BaseSettings):
     mcp_toolbox_uri: str | None = Field(default="",
                                         description="URI of the MCP server"
                                         )
+    bigquery_max_concurrent_queries: int = Field(
+        default=16,
+        description="Maximum number of BigQuery queries the tools run in parallel")
+    bigquery_query_timeout_secs: float = Field(
+        default=60,
+        description="Deadline for a single BigQuery query issued by the tools")
+    forecast_cache_ttl_secs: float = Field(
+        default=15 * 60,
+        description="How long a bus stop ridership forecast is reused")
+    forecast_cache_max_bus_stops: int = Field(
+        default=10000,
+        description="Maximum number of bus stops with cached forecasts")
+    forecasting_backend: str = Field(
+        default="bigquery",
+        description="Where ridership forecasts come from: 'bigquery' runs "
+                    "TimesFM with AI.FORECAST, 'local' forecasts the "
+                    "ridership dataset in local_ridership_path")
+    use_materialized_forecasts: bool = Field(
+        default=True,
+        description="Indicates if the 'bigquery' forecasting backend reads "
+                    "the forecasts materialized by the "
+                    "materialize_ridership_forecasts procedure, forecasting "
+                    "only the bus stops without recent forecasts on demand")
+    materialized_forecast_max_age_hours: float = Field(
+        default=24,
+        description="Age of the oldest materialized forecast run which is "
+                    "still used")
+    local_ridership_path: str | None = Field(
+        default="",
+        description="Directory of the Parquet or Arrow ridership dataset "
+                    "used by the 'local' forecasting backend")
+    local_forecasting_method: str = Field(
+        default="seasonal_naive",
+        description="Forecasting method of the 'local' forecasting backend: "
+                    "'seasonal_naive' or 'holt_winters'")
+    rate_limit_backend: str = Field(
+        default="memory",
+        description="Where the model rate limits are tracked: 'memory' shares "
+                    "them between the sessions of a process, 'sqlite' between "
+                    "the processes using the same rate_limit_sqlite_path")
+    rate_limit_sqlite_path: str | None = Field(
+        default="",
+        description="SQLite database file used by the 'sqlite' rate limit backend")
+
     def get_bigquery_data_project(self) -> str:
         return self.CLOUD_BIGQUERY_DATA_PROJECT or self.CLOUD_PROJECT
 
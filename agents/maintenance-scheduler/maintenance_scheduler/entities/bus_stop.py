@@ -42,8 +42,17 @@ class BusStopIncident(BaseModel):
       Represents an incident with a bus stop.
     """
 
+    incident_id: str | None = Field(default=None,
+                                    description="Id of the incident")
     bus_stop: BusStop = Field(description="Bus stop")
     incident_image_url: str = Field(description="Image URL")
     incident_image_mime_type: str = Field(description="Image mime")
     status: str = Field(description="Status of the incident")
-    description: str = Field(description="Description of the bus stop")
+    safety_level: int | None = Field(
+        default=None,
+        description="Safety level, from 1 (unsafe) to 3 (no safety concerns)")
+    cleanliness_level: int | None = Field(
+        default=None,
+        description="Cleanliness level, 1 (dirty) or 2 (clean)")
+    description: str | None = Field(default=None,
+                                    description="Description of the bus stop")
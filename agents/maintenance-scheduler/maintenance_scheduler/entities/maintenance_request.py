@@ -0,0 +1,34 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Maintenance request entity module."""
+
+from pydantic import BaseModel, Field, ConfigDict
+
+
+class MaintenanceRequest(BaseModel):
+    """
+    Request to schedule maintenance of a bus stop
+    """
+
+    bus_stop_id: str = Field(description="Bus stop id")
+    maintenance_start: str = Field(
+        description="Date and time of the maintenance work")
+    reason: str = Field(
+        description="Explanation why this bus stop and time was selected")
+    notification_subject: str = Field(
+        description="Subject of the email to send to crew supervisor")
+    notification_content: str = Field(
+        description="Text of the email to send to crew supervisor")
+    model_config = ConfigDict(from_attributes=True)
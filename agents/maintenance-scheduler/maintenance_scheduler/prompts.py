@@ -31,7 +31,7 @@ INTERACTIVE_INSTRUCTIONS = """
 AUTONOMOUS_INSTRUCTIONS = """
 *   Assume that you need to schedule work autonomously
 *   Select the best possible solution and execute without confirmation
-*   Schedule one bus stop at a time
+*   Once the time and the notification are prepared for all the selected bus stops, schedule them with a single call to '{schedule_maintenance_batch}'
 *   Report if more bus stops require maintenance after completing scheduling
 """
 
@@ -56,4 +56,8 @@ INSTRUCTIONS:
   * Round the scheduled time to the nearest hour.
   * Schedule time at least a half an hour in the future.
   * You must use 'email_notification_generator' tool to generate notification content. 
-"""
\ No newline at end of file
+"""
+
+# Only added when the agent has the find_maintenance_windows tool
+FIND_MAINTENANCE_WINDOWS_INSTRUCTION = """  * Use 'find_maintenance_windows' to find the maintenance times affecting the fewest passengers. Request all the bus stops with the same type of maintenance in a single call.
+"""
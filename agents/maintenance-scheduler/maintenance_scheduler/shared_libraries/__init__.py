@@ -14,5 +14,6 @@
 """ includes all shared libraries for the agent."""
 from .callbacks import after_tool
 from .callbacks import rate_limit_callback
+from .callbacks import record_token_usage
 
-__all__ = ["rate_limit_callback", "after_tool"]
+__all__ = ["rate_limit_callback", "record_token_usage", "after_tool"]
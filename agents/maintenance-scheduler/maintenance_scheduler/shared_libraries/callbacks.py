@@ -15,70 +15,130 @@
 """Callback functions for Maintenance Scheduling Agent."""
 
 import logging
-import time
 from typing import Any, Dict, Optional
 
 from google.adk.agents.callback_context import CallbackContext
-from google.adk.models import LlmRequest
+from google.adk.models import LlmRequest, LlmResponse
 from google.adk.tools import BaseTool, ToolContext
 from google.genai.types import Part, FileData
 
+from maintenance_scheduler.config import Config
 from maintenance_scheduler.entities.bus_stop import BusStopIncident
+from maintenance_scheduler.shared_libraries.rate_limiter import \
+    ModelRateLimiter, create_backend
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
-RATE_LIMIT_SECS = 60
-RPM_QUOTA = 10
+configs = Config()
 
+# Rough number of characters per token, used to estimate the size of a request
+# before it's sent to the model.
+CHARS_PER_TOKEN = 4
 
-def rate_limit_callback(
+rate_limit_backend = create_backend(configs.rate_limit_backend,
+                                    configs.rate_limit_sqlite_path)
+
+# Budgets are tracked per model, agents using the same model share them. If
+# they configure different quotas, the first agent's quotas apply.
+rate_limiters: Dict[str, ModelRateLimiter] = {}
+for agent_settings in (configs.root_agent_settings,
+                       configs.email_generator_agent_settings):
+    rate_limiters.setdefault(agent_settings.model, ModelRateLimiter(
+        model=agent_settings.model,
+        rpm_quota=agent_settings.rpm_quota,
+        tpm_quota=agent_settings.tpm_quota,
+        backend=rate_limit_backend))
+
+# Session state keys of the request being sent; "temp:" keys aren't persisted
+_MODEL_KEY = "temp:rate_limit_model"
+_CHARGED_PROMPT_TOKENS_KEY = "temp:rate_limit_charged_prompt_tokens"
+
+
+def _estimate_number_of_tokens(llm_request: LlmRequest) -> int:
+    number_of_chars = 0
+    for content in llm_request.contents:
+        for part in content.parts or []:
+            if part.text:
+                number_of_chars += len(part.text)
+            # Tool calls and results are sent to the model as JSON
+            if part.function_call:
+                number_of_chars += len(
+                    part.function_call.model_dump_json(exclude_none=True))
+            if part.function_response:
+                number_of_chars += len(
+                    part.function_response.model_dump_json(exclude_none=True))
+    if llm_request.config and llm_request.config.system_instruction:
+        number_of_chars += len(str(llm_request.config.system_instruction))
+    return number_of_chars // CHARS_PER_TOKEN + 1
+
+
+async def rate_limit_callback(
     callback_context: CallbackContext, llm_request: LlmRequest
 ) -> None:
     """Callback function that implements a query rate limit.
 
+    The request waits, without blocking other sessions, until it fits into
+    the requests per minute and tokens per minute budgets of the agent's model.
+
     Args:
       callback_context: A CallbackContext obj representing the active callback
         context.
       llm_request: A LlmRequest obj representing the active LLM request.
     """
     for content in llm_request.contents:
-        for part in content.parts:
+        for part in content.parts or []:
             if part.text == "":
                 part.text = " "
 
-    now = time.time()
-    if "timer_start" not in callback_context.state:
-        callback_context.state["timer_start"] = now
-        callback_context.state["request_count"] = 1
-        logger.debug(
-            "rate_limit_callback [timestamp: %i, "
-            "req_count: 1, elapsed_secs: 0]",
-            now,
-        )
+    rate_limiter = rate_limiters.get(llm_request.model)
+    if rate_limiter is None:
         return
 
-    request_count = callback_context.state["request_count"] + 1
-    elapsed_secs = now - callback_context.state["timer_start"]
+    estimated_tokens = _estimate_number_of_tokens(llm_request)
+    waited_secs = await rate_limiter.acquire(estimated_tokens)
+    # Reconciled with the actual prompt size by record_token_usage
+    callback_context.state[_MODEL_KEY] = llm_request.model
+    callback_context.state[_CHARGED_PROMPT_TOKENS_KEY] = min(
+        estimated_tokens, rate_limiter.tokens.capacity)
     logger.debug(
-        "rate_limit_callback [timestamp: %i, request_count: %i,"
-        " elapsed_secs: %i]",
-        now,
-        request_count,
-        elapsed_secs,
+        "rate_limit_callback [model: %s, estimated_tokens: %i, "
+        "waited_secs: %.1f]",
+        rate_limiter.model,
+        estimated_tokens,
+        waited_secs,
     )
 
-    if request_count > RPM_QUOTA:
-        delay = RATE_LIMIT_SECS - elapsed_secs + 1
-        if delay > 0:
-            logger.debug("Sleeping for %i seconds", delay)
-            time.sleep(delay)
-        callback_context.state["timer_start"] = now
-        callback_context.state["request_count"] = 1
-    else:
-        callback_context.state["request_count"] = request_count
 
-    return
+async def record_token_usage(
+    callback_context: CallbackContext, llm_response: LlmResponse
+) -> None:
+    """Charges the actual token usage to the tokens per minute budget.
+
+    The generated tokens are charged, and the difference between the actual
+    and the estimated number of prompt tokens is charged or returned.
+
+    Args:
+      callback_context: A CallbackContext obj representing the active callback
+        context.
+      llm_response: A LlmResponse obj representing the model response.
+    """
+    usage = llm_response.usage_metadata
+    if usage is None or callback_context.state.get(_MODEL_KEY) is None:
+        return None
+    rate_limiter = rate_limiters.get(callback_context.state[_MODEL_KEY])
+    charged_prompt_tokens = callback_context.state.get(
+        _CHARGED_PROMPT_TOKENS_KEY) or 0
+    # Only the first response with usage metadata is reconciled
+    callback_context.state[_MODEL_KEY] = None
+    if rate_limiter is None:
+        return None
+
+    prompt_tokens = usage.prompt_token_count or charged_prompt_tokens
+    await rate_limiter.record_tokens(prompt_tokens - charged_prompt_tokens
+                                     + (usage.candidates_token_count or 0)
+                                     + (usage.thoughts_token_count or 0))
+    return None
 
 
 def lowercase_value(value):
@@ -0,0 +1,78 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+  Vectorized time zone conversion of UTC timestamps, expressed as
+  microseconds since the epoch.
+
+  The UTC offset is only looked up at the start of each hour, so the
+  conversion of any number of timestamps costs one time zone lookup per
+  distinct hour.
+"""
+
+import datetime
+import functools
+from typing import List, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+MICROS_PER_MINUTE = 60 * 1_000_000
+MICROS_PER_HOUR = 60 * MICROS_PER_MINUTE
+MICROS_PER_DAY = 24 * MICROS_PER_HOUR
+
+
+@functools.lru_cache(maxsize=65536)
+def _utc_offset_micros(hour: int, time_zone: str) -> int:
+    return (EPOCH + datetime.timedelta(hours=hour)).astimezone(
+        ZoneInfo(time_zone)).utcoffset() // datetime.timedelta(microseconds=1)
+
+
+def to_local(timestamps: np.ndarray, time_zone: str) -> np.ndarray:
+    """
+      Converts UTC timestamps to the wall clock time of the time zone, both
+      as microseconds since the epoch.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    hours, hour_index = np.unique(timestamps // MICROS_PER_HOUR,
+                                  return_inverse=True)
+    offsets = np.array([_utc_offset_micros(int(hour), time_zone)
+                        for hour in hours], dtype=np.int64)
+    return timestamps + offsets[hour_index.reshape(timestamps.shape)]
+
+
+def local_hour_and_weekday(timestamps: np.ndarray,
+                           time_zone: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+      Converts UTC timestamps to the hour of the day and the day of the week
+      (0 is Monday) in the time zone.
+    """
+    local = to_local(timestamps, time_zone)
+    local_hour = (local // MICROS_PER_HOUR) % 24
+    # 1970-01-01 was a Thursday
+    local_weekday = (local // MICROS_PER_DAY + 3) % 7
+    return local_hour, local_weekday
+
+
+def format_local(timestamps: np.ndarray, time_zone: str) -> List[str]:
+    """
+      Formats UTC timestamps as "%m/%d/%Y %H:%M" wall clock times of the time
+      zone.
+    """
+    iso = np.datetime_as_string(
+        to_local(timestamps, time_zone).astype("datetime64[us]"), unit="m")
+    # YYYY-MM-DDTHH:MM
+    return [f"{value[5:7]}/{value[8:10]}/{value[:4]} {value[11:16]}"
+            for value in iso.tolist()]
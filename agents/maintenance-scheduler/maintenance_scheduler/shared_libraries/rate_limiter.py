@@ -0,0 +1,269 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Token bucket rate limiting of model requests."""
+
+import asyncio
+import contextlib
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucketBackend(ABC):
+    """Storage of token bucket state."""
+
+    # Backends which can block, e.g. on I/O or locks, are called on worker
+    # threads so that they don't stall the event loop.
+    blocking = False
+
+    @abstractmethod
+    def try_acquire(self, key: str, amount: float, capacity: float,
+                    refill_per_sec: float) -> float:
+        """
+          Takes tokens from a bucket if there are enough of them.
+
+          Args:
+              key: bucket key
+              amount: number of tokens to take
+              capacity: maximum number of tokens in the bucket
+              refill_per_sec: number of tokens added to the bucket every second
+
+          Returns:
+              0 if the tokens were taken, otherwise the number of seconds
+              until the bucket has enough tokens
+        """
+
+    @abstractmethod
+    def consume(self, key: str, amount: float, capacity: float,
+                refill_per_sec: float) -> None:
+        """
+          Takes tokens from a bucket unconditionally. The bucket can go into
+          debt, which delays the following acquisitions.
+        """
+
+    @staticmethod
+    def _refill(tokens: float, updated: float, now: float, capacity: float,
+                refill_per_sec: float) -> float:
+        return min(capacity, tokens + (now - updated) * refill_per_sec)
+
+    @staticmethod
+    def _wait_time(tokens: float, amount: float,
+                   refill_per_sec: float) -> float:
+        return (amount - tokens) / refill_per_sec
+
+
+class InMemoryTokenBucketBackend(TokenBucketBackend):
+    """Token buckets shared by all the sessions of the current process."""
+
+    def __init__(self):
+        self._buckets: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def try_acquire(self, key: str, amount: float, capacity: float,
+                    refill_per_sec: float) -> float:
+        with self._lock:
+            tokens = self._current_tokens(key, capacity, refill_per_sec)
+            if tokens >= amount:
+                self._buckets[key] = (tokens - amount, time.monotonic())
+                return 0
+            return self._wait_time(tokens, amount, refill_per_sec)
+
+    def consume(self, key: str, amount: float, capacity: float,
+                refill_per_sec: float) -> None:
+        with self._lock:
+            tokens = self._current_tokens(key, capacity, refill_per_sec)
+            self._buckets[key] = (tokens - amount, time.monotonic())
+
+    def _current_tokens(self, key: str, capacity: float,
+                        refill_per_sec: float) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (capacity, now))
+        return self._refill(tokens, updated, now, capacity, refill_per_sec)
+
+
+class SQLiteTokenBucketBackend(TokenBucketBackend):
+    """
+      Token buckets stored in a SQLite database file.
+
+      Processes which share the file share the buckets, which makes this
+      backend a stand-in for a shared store (e.g. Redis or Memorystore) when
+      several replicas run on the same host or share a volume.
+    """
+
+    # Waits up to 10 seconds for the database lock
+    blocking = True
+
+    def __init__(self, path: str):
+        self._path = path
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS token_buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, "
+                "updated REAL NOT NULL)")
+
+    def try_acquire(self, key: str, amount: float, capacity: float,
+                    refill_per_sec: float) -> float:
+        with self._connect() as connection:
+            tokens = self._current_tokens(connection, key, capacity,
+                                          refill_per_sec)
+            if tokens >= amount:
+                self._store(connection, key, tokens - amount)
+                return 0
+            return self._wait_time(tokens, amount, refill_per_sec)
+
+    def consume(self, key: str, amount: float, capacity: float,
+                refill_per_sec: float) -> None:
+        with self._connect() as connection:
+            tokens = self._current_tokens(connection, key, capacity,
+                                          refill_per_sec)
+            self._store(connection, key, tokens - amount)
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # IMMEDIATE transactions take the write lock upfront which serializes
+        # the read-modify-write cycles across processes.
+        connection = sqlite3.connect(self._path, timeout=10,
+                                     isolation_level=None)
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    def _current_tokens(self, connection: sqlite3.Connection, key: str,
+                        capacity: float, refill_per_sec: float) -> float:
+        now = time.time()
+        row = connection.execute(
+            "SELECT tokens, updated FROM token_buckets WHERE key = ?",
+            (key,)).fetchone()
+        tokens, updated = row if row else (capacity, now)
+        return self._refill(tokens, updated, now, capacity, refill_per_sec)
+
+    @staticmethod
+    def _store(connection: sqlite3.Connection, key: str,
+               tokens: float) -> None:
+        connection.execute(
+            "INSERT INTO token_buckets (key, tokens, updated) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, "
+            "updated = excluded.updated",
+            (key, tokens, time.time()))
+
+
+class TokenBucket:
+    """
+      Token bucket which allows `capacity` tokens per `period_secs`.
+
+      Waiting for tokens yields the event loop, so other sessions keep running
+      while a request is throttled.
+    """
+
+    def __init__(self, key: str, capacity: float, period_secs: float,
+                 backend: TokenBucketBackend):
+        self.key = key
+        self.capacity = capacity
+        self.refill_per_sec = capacity / period_secs
+        self._backend = backend
+
+    async def acquire(self, amount: float = 1) -> float:
+        """
+          Waits until the tokens are available and takes them.
+
+          Returns:
+              number of seconds spent waiting
+        """
+        # Requests larger than the bucket would never fit, they only need to
+        # wait for the bucket to be full.
+        amount = min(amount, self.capacity)
+        waited = 0.
+        while True:
+            wait_secs = await self._call_backend(self._backend.try_acquire,
+                                                 amount)
+            if wait_secs <= 0:
+                return waited
+            await asyncio.sleep(wait_secs)
+            waited += wait_secs
+
+    async def consume(self, amount: float) -> None:
+        """
+          Takes tokens without waiting, e.g. to account for actual usage.
+          A negative amount returns tokens to the bucket.
+        """
+        await self._call_backend(self._backend.consume, amount)
+
+    async def _call_backend(self, method, amount: float):
+        if self._backend.blocking:
+            return await asyncio.to_thread(method, self.key, amount,
+                                           self.capacity, self.refill_per_sec)
+        return method(self.key, amount, self.capacity, self.refill_per_sec)
+
+
+class ModelRateLimiter:
+    """Requests per minute and tokens per minute budgets of a model."""
+
+    def __init__(self, model: str, rpm_quota: int, tpm_quota: int,
+                 backend: TokenBucketBackend):
+        self.model = model
+        self.requests = TokenBucket(f"{model}:rpm", rpm_quota, 60, backend)
+        self.tokens = TokenBucket(f"{model}:tpm", tpm_quota, 60, backend)
+
+    async def acquire(self, estimated_tokens: int) -> float:
+        """
+          Waits until both a request and the estimated number of tokens fit
+          into the budgets.
+
+          Returns:
+              number of seconds spent waiting
+        """
+        waited = await self.requests.acquire(1)
+        waited += await self.tokens.acquire(estimated_tokens)
+        return waited
+
+    async def record_tokens(self, tokens: int) -> None:
+        """
+          Charges tokens which were not known when the request was made, or
+          returns overestimated ones if the number is negative.
+        """
+        if tokens:
+            await self.tokens.consume(tokens)
+
+
+def create_backend(backend: str,
+                   sqlite_path: Optional[str] = None) -> TokenBucketBackend:
+    """
+      Creates token bucket backend.
+
+      Args:
+          backend: "memory" or "sqlite"
+          sqlite_path: database file used by the "sqlite" backend
+    """
+    if backend == "memory":
+        return InMemoryTokenBucketBackend()
+    if backend == "sqlite":
+        if not sqlite_path:
+            raise ValueError(
+                "rate_limit_sqlite_path must be set when rate_limit_backend "
+                "is 'sqlite'.")
+        return SQLiteTokenBucketBackend(sqlite_path)
+    raise ValueError(f"Unknown rate limit backend: {backend}")
@@ -0,0 +1,278 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+  Local synthetic ridership generator.
+
+  Produces the same kind of data as the generate_synthetic_ridership
+  procedure, without BigQuery, so that forecasting and tool benchmarks can run
+  offline. The number of riders follows the generate_number_of_riders SQL
+  function.
+
+  Usage:
+      python -m maintenance_scheduler.shared_libraries.ridership_simulator \
+          --num-bus-stops 100000 --days 31 --output /tmp/ridership
+"""
+
+import argparse
+import datetime
+import logging
+import os
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional, Sequence, Union
+
+import numpy as np
+
+from maintenance_scheduler.shared_libraries.local_time import (
+    EPOCH, MICROS_PER_MINUTE, local_hour_and_weekday
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIME_ZONE = "America/New_York"
+# Values the generate_synthetic_ridership procedure uses in absence of
+# real weather data
+DEFAULT_TEMPERATURE = 293.15
+DEFAULT_PRECIPITATION = 0.
+
+OUTPUT_FORMATS = ("parquet", "arrow")
+
+FloatArray = Union[float, np.ndarray]
+
+
+@dataclass
+class BusStopProfiles:
+    """Ridership profiles of bus stops, one array element per bus stop."""
+    bus_stop_ids: np.ndarray
+    base_number_of_riders: np.ndarray
+    busy_in_morning: np.ndarray
+    busy_in_evening: np.ndarray
+    busy_on_weekend: np.ndarray
+
+    @classmethod
+    def generate(cls, bus_stop_ids: Sequence[str],
+                 rng: np.random.Generator) -> "BusStopProfiles":
+        """Generates random profiles the same way as the SQL procedure."""
+        count = len(bus_stop_ids)
+        return cls(
+            bus_stop_ids=np.asarray(bus_stop_ids, dtype=str),
+            # CAST(RAND() * 10 AS INT64) rounds, so 10 and 20 are half as
+            # likely as the other numbers
+            base_number_of_riders=10 + np.rint(
+                rng.random(count) * 10).astype(np.int64),
+            busy_in_morning=rng.random(count) < 0.5,
+            busy_in_evening=rng.random(count) < 0.5,
+            busy_on_weekend=rng.random(count) < 0.5)
+
+    def __len__(self):
+        return len(self.bus_stop_ids)
+
+    def slice(self, start: int, stop: int) -> "BusStopProfiles":
+        return BusStopProfiles(
+            bus_stop_ids=self.bus_stop_ids[start:stop],
+            base_number_of_riders=self.base_number_of_riders[start:stop],
+            busy_in_morning=self.busy_in_morning[start:stop],
+            busy_in_evening=self.busy_in_evening[start:stop],
+            busy_on_weekend=self.busy_on_weekend[start:stop])
+
+
+def event_timestamps(start: datetime.datetime, days: int,
+                     interval_minutes: int = 5) -> np.ndarray:
+    """Returns UTC timestamps, as microseconds since the epoch, of the days."""
+    start_micros = (start - EPOCH) // datetime.timedelta(microseconds=1)
+    count = days * 24 * 60 // interval_minutes
+    return start_micros + np.arange(count, dtype=np.int64) * (
+        interval_minutes * MICROS_PER_MINUTE)
+
+
+def number_of_riders(base_number_of_riders: np.ndarray,
+                     busy_in_morning: np.ndarray,
+                     busy_in_evening: np.ndarray,
+                     busy_on_weekend: np.ndarray,
+                     temperature: FloatArray,
+                     precipitation: FloatArray,
+                     local_hour: np.ndarray,
+                     local_weekday: np.ndarray,
+                     rng: np.random.Generator) -> np.ndarray:
+    """
+      Vectorized version of the generate_number_of_riders SQL function.
+
+      Bus stop arguments are arrays of shape (bus stops,), time arguments are
+      arrays of shape (time points,). Temperature (in Kelvin) and
+      precipitation are scalars or arrays broadcastable to
+      (bus stops, time points). Returns the number of riders of shape
+      (bus stops, time points).
+    """
+    base = base_number_of_riders[:, None].astype(np.float64)
+
+    temperature_multiplier = np.where(
+        np.asarray(temperature) < 270, .7,
+        np.where(np.asarray(temperature) > 305, .4, 1.))
+
+    precipitation_multiplier = 1 / (1 + np.asarray(precipitation))
+
+    is_weekday = (local_weekday < 5)[None, :]
+    day_multiplier = np.where(
+        is_weekday, 2., np.where(busy_on_weekend[:, None], 3., 1.))
+
+    hour = local_hour[None, :]
+    hour_multiplier = np.select(
+        [hour <= 6,
+         (hour >= 7) & (hour <= 9),
+         (hour >= 15) & (hour <= 18)],
+        [0.,
+         np.where(busy_in_morning[:, None], 1.5, 1.3),
+         np.where(busy_in_evening[:, None], 1.5, 1.3)],
+        default=1.)
+
+    variance = .9 + rng.random(
+        (len(base_number_of_riders), len(local_hour))) / 5
+
+    riders = (base * temperature_multiplier * precipitation_multiplier
+              * day_multiplier * hour_multiplier * variance)
+    # CAST(... AS INT64) rounds halfway cases away from zero
+    return np.floor(riders + .5).astype(np.int64)
+
+
+def simulate_ridership(
+    bus_stop_ids: Sequence[str],
+    start: datetime.datetime,
+    days: int,
+    interval_minutes: int = 5,
+    time_zone: str = DEFAULT_TIME_ZONE,
+    temperature: FloatArray = DEFAULT_TEMPERATURE,
+    precipitation: FloatArray = DEFAULT_PRECIPITATION,
+    seed: int = 0,
+    bus_stops_per_chunk: int = 1000
+) -> Iterator[Dict[str, np.ndarray]]:
+    """
+      Generates ridership of the bus stops in chunks of bus stops.
+
+      Args:
+          bus_stop_ids: ids of the bus stops
+          start: first time point
+          days: number of days to generate
+          interval_minutes: minutes between time points
+          time_zone: time zone of the peak hours and weekdays
+          temperature: temperature in Kelvin, a scalar or an array of shape
+            (time points,)
+          precipitation: total precipitation over the last 6 hours, a scalar
+            or an array of shape (time points,)
+          seed: seed of the random generator; the same seed and arguments
+            produce the same data
+          bus_stops_per_chunk: number of bus stops per chunk
+
+      Returns:
+          Iterator of chunks. A chunk is a dict of flat column arrays with the
+          columns of the bus_ridership table, sorted by bus stop and time.
+          event_ts is a datetime64[us] array in UTC.
+    """
+    rng = np.random.default_rng(seed)
+    profiles = BusStopProfiles.generate(bus_stop_ids, rng)
+    timestamps = event_timestamps(start, days, interval_minutes)
+    local_hour, local_weekday = local_hour_and_weekday(timestamps, time_zone)
+    temperature = np.broadcast_to(np.asarray(temperature, dtype=np.float64),
+                                  timestamps.shape)
+    precipitation = np.broadcast_to(
+        np.asarray(precipitation, dtype=np.float64), timestamps.shape)
+
+    for chunk_start in range(0, len(profiles), bus_stops_per_chunk):
+        chunk = profiles.slice(chunk_start, chunk_start + bus_stops_per_chunk)
+        riders = number_of_riders(
+            chunk.base_number_of_riders, chunk.busy_in_morning,
+            chunk.busy_in_evening, chunk.busy_on_weekend,
+            temperature[None, :], precipitation[None, :],
+            local_hour, local_weekday, rng)
+        yield {
+            "bus_stop_id": np.repeat(chunk.bus_stop_ids, len(timestamps)),
+            "event_ts": np.tile(timestamps, len(chunk)).astype(
+                "datetime64[us]"),
+            "temperature": np.tile(temperature, len(chunk)),
+            "total_precipitation_6hr": np.tile(precipitation, len(chunk)),
+            "num_riders": riders.ravel()
+        }
+
+
+def write_dataset(chunks: Iterator[Dict[str, np.ndarray]], directory: str,
+                  output_format: str = "parquet") -> int:
+    """
+      Writes the chunks to a directory, one file per chunk, as Parquet or
+      Arrow IPC files which can be read as a single pyarrow dataset.
+
+      Returns:
+          Number of rows written
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format: {output_format}")
+    try:
+        import pyarrow as pa
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError as ex:
+        raise ImportError(
+            "pyarrow is required to write the ridership dataset") from ex
+
+    os.makedirs(directory, exist_ok=True)
+    rows = 0
+    for i, chunk in enumerate(chunks):
+        table = pa.table({
+            "bus_stop_id": chunk["bus_stop_id"],
+            "event_ts": pa.array(chunk["event_ts"], pa.timestamp("us", "UTC")),
+            "temperature": chunk["temperature"],
+            "total_precipitation_6hr": chunk["total_precipitation_6hr"],
+            "num_riders": chunk["num_riders"]
+        })
+        path = os.path.join(directory, f"part-{i:05d}.{output_format}")
+        if output_format == "parquet":
+            pyarrow.parquet.write_table(table, path)
+        else:
+            pyarrow.feather.write_feather(table, path, compression="lz4")
+        rows += table.num_rows
+    return rows
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Generates a synthetic ridership dataset")
+    parser.add_argument("--output", required=True,
+                        help="Directory of the dataset")
+    parser.add_argument("--num-bus-stops", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=31)
+    parser.add_argument("--interval-minutes", type=int, default=5)
+    parser.add_argument("--start", type=datetime.datetime.fromisoformat,
+                        help="First time point, defaults to DAYS days ago")
+    parser.add_argument("--time-zone", default=DEFAULT_TIME_ZONE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", choices=OUTPUT_FORMATS,
+                        default="parquet")
+    args = parser.parse_args(argv)
+
+    start = args.start or (datetime.datetime.now(datetime.timezone.utc)
+                           - datetime.timedelta(days=args.days))
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=datetime.timezone.utc)
+    start = start.replace(second=0, microsecond=0)
+
+    bus_stop_ids = [f"stop-{i}" for i in range(1, args.num_bus_stops + 1)]
+    rows = write_dataset(
+        simulate_ridership(bus_stop_ids, start, args.days,
+                           interval_minutes=args.interval_minutes,
+                           time_zone=args.time_zone, seed=args.seed),
+        args.output, args.format)
+    logger.info("Wrote %d rows to %s", rows, args.output)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,216 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Async execution of BigQuery queries for the agent tools."""
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional, Sequence
+
+from google.cloud import bigquery
+from google.cloud.bigquery.job import QueryJob, QueryJobConfig
+
+logger = logging.getLogger(__name__)
+
+
+class QueryExecutor(ABC):
+    """
+      Runs the queries of the agent tools. The tools use BigQueryExecutor;
+      other implementations, e.g. a local stand-in for benchmarks, run the
+      same GoogleSQL queries elsewhere.
+    """
+
+    @abstractmethod
+    async def query(
+        self,
+        query: str,
+        query_parameters: Optional[Sequence] = None,
+        timeout_secs: Optional[float] = None,
+        row_mapper: Optional[Callable[[bigquery.Row], Any]] = None,
+        max_results: Optional[int] = None,
+        cancellable: bool = False
+    ) -> List[Any]:
+        """Runs a query and returns the rows of the result."""
+
+    @abstractmethod
+    async def get_table(self, table_id: str,
+                        timeout_secs: Optional[float] = None) -> Any:
+        """Retrieves table metadata, e.g. the last modification time."""
+
+    def shutdown(self) -> None:
+        """Releases the resources of the executor."""
+
+
+class BigQueryExecutor(QueryExecutor):
+    """
+      Runs BigQuery queries on a bounded thread pool so that async tools
+      don't block the event loop while waiting for query results.
+
+      Every query has a deadline which covers both the query execution and
+      fetching of the results. Queries run with query_and_wait, so that the
+      client's job creation mode can skip creating a job for short queries.
+      Cancellable queries always create a job instead; if the deadline
+      expires or the calling task is cancelled the job is cancelled as well,
+      even if it's only created after the deadline.
+    """
+
+    def __init__(self, client: bigquery.Client, project: str,
+                 max_concurrent_queries: int,
+                 default_timeout_secs: float):
+        self._client = client
+        self._project = project
+        self._default_timeout_secs = default_timeout_secs
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_concurrent_queries,
+            thread_name_prefix="bigquery-query")
+
+    async def query(
+        self,
+        query: str,
+        query_parameters: Optional[Sequence] = None,
+        timeout_secs: Optional[float] = None,
+        row_mapper: Optional[Callable[[bigquery.Row], Any]] = None,
+        max_results: Optional[int] = None,
+        cancellable: bool = False
+    ) -> List[Any]:
+        """
+          Runs a query and returns the rows of the result.
+
+          Args:
+              query: GoogleSQL query or script
+              query_parameters: query parameters referenced by the query
+              timeout_secs: deadline for the query, defaults to the executor's
+                default timeout
+              row_mapper: function applied to every row as the result pages
+                are fetched, so that the raw rows don't need to be kept
+              max_results: maximum number of rows to fetch, defaults to all
+                the rows
+              cancellable: whether to cancel the query when the deadline
+                expires; use it for expensive queries, it always creates a
+                BigQuery job
+
+          Returns:
+              list of result rows, or the values returned by the row mapper
+
+          Raises:
+              TimeoutError: if the query didn't complete before the deadline
+        """
+        timeout_secs = timeout_secs or self._default_timeout_secs
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout_secs
+
+        job_config = QueryJobConfig(
+            query_parameters=list(query_parameters or []),
+            job_timeout_ms=int(timeout_secs * 1000))
+
+        if not cancellable:
+            return await asyncio.wait_for(
+                loop.run_in_executor(self._pool, self._query_and_wait, query,
+                                     job_config, timeout_secs, row_mapper,
+                                     max_results),
+                timeout=deadline - loop.time())
+
+        start = self._pool.submit(self._start_job, query, job_config)
+        try:
+            job = await asyncio.wait_for(asyncio.wrap_future(start),
+                                         timeout=deadline - loop.time())
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # The job may still be created once the request returns
+            start.add_done_callback(self._cancel_started_job)
+            raise
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(self._pool, self._fetch_rows, job,
+                                     deadline - loop.time(), row_mapper,
+                                     max_results),
+                timeout=deadline - loop.time())
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            logger.warning("Cancelling BigQuery job %s", job.job_id)
+            # Cancellation is a quick API call; it's done on the pool to avoid
+            # blocking the loop, and its outcome is only logged.
+            self._pool.submit(self._cancel_job, job)
+            raise
+
+    async def get_table(self, table_id: str,
+                        timeout_secs: Optional[float] = None
+                        ) -> bigquery.Table:
+        """
+          Retrieves table metadata, e.g. the last modification time.
+
+          Args:
+              table_id: fully qualified table id
+              timeout_secs: deadline for the call, defaults to the executor's
+                default timeout
+
+          Returns:
+              the table
+        """
+        timeout_secs = timeout_secs or self._default_timeout_secs
+        loop = asyncio.get_running_loop()
+        return await asyncio.wait_for(
+            loop.run_in_executor(self._pool, self._client.get_table,
+                                 table_id),
+            timeout=timeout_secs)
+
+    def _start_job(self, query: str, job_config: QueryJobConfig) -> QueryJob:
+        return self._client.query(query, job_config=job_config,
+                                  project=self._project)
+
+    def _query_and_wait(self, query: str, job_config: QueryJobConfig,
+                        timeout_secs: float,
+                        row_mapper: Optional[Callable[[bigquery.Row], Any]],
+                        max_results: Optional[int]) -> List[Any]:
+        rows = self._client.query_and_wait(
+            query, job_config=job_config, project=self._project,
+            api_timeout=timeout_secs, wait_timeout=timeout_secs,
+            max_results=max_results)
+        return self._map_rows(rows, row_mapper)
+
+    @classmethod
+    def _fetch_rows(cls, job: QueryJob, timeout_secs: float,
+                    row_mapper: Optional[Callable[[bigquery.Row], Any]],
+                    max_results: Optional[int]) -> List[Any]:
+        rows = job.result(timeout=max(timeout_secs, 0),
+                          max_results=max_results)
+        return cls._map_rows(rows, row_mapper)
+
+    @staticmethod
+    def _map_rows(rows: Iterable[bigquery.Row],
+                  row_mapper: Optional[Callable[[bigquery.Row], Any]]
+                  ) -> List[Any]:
+        # The remaining pages are fetched while iterating
+        if row_mapper is None:
+            return list(rows)
+        return [row_mapper(row) for row in rows]
+
+    def _cancel_started_job(self, start: Future) -> None:
+        if start.cancelled() or start.exception() is not None:
+            return
+        job = start.result()
+        logger.warning("Cancelling BigQuery job %s", job.job_id)
+        self._pool.submit(self._cancel_job, job)
+
+    @staticmethod
+    def _cancel_job(job: QueryJob) -> None:
+        try:
+            job.cancel()
+        except Exception as ex:
+            logger.error("Failed to cancel BigQuery job %s: %s", job.job_id,
+                         str(ex))
+
+    def shutdown(self) -> None:
+        """Stops accepting new queries and releases the worker threads."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -24,6 +24,8 @@ from .email_content_generator_prompts import INSTRUCTION
 from maintenance_scheduler.config import Config
 from maintenance_scheduler.entities.notification import Email, \
     MaintenanceNotification
+from maintenance_scheduler.shared_libraries.callbacks import \
+    rate_limit_callback, record_token_usage
 
 configs = Config()
 
@@ -38,7 +40,9 @@ email_notification_generator = Agent(
     output_schema=Email,
     output_key="email",
     disallow_transfer_to_parent=True,
-    disallow_transfer_to_peers=True
+    disallow_transfer_to_peers=True,
+    before_model_callback=rate_limit_callback,
+    after_model_callback=record_token_usage,
 )
 
 email_content_generator_tool = \
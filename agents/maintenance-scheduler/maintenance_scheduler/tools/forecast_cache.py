@@ -0,0 +1,202 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cache of ridership forecasts keyed by bus stop."""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import (
+    Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+)
+
+
+class ForecastCache:
+    """
+      Size bounded, TTL based cache of ridership forecasts.
+
+      Each entry holds the forecast of a single bus stop so that requests for
+      overlapping lists of bus stops can share the cached forecasts. The least
+      recently used entries are evicted once the cache reaches its size limit.
+
+      The cache tracks the version of the ridership data the forecasts were
+      produced from. Changing the version, e.g. when new ridership rows land,
+      drops all the entries, and forecasts of an older version which complete
+      afterwards aren't stored.
+    """
+
+    def __init__(self, ttl_secs: float, max_bus_stops: int,
+                 clock: Callable[[], float] = time.monotonic):
+        self._ttl_secs = ttl_secs
+        self._max_bus_stops = max_bus_stops
+        self._clock = clock
+        self._entries: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+        self._data_version: Optional[Hashable] = None
+        self._lock = threading.Lock()
+        # (data version, bus stop id) -> forecast of the bus stop in progress
+        self._in_flight: Dict[Tuple[Hashable, str], asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_many(self, bus_stop_ids: List[str],
+                 data_version: Optional[Hashable] = None
+                 ) -> Tuple[Dict[str, Any], List[str]]:
+        """
+          Looks up forecasts of several bus stops.
+
+          Args:
+              bus_stop_ids: ids of the bus stops
+              data_version: current version of the ridership data, see
+                set_data_version
+
+          Returns:
+              A tuple of the cached forecasts keyed by bus stop id and the list
+              of bus stop ids which are not in the cache
+        """
+        found = {}
+        missing = []
+        now = self._clock()
+        with self._lock:
+            if data_version is not None:
+                self._set_data_version(data_version)
+            for bus_stop_id in dict.fromkeys(bus_stop_ids):
+                entry = self._entries.get(bus_stop_id)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(bus_stop_id)
+                    found[bus_stop_id] = entry[1]
+                    self.hits += 1
+                else:
+                    if entry is not None:
+                        del self._entries[bus_stop_id]
+                    missing.append(bus_stop_id)
+                    self.misses += 1
+        return found, missing
+
+    def put(self, bus_stop_id: str, forecast: Any,
+            data_version: Optional[Hashable] = None) -> None:
+        """
+          Stores the forecast of a bus stop.
+
+          Args:
+              bus_stop_id: id of the bus stop
+              forecast: the forecast
+              data_version: version of the ridership data the forecast was
+                produced from; the forecast isn't stored if the version
+                changed since
+        """
+        with self._lock:
+            if (data_version is not None
+                    and data_version != self._data_version):
+                return
+            self._entries[bus_stop_id] = (self._clock() + self._ttl_secs,
+                                          forecast)
+            self._entries.move_to_end(bus_stop_id)
+            while len(self._entries) > self._max_bus_stops:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def set_data_version(self, data_version: Hashable) -> None:
+        """
+          Records the version of the ridership data and drops all the entries
+          if it differs from the version the cached forecasts were built from.
+        """
+        with self._lock:
+            self._set_data_version(data_version)
+
+    def _set_data_version(self, data_version: Hashable) -> None:
+        if data_version == self._data_version:
+            return
+        if self._data_version is not None:
+            self.invalidations += 1
+        self._entries.clear()
+        self._data_version = data_version
+
+    async def get_or_forecast(
+        self, bus_stop_ids: List[str], data_version: Hashable,
+        forecast: Callable[[List[str]], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """
+          Returns the forecasts of the bus stops, producing and storing the
+          ones which aren't cached.
+
+          Concurrent calls don't forecast the same bus stop twice; a call
+          waits for the forecasts another call is already producing for the
+          same data version.
+
+          Args:
+              bus_stop_ids: ids of the bus stops
+              data_version: current version of the ridership data
+              forecast: produces the forecasts of the given bus stops, keyed
+                by bus stop id, with an entry for every bus stop
+
+          Returns:
+              the forecasts keyed by bus stop id
+        """
+        forecasts, missing = self.get_many(bus_stop_ids, data_version)
+        waiting = {}
+        to_forecast = []
+        for bus_stop_id in missing:
+            in_flight = self._in_flight.get((data_version, bus_stop_id))
+            if in_flight is None:
+                to_forecast.append(bus_stop_id)
+            else:
+                waiting[bus_stop_id] = in_flight
+
+        if to_forecast:
+            task = asyncio.ensure_future(forecast(to_forecast))
+            keys = [(data_version, bus_stop_id) for bus_stop_id in to_forecast]
+            for key in keys:
+                self._in_flight[key] = task
+            # The task completes for the waiting calls even if this call is
+            # cancelled, so its forecasts are stored when it's done
+            task.add_done_callback(
+                lambda done: self._forecast_done(done, keys))
+            for bus_stop_id in to_forecast:
+                waiting[bus_stop_id] = task
+
+        for bus_stop_id, in_flight in waiting.items():
+            forecasts[bus_stop_id] = (
+                await asyncio.shield(in_flight))[bus_stop_id]
+        return forecasts
+
+    def _forecast_done(self, task: asyncio.Future,
+                       keys: List[Tuple[Hashable, str]]) -> None:
+        for key in keys:
+            if self._in_flight.get(key) is task:
+                del self._in_flight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        forecasts = task.result()
+        for data_version, bus_stop_id in keys:
+            self.put(bus_stop_id, forecasts[bus_stop_id], data_version)
+
+    def invalidate(self) -> None:
+        """Drops all the entries."""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        """Returns the cache counters."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
@@ -0,0 +1,208 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Columnar ridership forecasts and their responses to the model."""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from maintenance_scheduler.shared_libraries.local_time import (
+    MICROS_PER_HOUR, MICROS_PER_MINUTE, format_local, to_local
+)
+from maintenance_scheduler.tools.forecasting import Forecast
+
+# "points" lists every forecast point with its time, "compact" lists the
+# number of passengers after a start time and a step, "hourly" is "compact"
+# averaged over the hours of the time zone.
+RESPONSE_FORMATS = ("points", "compact", "hourly")
+
+# (UTC start, UTC end, total expected number of passengers) of a time window
+Window = Tuple[int, int, int]
+
+
+@dataclass
+class ForecastSeries:
+    """
+      Forecast of a bus stop on a regular time grid.
+
+      values[i] is the expected number of passengers at
+      start_micros + i * step_micros (microseconds since the epoch, UTC), NaN
+      if the forecast has no point at that time.
+    """
+    start_micros: int
+    step_micros: int
+    values: np.ndarray
+
+    @classmethod
+    def from_forecast(cls, forecast: Forecast) -> Optional["ForecastSeries"]:
+        """Converts a forecast to a series, None if the forecast is empty."""
+        if not forecast:
+            return None
+        micros = np.rint(np.fromiter(
+            (timestamp.timestamp() for timestamp, _ in forecast),
+            dtype=np.float64, count=len(forecast)) * 1e6).astype(np.int64)
+        passengers = np.fromiter(
+            (number_of_passengers for _, number_of_passengers in forecast),
+            dtype=np.float64, count=len(forecast))
+
+        start = int(micros.min())
+        intervals = np.diff(np.unique(micros))
+        step = (int(np.gcd.reduce(intervals)) if len(intervals)
+                else MICROS_PER_MINUTE)
+        values = np.full(int(micros.max() - start) // step + 1, np.nan)
+        values[(micros - start) // step] = passengers
+        return cls(start_micros=start, step_micros=step, values=values)
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return (self.start_micros
+                + np.arange(len(self.values), dtype=np.int64)
+                * self.step_micros)
+
+    def between(self, start_micros: int,
+                end_micros: int) -> Optional["ForecastSeries"]:
+        """Returns the points within [start, end], None if there are none."""
+        first = max(0, -(-(start_micros - self.start_micros)
+                         // self.step_micros))
+        last = min(len(self.values) - 1,
+                   (end_micros - self.start_micros) // self.step_micros)
+        if last < first:
+            return None
+        return ForecastSeries(
+            start_micros=self.start_micros + first * self.step_micros,
+            step_micros=self.step_micros,
+            values=self.values[first:last + 1])
+
+    def hourly(self, time_zone: str) -> "ForecastSeries":
+        """Averages the forecast over the hours of the time zone."""
+        timestamps = self.timestamps
+        # Offset of the local hours from the UTC hours, e.g. 30 minutes in
+        # India. It doesn't change with daylight saving time, so the local
+        # hours are exactly an hour apart.
+        shift = (to_local(timestamps, time_zone) - timestamps) % MICROS_PER_HOUR
+        hours = (timestamps + shift) // MICROS_PER_HOUR
+        buckets = hours - hours[0]
+        known = ~np.isnan(self.values)
+        totals = np.bincount(buckets[known], weights=self.values[known],
+                             minlength=buckets[-1] + 1)
+        counts = np.bincount(buckets[known], minlength=buckets[-1] + 1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(counts > 0, totals / counts, np.nan)
+        return ForecastSeries(
+            start_micros=int(hours[0] * MICROS_PER_HOUR - shift[0]),
+            step_micros=MICROS_PER_HOUR,
+            values=means)
+
+    def quietest_windows(self, window_minutes: int, count: int,
+                         allowed_starts: Optional[np.ndarray] = None
+                         ) -> List[Window]:
+        """
+          Finds non-overlapping time windows with the fewest expected
+          passengers.
+
+          Args:
+              window_minutes: length of a window
+              count: maximum number of windows to return
+              allowed_starts: boolean mask of the points a window may start
+                at, all points by default
+
+          Returns:
+              Up to count windows, quietest first. Windows with gaps in the
+              forecast are skipped.
+        """
+        window_steps = max(1, -(-window_minutes * MICROS_PER_MINUTE
+                                // self.step_micros))
+        if count <= 0 or window_steps > len(self.values):
+            return []
+
+        gaps = np.isnan(self.values)
+        passengers = np.concatenate(([0.], np.cumsum(np.where(gaps, 0.,
+                                                              self.values))))
+        gap_counts = np.concatenate(([0], np.cumsum(gaps)))
+        totals = passengers[window_steps:] - passengers[:-window_steps]
+        candidates = (gap_counts[window_steps:]
+                      - gap_counts[:-window_steps]) == 0
+        if allowed_starts is not None:
+            candidates &= allowed_starts[:len(totals)]
+
+        order = np.argsort(np.where(candidates, totals, np.inf),
+                           kind="stable")
+        taken = np.zeros(len(self.values), dtype=bool)
+        windows = []
+        for start in order[:np.count_nonzero(candidates)].tolist():
+            if taken[start:start + window_steps].any():
+                continue
+            taken[start:start + window_steps] = True
+            start_micros = self.start_micros + start * self.step_micros
+            windows.append((start_micros,
+                            start_micros + window_steps * self.step_micros,
+                            int(round(totals[start]))))
+            if len(windows) == count:
+                break
+        return windows
+
+
+def format_series(series: ForecastSeries, response_format: str,
+                  time_zone: str) -> Any:
+    """
+      Formats a forecast for the model.
+
+      Args:
+          series: forecast of a bus stop
+          response_format: one of RESPONSE_FORMATS
+          time_zone: time zone of the formatted times
+
+      Returns:
+          A list of {"time", "number_of_passengers"} dictionaries for the
+          "points" format, otherwise a dictionary with the "start" time, the
+          "step_minutes" and the list of "number_of_passengers", null for
+          gaps in the forecast.
+    """
+    if response_format not in RESPONSE_FORMATS:
+        raise ValueError(f"Unknown response format: {response_format}")
+    if response_format == "hourly":
+        series = series.hourly(time_zone)
+
+    known = ~np.isnan(series.values)
+    if response_format == "points":
+        times = format_local(series.timestamps[known], time_zone)
+        passengers = np.rint(series.values[known]).astype(np.int64).tolist()
+        return [{'time': time, 'number_of_passengers': number_of_passengers}
+                for time, number_of_passengers in zip(times, passengers)]
+
+    passengers = np.rint(np.where(known, series.values, 0)).astype(
+        np.int64).tolist()
+    if not known.all():
+        passengers = [number_of_passengers if is_known else None
+                      for number_of_passengers, is_known
+                      in zip(passengers, known.tolist())]
+    return {
+        'start': format_local(np.array([series.start_micros]), time_zone)[0],
+        'step_minutes': series.step_micros // MICROS_PER_MINUTE,
+        'number_of_passengers': passengers
+    }
+
+
+def format_windows(windows: List[Window],
+                   time_zone: str) -> List[Dict[str, Any]]:
+    """Formats time windows for the model."""
+    if not windows:
+        return []
+    times = format_local(np.array([time for start, end, _ in windows
+                                   for time in (start, end)]), time_zone)
+    return [{'start': times[2 * i], 'end': times[2 * i + 1],
+             'number_of_passengers': number_of_passengers}
+            for i, (_, _, number_of_passengers) in enumerate(windows)]
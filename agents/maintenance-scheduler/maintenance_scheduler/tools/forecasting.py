@@ -0,0 +1,494 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Ridership forecasting backends of the passenger forecast tool."""
+
+import asyncio
+import datetime
+import glob
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from google.cloud import bigquery
+
+from maintenance_scheduler.tools.bigquery_executor import QueryExecutor
+
+logger = logging.getLogger(__name__)
+
+# Forecast of a bus stop: (UTC forecast timestamp, expected number of
+# passengers) tuples in time order
+Forecast = List[Tuple[datetime.datetime, int]]
+
+LOCAL_FORECASTING_METHODS = ("seasonal_naive", "holt_winters")
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+_MINUTE_MICROS = 60 * 1_000_000
+
+
+class ForecastingBackend(ABC):
+    """Produces ridership forecasts of bus stops."""
+
+    @abstractmethod
+    async def data_version(self) -> Hashable:
+        """
+          Returns the version of the ridership data. Cached forecasts are
+          dropped when the version changes.
+        """
+
+    @abstractmethod
+    async def forecast(self, bus_stop_ids: List[str]) -> Dict[str, Forecast]:
+        """
+          Forecasts the ridership of the bus stops from now until the end of
+          the forecast horizon.
+
+          Returns:
+              A dictionary, where the key is the bus stop id and the value is
+              the forecast. Bus stops without ridership history are omitted.
+        """
+
+
+class BigQueryForecastingBackend(ForecastingBackend):
+    """Forecasts ridership with TimesFM, using BigQuery AI.FORECAST."""
+
+    def __init__(self, executor: QueryExecutor, ridership_table: str):
+        self._executor = executor
+        self._ridership_table = ridership_table
+
+    async def data_version(self) -> Hashable:
+        ridership_table = await self._executor.get_table(self._ridership_table)
+        return ridership_table.modified
+
+    async def forecast(self, bus_stop_ids: List[str]) -> Dict[str, Forecast]:
+        rows = await self._executor.query(
+            query_parameters=[
+                bigquery.ArrayQueryParameter('bus_stop_ids', "STRING",
+                                             bus_stop_ids)
+            ],
+            query=f"""
+            WITH forecast AS (
+                SELECT
+                  bus_stop_id, forecast_timestamp,
+                  CAST(forecast_value AS INT64) as expected_number_of_passengers
+                FROM
+                  AI.FORECAST(
+                    (SELECT bus_stop_id, event_ts, num_riders
+                      FROM `{self._ridership_table}`
+                      WHERE bus_stop_id IN UNNEST(@bus_stop_ids)),
+                    data_col => 'num_riders',
+                    timestamp_col => 'event_ts',
+                    model => 'TimesFM 2.0',
+                    id_cols => ['bus_stop_id'],
+                    horizon => 500,
+                    confidence_level => .8)
+            )
+            SELECT bus_stop_id, forecast_timestamp, expected_number_of_passengers
+                FROM forecast WHERE forecast_timestamp BETWEEN CURRENT_TIMESTAMP() AND TIMESTAMP_ADD(CURRENT_TIMESTAMP(), INTERVAL 3 DAY) """,
+            # TimesFM runs are expensive, don't let abandoned ones finish
+            cancellable=True
+        )
+
+        forecasts = {}
+        for row in rows:
+            forecasts.setdefault(row.bus_stop_id, []).append(
+                (row.forecast_timestamp.replace(tzinfo=datetime.timezone.utc),
+                 row.expected_number_of_passengers))
+        return forecasts
+
+
+class MaterializedForecastingBackend(ForecastingBackend):
+    """
+      Reads forecasts precomputed by the materialize_ridership_forecasts
+      procedure. The ridership_forecasts table is partitioned by forecast run
+      and clustered by bus stop, so a lookup of a few bus stops in the recent
+      runs only reads a few blocks.
+
+      Bus stops without a forecast run within max_age, e.g. new bus stops, are
+      forecasted on demand by the fallback backend.
+    """
+
+    def __init__(self, executor: QueryExecutor, forecasts_table: str,
+                 fallback: ForecastingBackend,
+                 max_age: datetime.timedelta = datetime.timedelta(hours=24)):
+        self._executor = executor
+        self._forecasts_table = forecasts_table
+        self._fallback = fallback
+        self._max_age = max_age
+
+    async def data_version(self) -> Hashable:
+        forecasts_table, fallback_version = await asyncio.gather(
+            self._executor.get_table(self._forecasts_table),
+            self._fallback.data_version(), return_exceptions=True)
+        if isinstance(fallback_version, BaseException):
+            raise fallback_version
+        if isinstance(forecasts_table, BaseException):
+            # Forecasts are then read from the fallback backend
+            logger.error("Failed to get the forecasts table: %s",
+                         str(forecasts_table))
+            return None, fallback_version
+        return forecasts_table.modified, fallback_version
+
+    async def forecast(self, bus_stop_ids: List[str]) -> Dict[str, Forecast]:
+        try:
+            rows = await self._executor.query(
+                query_parameters=[
+                    bigquery.ArrayQueryParameter('bus_stop_ids', "STRING",
+                                                 bus_stop_ids),
+                    bigquery.ScalarQueryParameter(
+                        'max_age_minutes', "INT64",
+                        self._max_age // datetime.timedelta(minutes=1))
+                ],
+                query=f"""
+                SELECT bus_stop_id, forecast_timestamp, expected_number_of_passengers
+                FROM `{self._forecasts_table}`
+                WHERE forecast_run_ts >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL @max_age_minutes MINUTE)
+                    AND bus_stop_id IN UNNEST(@bus_stop_ids)
+                    AND forecast_timestamp BETWEEN CURRENT_TIMESTAMP() AND TIMESTAMP_ADD(CURRENT_TIMESTAMP(), INTERVAL 3 DAY)
+                QUALIFY forecast_run_ts = MAX(forecast_run_ts) OVER (PARTITION BY bus_stop_id)
+                ORDER BY bus_stop_id, forecast_timestamp"""
+            )
+        except Exception as ex:
+            logger.error("Failed to read materialized forecasts: %s", str(ex))
+            rows = []
+
+        forecasts = {}
+        for row in rows:
+            forecasts.setdefault(row.bus_stop_id, []).append(
+                (row.forecast_timestamp.replace(tzinfo=datetime.timezone.utc),
+                 row.expected_number_of_passengers))
+
+        missing_bus_stop_ids = [bus_stop_id for bus_stop_id in bus_stop_ids
+                                if bus_stop_id not in forecasts]
+        if missing_bus_stop_ids:
+            logger.info("Forecasting %d bus stops without recent "
+                        "materialized forecasts on demand",
+                        len(missing_bus_stop_ids))
+            forecasts.update(
+                await self._fallback.forecast(missing_bus_stop_ids))
+        return forecasts
+
+
+@dataclass
+class RidershipHistory:
+    """
+      Ridership of bus stops on a regular time grid.
+
+      values[i, j] is the number of riders of bus_stop_ids[i] at
+      start_micros + j * interval_micros (microseconds since the epoch, UTC),
+      NaN if there is no data point.
+    """
+    bus_stop_ids: List[str]
+    start_micros: int
+    interval_micros: int
+    values: np.ndarray
+
+    def __post_init__(self):
+        self.index = {bus_stop_id: i
+                      for i, bus_stop_id in enumerate(self.bus_stop_ids)}
+
+    @classmethod
+    def from_columns(cls, bus_stop_ids: np.ndarray, event_ts: np.ndarray,
+                     num_riders: np.ndarray) -> "RidershipHistory":
+        """
+          Builds the grid from bus_ridership columns.
+
+          The interval of the grid is the median interval of the timestamps,
+          rounded to whole minutes, so that a few irregular timestamps don't
+          make the grid finer. Rows are placed in the nearest column.
+
+          Args:
+              bus_stop_ids: bus stop id of every row
+              event_ts: datetime64 timestamps of the rows, in UTC
+              num_riders: number of riders of the rows
+        """
+        micros = np.asarray(event_ts).astype("datetime64[us]").astype(np.int64)
+        unique_ids, rows = np.unique(np.asarray(bus_stop_ids),
+                                     return_inverse=True)
+        timestamps = np.unique(micros)
+        intervals = np.diff(timestamps)
+        interval = _MINUTE_MICROS
+        if len(intervals):
+            interval *= max(int(np.rint(np.median(intervals)
+                                        / _MINUTE_MICROS)), 1)
+        columns = (micros - timestamps[0] + interval // 2) // interval
+
+        values = np.full((len(unique_ids), int(columns.max()) + 1), np.nan,
+                         dtype=np.float32)
+        values[rows, columns] = num_riders
+        return cls(bus_stop_ids=unique_ids.tolist(),
+                   start_micros=int(timestamps[0]),
+                   interval_micros=interval,
+                   values=values)
+
+
+class LocalRidershipStore:
+    """
+      Ridership dataset in a local directory of Parquet or Arrow IPC files,
+      e.g. generated by the ridership simulator or exported from the
+      bus_ridership table.
+
+      The dataset is loaded into memory on first use and reloaded when its
+      files change.
+    """
+
+    def __init__(self, directory: str):
+        self._directory = directory
+        self._history: Optional[RidershipHistory] = None
+        self._version: Optional[Hashable] = None
+        self._lock = threading.Lock()
+
+    def version(self) -> Hashable:
+        """Returns the names and modification times of the dataset files."""
+        return tuple(sorted((path, os.path.getmtime(path))
+                            for path in self._files()))
+
+    def load(self) -> RidershipHistory:
+        """Returns the ridership, reloading it if the files changed."""
+        with self._lock:
+            version = self.version()
+            if self._history is None or version != self._version:
+                self._history = self._read()
+                self._version = version
+                logger.info("Loaded ridership of %d bus stops from %s",
+                            len(self._history.bus_stop_ids), self._directory)
+            return self._history
+
+    def _files(self) -> List[str]:
+        return (glob.glob(os.path.join(self._directory, "*.parquet"))
+                + glob.glob(os.path.join(self._directory, "*.arrow")))
+
+    def _read(self) -> RidershipHistory:
+        try:
+            import pyarrow as pa
+            import pyarrow.dataset
+        except ImportError as ex:
+            raise ImportError(
+                "pyarrow is required to read the ridership dataset") from ex
+
+        files = self._files()
+        if not files:
+            raise FileNotFoundError(
+                f"No ridership files found in {self._directory}")
+        tables = []
+        for extension, file_format in ((".parquet", "parquet"),
+                                       (".arrow", "ipc")):
+            paths = [path for path in files if path.endswith(extension)]
+            if paths:
+                tables.append(
+                    pyarrow.dataset.dataset(paths, format=file_format)
+                    .to_table(columns=["bus_stop_id", "event_ts",
+                                       "num_riders"]))
+        table = pa.concat_tables(tables)
+        return RidershipHistory.from_columns(
+            table.column("bus_stop_id").to_numpy(zero_copy_only=False),
+            table.column("event_ts").to_numpy(),
+            table.column("num_riders").to_numpy())
+
+
+def seasonal_naive_forecast(values: np.ndarray, season_length: int,
+                            steps: np.ndarray,
+                            num_seasons: int = 4) -> np.ndarray:
+    """
+      Forecasts every series as the average of its last seasons.
+
+      Args:
+          values: history of shape (series, time points), NaN for gaps
+          season_length: number of time points per season
+          steps: 1-based steps after the last time point to forecast
+          num_seasons: maximum number of seasons to average
+
+      Returns:
+          array of shape (series, steps)
+    """
+    available_seasons = min(num_seasons, values.shape[1] // season_length)
+    if available_seasons == 0:
+        # Not even a single season of history; fall back to the mean
+        mean = np.nan_to_num(np.nanmean(values, axis=1))
+        return np.repeat(mean[:, None], len(steps), axis=1)
+
+    window = values[:, values.shape[1] - available_seasons * season_length:]
+    profile = np.nanmean(
+        window.reshape(len(values), available_seasons, season_length), axis=1)
+    profile = np.nan_to_num(profile)
+    # The window ends right before step 1, which starts a new season
+    return profile[:, (steps - 1) % season_length]
+
+
+def holt_winters_forecast(values: np.ndarray, season_length: int,
+                          steps: np.ndarray, alpha: float = .2,
+                          beta: float = .01, gamma: float = .1,
+                          num_seasons: int = 3) -> np.ndarray:
+    """
+      Additive Holt-Winters (triple exponential smoothing) forecast, fitted
+      on the last seasons of every series at once.
+
+      Args:
+          values: history of shape (series, time points), NaN for gaps
+          season_length: number of time points per season
+          steps: 1-based steps after the last time point to forecast
+          alpha: level smoothing factor
+          beta: trend smoothing factor
+          gamma: seasonal smoothing factor
+          num_seasons: number of seasons the model is fitted on
+
+      Returns:
+          array of shape (series, steps)
+    """
+    available_seasons = min(num_seasons, values.shape[1] // season_length)
+    if available_seasons < 2:
+        return seasonal_naive_forecast(values, season_length, steps)
+
+    window = values[:, values.shape[1] - available_seasons * season_length:]
+    first_season = np.nan_to_num(window[:, :season_length])
+    level = first_season.mean(axis=1)
+    trend = np.zeros(len(values))
+    seasonal = first_season - level[:, None]
+
+    for t in range(season_length, window.shape[1]):
+        phase = t % season_length
+        observed = window[:, t]
+        # Gaps are filled with the one step ahead forecast
+        observed = np.where(np.isnan(observed),
+                            level + trend + seasonal[:, phase], observed)
+        previous_level = level
+        level = (alpha * (observed - seasonal[:, phase])
+                 + (1 - alpha) * (level + trend))
+        trend = beta * (level - previous_level) + (1 - beta) * trend
+        seasonal[:, phase] = (gamma * (observed - level)
+                              + (1 - gamma) * seasonal[:, phase])
+
+    # The window covers whole seasons, so step 1 has phase 0
+    forecast = (level[:, None] + trend[:, None] * steps[None, :]
+                + seasonal[:, (steps - 1) % season_length])
+    return np.maximum(forecast, 0)
+
+
+class LocalForecastingBackend(ForecastingBackend):
+    """
+      Forecasts ridership from a local ridership store with a vectorized
+      statistical model, batched across all requested bus stops.
+    """
+
+    def __init__(self, store: LocalRidershipStore,
+                 method: str = "seasonal_naive",
+                 season: datetime.timedelta = datetime.timedelta(days=7),
+                 horizon: datetime.timedelta = datetime.timedelta(days=3),
+                 clock: Callable[[], datetime.datetime] = lambda:
+                 datetime.datetime.now(datetime.timezone.utc)):
+        """
+          Args:
+              store: ridership store
+              method: "seasonal_naive" or "holt_winters"
+              season: length of the seasonal pattern, a week by default to
+                capture both the daily and the weekday/weekend patterns
+              horizon: how far from now to forecast
+              clock: returns the current UTC time
+        """
+        if method not in LOCAL_FORECASTING_METHODS:
+            raise ValueError(f"Unknown local forecasting method: {method}")
+        self._store = store
+        self._method = method
+        self._season = season
+        self._horizon = horizon
+        self._clock = clock
+
+    async def data_version(self) -> Hashable:
+        return await asyncio.to_thread(self._store.version)
+
+    async def forecast(self, bus_stop_ids: List[str]) -> Dict[str, Forecast]:
+        return await asyncio.to_thread(self.forecast_sync, bus_stop_ids)
+
+    def forecast_sync(self, bus_stop_ids: Sequence[str]) -> Dict[str, Forecast]:
+        """Synchronous version of forecast."""
+        history = self._store.load()
+        known_ids = [bus_stop_id for bus_stop_id in dict.fromkeys(bus_stop_ids)
+                     if bus_stop_id in history.index]
+        if not known_ids:
+            return {}
+
+        interval = history.interval_micros
+        last_micros = (history.start_micros
+                       + (history.values.shape[1] - 1) * interval)
+        now_micros = (self._clock() - _EPOCH) // _MICROSECOND
+        end_micros = now_micros + self._horizon // _MICROSECOND
+        # Steps are counted from the last data point; a stale dataset is
+        # extrapolated up to the current time.
+        first_step = max(1, -(-(now_micros - last_micros) // interval))
+        last_step = (end_micros - last_micros) // interval
+        if last_step < first_step:
+            return {}
+        steps = np.arange(first_step, last_step + 1)
+
+        values = history.values[[history.index[bus_stop_id]
+                                 for bus_stop_id in known_ids]]
+        season_length = max(1, self._season // _MICROSECOND // interval)
+        if self._method == "holt_winters":
+            predictions = holt_winters_forecast(values, season_length, steps)
+        else:
+            predictions = seasonal_naive_forecast(values, season_length, steps)
+        predictions = np.rint(predictions).astype(np.int64).tolist()
+
+        timestamps = [_EPOCH + datetime.timedelta(microseconds=int(micros))
+                      for micros in last_micros + steps * interval]
+        return {bus_stop_id: list(zip(timestamps, predictions[i]))
+                for i, bus_stop_id in enumerate(known_ids)}
+
+
+def create_forecasting_backend(
+    backend: str,
+    executor: QueryExecutor,
+    ridership_table: str,
+    forecasts_table: Optional[str] = None,
+    materialized_forecast_max_age: Optional[datetime.timedelta] = None,
+    local_ridership_path: Optional[str] = None,
+    local_method: str = "seasonal_naive"
+) -> ForecastingBackend:
+    """
+      Creates forecasting backend.
+
+      Args:
+          backend: "bigquery" or "local"
+          executor: BigQuery executor used by the "bigquery" backend
+          ridership_table: fully qualified bus_ridership table id used by the
+            "bigquery" backend
+          forecasts_table: fully qualified ridership_forecasts table id; if
+            set, the "bigquery" backend reads the materialized forecasts and
+            only forecasts the missing bus stops on demand
+          materialized_forecast_max_age: age of the oldest forecast run the
+            "bigquery" backend uses
+          local_ridership_path: ridership dataset directory used by the
+            "local" backend
+          local_method: forecasting method of the "local" backend
+    """
+    if backend == "bigquery":
+        on_demand = BigQueryForecastingBackend(executor, ridership_table)
+        if not forecasts_table:
+            return on_demand
+        return MaterializedForecastingBackend(
+            executor, forecasts_table, on_demand,
+            max_age=(materialized_forecast_max_age
+                     or datetime.timedelta(hours=24)))
+    if backend == "local":
+        if not local_ridership_path:
+            raise ValueError(
+                "local_ridership_path must be set when forecasting_backend "
+                "is 'local'.")
+        return LocalForecastingBackend(
+            LocalRidershipStore(local_ridership_path), method=local_method)
+    raise ValueError(f"Unknown forecasting backend: {backend}")
@@ -0,0 +1,88 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Search of the maintenance windows affecting the fewest passengers."""
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+from maintenance_scheduler.shared_libraries.local_time import (
+    MICROS_PER_DAY, MICROS_PER_HOUR, MICROS_PER_MINUTE, to_local
+)
+from maintenance_scheduler.tools.forecast_format import ForecastSeries, Window
+
+
+@dataclass
+class MaintenanceWindowConstraints:
+    """When maintenance of a bus stop can take place."""
+    duration_minutes: int
+    time_zone: str
+    # Local hours of the day the maintenance must start and end within, e.g.
+    # 8 and 16 for 8:00 AM to 4:00 PM. None for any time of the day.
+    business_hours_start: Optional[int] = None
+    business_hours_end: Optional[int] = None
+    include_weekends: bool = True
+    # Maintenance starts at the first forecast point of an hour of the time
+    # zone, i.e. at whole hours if the forecast is aligned to the hours
+    start_on_the_hour: bool = True
+    # UTC time, as microseconds since the epoch, of the earliest start
+    earliest_start_micros: Optional[int] = None
+
+
+def allowed_window_starts(series: ForecastSeries,
+                          constraints: MaintenanceWindowConstraints
+                          ) -> np.ndarray:
+    """
+      Returns the boolean mask of the forecast points a maintenance window
+      satisfying the constraints can start at.
+    """
+    starts = series.timestamps
+    ends = starts + constraints.duration_minutes * MICROS_PER_MINUTE
+    local_starts = to_local(starts, constraints.time_zone)
+    local_ends = to_local(ends, constraints.time_zone)
+    # Local midnight before the start
+    local_days = local_starts - local_starts % MICROS_PER_DAY
+
+    allowed = np.ones(len(starts), dtype=bool)
+    if constraints.earliest_start_micros is not None:
+        allowed &= starts >= constraints.earliest_start_micros
+    if constraints.start_on_the_hour:
+        # The first point of every hour, in case the forecast isn't aligned
+        # to the hours
+        allowed &= local_starts % MICROS_PER_HOUR < series.step_micros
+    if constraints.business_hours_start is not None:
+        allowed &= (local_starts - local_days
+                    >= constraints.business_hours_start * MICROS_PER_HOUR)
+    if constraints.business_hours_end is not None:
+        allowed &= (local_ends - local_days
+                    <= constraints.business_hours_end * MICROS_PER_HOUR)
+    if not constraints.include_weekends:
+        # 1970-01-01 was a Thursday
+        allowed &= (local_starts // MICROS_PER_DAY + 3) % 7 < 5
+        allowed &= ((local_ends - 1) // MICROS_PER_DAY + 3) % 7 < 5
+    return allowed
+
+
+def rank_maintenance_windows(series: ForecastSeries,
+                             constraints: MaintenanceWindowConstraints,
+                             count: int) -> List[Window]:
+    """
+      Finds up to count non-overlapping maintenance windows satisfying the
+      constraints with the fewest expected passengers, quietest first.
+    """
+    return series.quietest_windows(
+        constraints.duration_minutes, count,
+        allowed_starts=allowed_window_starts(series, constraints))
@@ -18,19 +18,30 @@
 import logging
 import random
 from datetime import datetime, timedelta
-from typing import List
+from typing import Dict, List, Optional
 from zoneinfo import ZoneInfo
 
 from google.api_core.client_info import ClientInfo
 from google.cloud import bigquery
 from google.cloud.bigquery.enums import JobCreationMode
-from google.cloud.bigquery.job import QueryJobConfig
 
 from toolbox_core import ToolboxSyncClient
 
 from maintenance_scheduler.config import Config
 from maintenance_scheduler.entities.bus_stop import BusStop, BusStopIncident, \
     USAddress
+from maintenance_scheduler.entities.maintenance_request import \
+    MaintenanceRequest
+from maintenance_scheduler.shared_libraries.local_time import EPOCH
+from maintenance_scheduler.tools.bigquery_executor import BigQueryExecutor
+from maintenance_scheduler.tools.forecast_cache import ForecastCache
+from maintenance_scheduler.tools.forecast_format import (
+    RESPONSE_FORMATS, ForecastSeries, format_series, format_windows
+)
+from maintenance_scheduler.tools.forecasting import create_forecasting_backend
+from maintenance_scheduler.tools.maintenance_windows import (
+    MaintenanceWindowConstraints, rank_maintenance_windows
+)
 
 bigquery_client = bigquery.Client(client_info=ClientInfo(
     user_agent="cloud-solutions/data-to-ai-agents-scheduler-usage-v1"),
@@ -39,189 +50,418 @@ bigquery_client = bigquery.Client(client_info=ClientInfo(
 
 config = Config()
 
+bigquery_executor = BigQueryExecutor(
+    client=bigquery_client,
+    project=config.get_bigquery_run_project(),
+    max_concurrent_queries=config.bigquery_max_concurrent_queries,
+    default_timeout_secs=config.bigquery_query_timeout_secs
+)
+
+forecast_cache = ForecastCache(
+    ttl_secs=config.forecast_cache_ttl_secs,
+    max_bus_stops=config.forecast_cache_max_bus_stops
+)
+
+forecasting_backend = create_forecasting_backend(
+    config.forecasting_backend,
+    executor=bigquery_executor,
+    ridership_table=f"{config.get_bigquery_data_project()}.bus_stop_image_processing.bus_ridership",
+    forecasts_table=(
+        f"{config.get_bigquery_data_project()}.bus_stop_image_processing.ridership_forecasts"
+        if config.use_materialized_forecasts else None),
+    materialized_forecast_max_age=timedelta(
+        hours=config.materialized_forecast_max_age_hours),
+    local_ridership_path=config.local_ridership_path,
+    local_method=config.local_forecasting_method
+)
+
 logger = logging.getLogger(__name__)
 
 time_zone = ZoneInfo("America/New_York")
 
 
-async def get_unresolved_incidents() -> List[BusStopIncident]:
-    # TODO: fix the example
+MAX_INCIDENTS_PAGE_SIZE = 500
+
+
+def _to_bus_stop_incident(row: bigquery.Row) -> BusStopIncident:
+    return BusStopIncident(
+        incident_id=row.incident_id,
+        status=row.status.lower(),
+        incident_image_url=row.source_image_uri.replace("gs://",
+                                                        "https://storage.mtls.cloud.google.com/"),
+        incident_image_mime_type=row.source_image_mime_type,
+        description=row.get('description'),
+        safety_level=row.safety_level,
+        cleanliness_level=row.cleanliness_level,
+        bus_stop=BusStop(
+            id=row.bus_stop_id,
+            address=USAddress(
+                street=row.address['street'],
+                city=row.address['city'],
+                state=row.address['state'],
+                zip=row.address['zip'])
+        )
+    )
+
+
+async def get_unresolved_incidents(
+    page_size: int = 50,
+    page_token: str = "",
+    city: str = "",
+    zip_code: str = "",
+    max_safety_level: int = 3,
+    max_cleanliness_level: int = 2,
+    include_descriptions: bool = True
+) -> dict:
     """
       Get a list of unresolved bus stop incidents.
 
+      The incidents are returned in pages. If the result contains a non-empty
+      "next_page_token", call the tool again with that value as the page_token
+      to get the next page.
+
+      Args:
+          page_size: Maximum number of incidents to return, up to 500
+          page_token: "next_page_token" of the previous page, empty for the
+            first page
+          city: Only return incidents in this city, empty for all cities
+          zip_code: Only return incidents with this ZIP code, empty for all
+          max_safety_level: Only return incidents with the safety level at or
+            below this value. Safety level 1 is unsafe, 3 has no safety
+            concerns
+          max_cleanliness_level: Only return incidents with the cleanliness
+            level at or below this value. Cleanliness level 1 is dirty, 2 is
+            clean
+          include_descriptions: Set to False to get a summary of the incidents
+            without the image descriptions
+
       Returns:
-          list: List of bust stop incidents
+          dict: List of bus stop incidents and the token of the next page
 
       Example:
-          >>> get_unresolved_incidents()
-          [BusStopIncident(bus_stop=BusStop(id='5', address=USAddress(street='4999 list Avenue', city='Anytown', state='NY', zip='10001')), source_image_uri='gs://my-bucket-bus-stop-images/images/PA-02.jpg', source_image_mime_type='image/jpeg', status='open', description='"The bus stop appears to have some cleanliness issues. There is litter and dead leaves on the sidewalk and along the curb. The trash can is open and appears to have some trash inside. The bench has some wear and tear, but does not appear to be damaged. There are no obvious safety hazards. The bus stop includes a bench and a trash can. There is a bus stop sign visible in the background."'), BusStopIncident(bus_stop=BusStop(id='7', address=USAddress(street='3643 Tasmanian devil Street', city='Anytown', state='NY', zip='10001')), source_image_uri='gs://my-bucket-bus-stop-images/images/PC-01.jpg', source_image_mime_type='image/jpeg', status='open', description='"The bus stop appears to have a bench, a trash can, and a bus stop sign. The bench has some wear and tear, and there are leaves on the ground around the bench, indicating a need for cleaning. The trash can is present, which is good for cleanliness. There is no visible graffiti or damage to the bus stop amenities. The red curb is in good condition. The overall cleanliness is slightly compromised by the leaves and general wear, warranting a cleaning."')]
+          >>> get_unresolved_incidents(page_size=1)
+          {'status': 'success', 'bus_stop_incidents': [BusStopIncident(incident_id='0e1b2c2a-3d2f-4d3e-9a57-3f2c1b0a9e8d', bus_stop=BusStop(id='5', address=USAddress(street='4999 list Avenue', city='Anytown', state='NY', zip='10001')), incident_image_url='https://storage.mtls.cloud.google.com/my-bucket-bus-stop-images/images/PA-02.jpg', incident_image_mime_type='image/jpeg', status='open', safety_level=3, cleanliness_level=1, description='The bus stop appears to have some cleanliness issues. There is litter and dead leaves on the sidewalk and along the curb.')], 'next_page_token': '0e1b2c2a-3d2f-4d3e-9a57-3f2c1b0a9e8d'}
       """
 
     logger.info("Getting the list of incidents")
+    page_size = max(1, min(page_size, MAX_INCIDENTS_PAGE_SIZE))
     incidents = []
+    next_page_token = ""
     if config.mock_tools:
         incidents.append(
             BusStopIncident(
+                incident_id="incident-1",
                 status="open",
                 bus_stop=BusStop(
                     id='stop-1',
                     address=USAddress(street="123 Main", city="New York",
                                       state="NY", zip="10001")),
-                source_image_uri=f"https://storage.mtls.cloud.google.com/{config.CLOUD_PROJECT}-multimodal/sources/MA-02-broken-glass.jpg",
-                source_image_mime_type="image/jpeg"))
+                incident_image_url=f"https://storage.mtls.cloud.google.com/{config.CLOUD_PROJECT}-multimodal/sources/MA-02-broken-glass.jpg",
+                incident_image_mime_type="image/jpeg",
+                safety_level=1,
+                cleanliness_level=1,
+                description=("Broken glass on the ground next to the bench."
+                             if include_descriptions else None)))
         incidents.append(
             BusStopIncident(
+                incident_id="incident-2",
                 status="open",
                 bus_stop=BusStop(
                     id='stop-2',
                     address=USAddress(
                         street="457 1st Street", city="New York", state="NY",
                         zip="10002")),
-                source_image_uri="https://storage.mtls.cloud.google.com/{config.CLOUD_PROJECT}-multimodal/sources/MC-02-dirty-damaged.jpg",
-                source_image_mime_type="image/jpeg"))
+                incident_image_url=f"https://storage.mtls.cloud.google.com/{config.CLOUD_PROJECT}-multimodal/sources/MC-02-dirty-damaged.jpg",
+                incident_image_mime_type="image/jpeg",
+                safety_level=3,
+                cleanliness_level=1,
+                description=("Litter around the bus stop and a damaged bench."
+                             if include_descriptions else None)))
     else:
         try:
-            rows = bigquery_client.query_and_wait(
-                project=config.get_bigquery_run_project(),
-                job_config=QueryJobConfig(
-                    job_timeout_ms=60 * 1000
-                ),
+            # One extra row tells if there is a next page.
+            incidents = await bigquery_executor.query(
+                query_parameters=[
+                    bigquery.ScalarQueryParameter('page_token', "STRING",
+                                                  page_token),
+                    bigquery.ScalarQueryParameter('city', "STRING", city),
+                    bigquery.ScalarQueryParameter('zip', "STRING", zip_code),
+                    bigquery.ScalarQueryParameter('max_safety_level', "INT64",
+                                                  max_safety_level),
+                    bigquery.ScalarQueryParameter('max_cleanliness_level',
+                                                  "INT64",
+                                                  max_cleanliness_level),
+                    bigquery.ScalarQueryParameter('limit', "INT64",
+                                                  page_size + 1),
+                ],
+                row_mapper=_to_bus_stop_incident,
                 query=f"""
                 SELECT incidents.incident_id, incidents.bus_stop_id, incidents.status,
                     reports.uri as source_image_uri, reports.content_type as source_image_mime_type,
-                    reports.description, bus_stops.address
+                    reports.safety_level, reports.cleanliness_level,
+                    {"reports.description," if include_descriptions else ""}
+                    bus_stops.address
                 FROM `{config.get_bigquery_data_project()}.bus_stop_image_processing.incidents` incidents
                 JOIN `{config.get_bigquery_data_project()}.bus_stop_image_processing.image_reports` reports
                     ON incidents.open_report_id = reports.report_id
                 JOIN `{config.get_bigquery_data_project()}.bus_stop_image_processing.bus_stops` bus_stops
                     ON incidents.bus_stop_id = bus_stops.bus_stop_id
                 WHERE incidents.status = 'OPEN' 
+                    AND (@page_token = '' OR incidents.incident_id > @page_token)
+                    AND (@city = '' OR LOWER(bus_stops.address.city) = LOWER(@city))
+                    AND (@zip = '' OR bus_stops.address.zip = @zip)
+                    AND reports.safety_level <= @max_safety_level
+                    AND reports.cleanliness_level <= @max_cleanliness_level
+                ORDER BY incidents.incident_id
+                LIMIT @limit
             """
             )
-
-            for row in rows:
-                incidents.append(BusStopIncident(
-                    status=row.status.lower(),
-                    incident_image_url=row.source_image_uri.replace("gs://",
-                                                                    "https://storage.mtls.cloud.google.com/"),
-                    incident_image_mime_type=row.source_image_mime_type,
-                    description=row.description,
-                    bus_stop=BusStop(
-                        id=row.bus_stop_id,
-                        address=USAddress(
-                            street=row.address['street'],
-                            city=row.address['city'],
-                            state=row.address['state'],
-                            zip=row.address['zip'])
-                    )
-                ))
+            if len(incidents) > page_size:
+                incidents = incidents[:page_size]
+                next_page_token = incidents[-1].incident_id
         except Exception as ex:
             logger.error("Call to retrieve incidents failed: %s", str(ex))
             return {
                 "status": "error"
             }
 
-    logger.info("Retrieved incidents: %s", incidents)
+    logger.info("Retrieved %i incidents, next page token: '%s'",
+                len(incidents), next_page_token)
     return {
         "status": "success",
-        "bus_stop_incidents": incidents
+        "bus_stop_incidents": incidents,
+        "next_page_token": next_page_token
     }
 
 
-def get_expected_number_of_passengers(bus_stop_ids: list) -> dict:
+async def _get_upcoming_forecasts(
+    bus_stop_ids: List[str]) -> Dict[str, Optional[ForecastSeries]]:
+    """
+      Returns the forecasts of the bus stops for the next three days, None for
+      bus stops without a forecast.
+    """
+    all_bus_stop_series = {}
+    if config.mock_tools:
+        for bus_stop_id in bus_stop_ids:
+            base_number_of_passengers = random.randint(5, 20)
+            start = datetime.now(tz=ZoneInfo('UTC'))
+            all_bus_stop_series[bus_stop_id] = ForecastSeries.from_forecast([
+                (start + timedelta(minutes=next_increment),
+                 base_number_of_passengers + random.randint(3, 10))
+                for next_increment in range(10, 3 * 24 * 60, 15)])
+    else:
+        all_bus_stop_series = await forecast_cache.get_or_forecast(
+            bus_stop_ids, await forecasting_backend.data_version(),
+            _forecast_series)
+        logger.info("Forecast cache stats: %s", forecast_cache.stats())
+
+    now_micros = _now_micros()
+    end_micros = now_micros + timedelta(days=3) // timedelta(microseconds=1)
+    return {bus_stop_id: (series.between(now_micros, end_micros)
+                          if series is not None else None)
+            for bus_stop_id, series in all_bus_stop_series.items()}
+
+
+async def _forecast_series(
+    bus_stop_ids: List[str]) -> Dict[str, ForecastSeries]:
+    new_forecasts = await forecasting_backend.forecast(bus_stop_ids)
+    # Stops without ridership history are cached too, so that they are not
+    # re-forecasted on every call.
+    return {bus_stop_id: ForecastSeries.from_forecast(
+                new_forecasts.get(bus_stop_id, []))
+            for bus_stop_id in bus_stop_ids}
+
+
+def _now_micros() -> int:
+    return (datetime.now(tz=ZoneInfo('UTC')) - EPOCH) // timedelta(
+        microseconds=1)
+
+
+def _time_zone_error(time_zone: str) -> Optional[dict]:
+    try:
+        ZoneInfo(time_zone)
+    except (KeyError, ValueError):
+        return {
+            "status": "error",
+            "message": f"Unknown time zone: {time_zone}"
+        }
+    return None
+
+
+async def get_expected_number_of_passengers(
+    bus_stop_ids: list,
+    response_format: str = "compact",
+    time_zone: str = "America/New_York",
+    quietest_windows: int = 0,
+    window_minutes: int = 60
+) -> dict:
     """Provides expected number of passengers for a particular bus stop at some point in the future.
 
       Args:
           bus_stop_ids: The list of bus stop ids
+          response_format: "compact" lists the expected number of passengers
+            at the regular steps after the start time, "hourly" lists the
+            average number of passengers of every hour, "points" lists every
+            point in time with its number of passengers
+          time_zone: Time zone of the returned times
+          quietest_windows: Number of time windows with the fewest expected
+            passengers to return for every bus stop, 0 for none
+          window_minutes: Length of the quietest time windows
 
       Returns:
-          A dictionary, where the key is the bus stop id  and the value is the list
-          of expected number of passengers at a particular point in time.
+          A dictionary with the forecast of every bus stop, where the key is
+          the bus stop id, and optionally the quietest time windows of every
+          bus stop with the total expected number of passengers of the window.
+          Times are local times in the time zone.
 
       Example:
-          >>> get_expected_number_of_passengers(bus_stop_ids=['bus-stop-1', 'bus-stop-2'])
-          {"bus-stop-1":
-              [{"time": "2025-04-21 18:02:33.463897+00:00", "number_of_passengers":	13},
-              {"time": "2025-04-21 18:07:33.463897+00:00", "number_of_passengers":	15},
-              {"time": "2025-04-21 18:08:33.463897+00:00", "number_of_passengers":	4}],
-          "bus-stop-2":
-              [{"time": "2025-04-21 18:02:33.463897+00:00", "number_of_passengers":	5},
-              {"time": "2025-04-21 18:07:33.463897+00:00", "number_of_passengers":	7},
-              {"time": "2025-04-21 18:08:33.463897+00:00", "number_of_passengers":	10}]
+          >>> get_expected_number_of_passengers(bus_stop_ids=['bus-stop-1', 'bus-stop-2'], quietest_windows=1)
+          {"status": "success", "time_zone": "America/New_York",
+          "forecast": {
+              "bus-stop-1": {"start": "04/21/2025 18:05", "step_minutes": 5, "number_of_passengers": [13, 15, 4]},
+              "bus-stop-2": {"start": "04/21/2025 18:05", "step_minutes": 5, "number_of_passengers": [5, 7, 10]}},
+          "quietest_windows": {
+              "bus-stop-1": [{"start": "04/22/2025 02:00", "end": "04/22/2025 03:00", "number_of_passengers": 0}],
+              "bus-stop-2": [{"start": "04/22/2025 01:00", "end": "04/22/2025 02:00", "number_of_passengers": 0}]}
           }
       """
     logger.info("Retrieving expected number of passengers for %s", bus_stop_ids)
 
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[
-            bigquery.ArrayQueryParameter('bus_stop_ids', "STRING", bus_stop_ids)
-        ]
-    )
+    if response_format not in RESPONSE_FORMATS:
+        return {
+            "status": "error",
+            "message": f"response_format must be one of {RESPONSE_FORMATS}"
+        }
+    time_zone_error = _time_zone_error(time_zone)
+    if time_zone_error:
+        return time_zone_error
+
+    try:
+        all_bus_stop_series = await _get_upcoming_forecasts(bus_stop_ids)
+    except Exception as ex:
+        logger.error("Call to retrieve bus stop ridership failed: %s",
+                     str(ex))
+        return {
+            "status": "error"
+        }
 
     all_bus_stop_forecasts = {}
-    if config.mock_tools:
-        for bus_stop_id in bus_stop_ids:
-            forecast = []
-            base_number_of_passengers = random.randint(5, 20)
-            for next_increment in range(10, 3 * 24 * 60, 15):
-                forecast.append({'time': (
-                    datetime.now(tz=time_zone) + timedelta(
-                    minutes=next_increment)
-                ).isoformat(), 'number_of_passengers': (
-                    base_number_of_passengers + random.randint(3, 10))})
-            all_bus_stop_forecasts[bus_stop_id] = forecast
-    else:
-        try:
-            rows = bigquery_client.query_and_wait(
-                job_config=job_config,
-                project=config.get_bigquery_run_project(),
-                query=f"""
-                WITH forecast AS (
-                    SELECT
-                      bus_stop_id, forecast_timestamp, 
-                      CAST(forecast_value AS INT64) as expected_number_of_passengers
-                    FROM
-                      AI.FORECAST(
-                        (SELECT bus_stop_id, event_ts, num_riders
-                          FROM `{config.get_bigquery_data_project()}.bus_stop_image_processing.bus_ridership`
-                          WHERE bus_stop_id IN UNNEST(@bus_stop_ids)),
-                        data_col => 'num_riders',
-                        timestamp_col => 'event_ts',
-                        model => 'TimesFM 2.0',
-                        id_cols => ['bus_stop_id'],
-                        horizon => 500,
-                        confidence_level => .8)
-                )
-                SELECT bus_stop_id, forecast_timestamp, expected_number_of_passengers 
-                    FROM forecast WHERE forecast_timestamp BETWEEN CURRENT_TIMESTAMP() AND TIMESTAMP_ADD(CURRENT_TIMESTAMP(), INTERVAL 3 DAY) """
-            )
+    all_bus_stop_windows = {}
+    for bus_stop_id, series in all_bus_stop_series.items():
+        if series is None:
+            all_bus_stop_forecasts[bus_stop_id] = (
+                [] if response_format == "points" else {})
+            all_bus_stop_windows[bus_stop_id] = []
+            continue
+        all_bus_stop_forecasts[bus_stop_id] = format_series(
+            series, response_format, time_zone)
+        all_bus_stop_windows[bus_stop_id] = format_windows(
+            series.quietest_windows(window_minutes, quietest_windows),
+            time_zone)
+
+    result = {
+        "status": "success",
+        "time_zone": time_zone,
+        "forecast": all_bus_stop_forecasts
+    }
+    if quietest_windows > 0:
+        result["quietest_windows"] = all_bus_stop_windows
+    return result
+
+
+async def find_maintenance_windows(
+    bus_stop_ids: list,
+    duration_minutes: int,
+    business_hours_only: bool = True,
+    include_weekends: bool = False,
+    business_hours_start: int = 8,
+    business_hours_end: int = 16,
+    earliest_start_minutes: int = 30,
+    number_of_windows: int = 3,
+    time_zone: str = "America/New_York"
+) -> dict:
+    """
+      Finds the maintenance windows which affect the fewest passengers in the
+      next three days, based on the ridership forecast of every bus stop.
 
-            for row in rows:
-                bus_stop_id = row.bus_stop_id
-                forecast = all_bus_stop_forecasts[bus_stop_id] \
-                    if bus_stop_id in all_bus_stop_forecasts else []
-                forecast.append(
-                    {'time': row.forecast_timestamp
-                    .replace(tzinfo=ZoneInfo('UTC')).astimezone(time_zone)
-                    .strftime("%m/%d/%Y %H:%M"),
-                     'number_of_passengers': row.expected_number_of_passengers
-                     })
-                all_bus_stop_forecasts[bus_stop_id] = forecast
+      Windows start at whole hours of the time zone and don't overlap.
 
-        except Exception as ex:
-            logger.error("Call to retrieve bus stop ridership failed: %s",
-                         str(ex))
-            return {
-                "status": "error"
-            }
+      Args:
+          bus_stop_ids: The list of bus stop ids
+          duration_minutes: How long the maintenance takes
+          business_hours_only: Only return windows which start and end within
+            the business hours
+          include_weekends: Set to True to allow windows on Saturdays and
+            Sundays
+          business_hours_start: Hour of the day the business hours start at,
+            e.g. 8 for 8:00 AM
+          business_hours_end: Hour of the day the business hours end at,
+            e.g. 16 for 4:00 PM
+          earliest_start_minutes: Minimum number of minutes from now to the
+            start of a window
+          number_of_windows: Maximum number of windows to return per bus stop
+          time_zone: Time zone of the bus stops, the business hours and the
+            returned times
+
+      Returns:
+          A dictionary, where the key is the bus stop id and the value is the
+          list of the windows, the quietest first, with the total expected
+          number of passengers during the window. A bus stop without
+          forecast or without a window satisfying the constraints has an
+          empty list.
+
+      Example:
+          >>> find_maintenance_windows(bus_stop_ids=['bus-stop-1'], duration_minutes=120, number_of_windows=2)
+          {"status": "success", "time_zone": "America/New_York",
+          "maintenance_windows": {"bus-stop-1": [
+              {"start": "04/22/2025 13:00", "end": "04/22/2025 15:00", "number_of_passengers": 212},
+              {"start": "04/23/2025 10:00", "end": "04/23/2025 12:00", "number_of_passengers": 230}]}}
+      """
+    logger.info("Finding %d minute maintenance windows for %s",
+                duration_minutes, bus_stop_ids)
+
+    if duration_minutes <= 0:
+        return {
+            "status": "error",
+            "message": "duration_minutes must be positive"
+        }
+    time_zone_error = _time_zone_error(time_zone)
+    if time_zone_error:
+        return time_zone_error
+
+    try:
+        all_bus_stop_series = await _get_upcoming_forecasts(bus_stop_ids)
+    except Exception as ex:
+        logger.error("Call to retrieve bus stop ridership failed: %s",
+                     str(ex))
+        return {
+            "status": "error"
+        }
+
+    constraints = MaintenanceWindowConstraints(
+        duration_minutes=duration_minutes,
+        time_zone=time_zone,
+        business_hours_start=(business_hours_start if business_hours_only
+                              else None),
+        business_hours_end=business_hours_end if business_hours_only else None,
+        include_weekends=include_weekends,
+        earliest_start_micros=_now_micros() + timedelta(
+            minutes=earliest_start_minutes) // timedelta(microseconds=1))
+
+    maintenance_windows = {}
+    for bus_stop_id, series in all_bus_stop_series.items():
+        windows = [] if series is None else rank_maintenance_windows(
+            series, constraints, number_of_windows)
+        maintenance_windows[bus_stop_id] = format_windows(windows, time_zone)
 
     return {
         "status": "success",
-        "forecast": all_bus_stop_forecasts
+        "time_zone": time_zone,
+        "maintenance_windows": maintenance_windows
     }
 
 
-def schedule_maintenance(
+async def schedule_maintenance(
     bus_stop_id: str,
     maintenance_start: str,
     reason: str,
@@ -252,23 +492,20 @@ def schedule_maintenance(
         f"because: {reason}, subject: {notification_subject}, content: {notification_content}")
 
     if not config.mock_tools:
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter('bus_stop_id', "STRING",
-                                              bus_stop_id),
-                bigquery.ScalarQueryParameter('maintenance_start', "STRING",
-                                              maintenance_start),
-                bigquery.ScalarQueryParameter('reason', "STRING", reason),
-                bigquery.ScalarQueryParameter('notification_subject', "STRING",
-                                              notification_subject),
-                bigquery.ScalarQueryParameter('notification_content', "STRING",
-                                              notification_content),
-            ]
-        )
+        query_parameters = [
+            bigquery.ScalarQueryParameter('bus_stop_id', "STRING",
+                                          bus_stop_id),
+            bigquery.ScalarQueryParameter('maintenance_start', "STRING",
+                                          maintenance_start),
+            bigquery.ScalarQueryParameter('reason', "STRING", reason),
+            bigquery.ScalarQueryParameter('notification_subject', "STRING",
+                                          notification_subject),
+            bigquery.ScalarQueryParameter('notification_content', "STRING",
+                                          notification_content),
+        ]
         try:
-            bigquery_client.query_and_wait(
-                project=config.get_bigquery_run_project(),
-                job_config=job_config,
+            await bigquery_executor.query(
+                query_parameters=query_parameters,
                 query=f"""
                 UPDATE `{config.get_bigquery_data_project()}.bus_stop_image_processing.incidents`
                 SET status = 'SCHEDULED', 
@@ -289,6 +526,126 @@ def schedule_maintenance(
     return {"status": "success"}
 
 
+async def schedule_maintenance_batch(
+    maintenance_requests: List[MaintenanceRequest]
+) -> dict:
+    """
+      Schedule maintenance of several bus stops at once
+
+      Args:
+          maintenance_requests: The list of maintenance requests, one per bus
+            stop. Each request contains the bus stop id, the date and time of
+            the maintenance work, the reason why the bus stop and time were
+            selected, and the subject and text of the email to send to crew
+            supervisor.
+
+      Returns:
+        status of the scheduling of every bus stop.
+
+      Example:
+          >>> schedule_maintenance_batch([MaintenanceRequest(bus_stop_id='stop-1', maintenance_start="April 2, 2025, at 3:00 PM EST", reason="Broken glass is a safety concern and needs to be cleaned right away.", notification_subject="Bus stop stop-1 maintenance required", notification_content="Notification content")])
+          {'status': 'success', 'results': [{'bus_stop_id': 'stop-1', 'status': 'success'}]}
+      """
+
+    requests = {}
+    results = {}
+    for maintenance_request in maintenance_requests:
+        if isinstance(maintenance_request, dict):
+            maintenance_request = MaintenanceRequest.model_validate(
+                maintenance_request)
+        bus_stop_id = maintenance_request.bus_stop_id
+        if bus_stop_id in results:
+            # A single MERGE can't apply two requests to the same incident.
+            requests.pop(bus_stop_id, None)
+            results[bus_stop_id] = {
+                "bus_stop_id": bus_stop_id,
+                "status": "error",
+                "message": "Bus stop is listed more than once"
+            }
+            continue
+        requests[bus_stop_id] = maintenance_request
+        results[bus_stop_id] = {"bus_stop_id": bus_stop_id,
+                                "status": "success"}
+
+    logger.info("Scheduling maintenance for %s", list(requests))
+
+    if requests and not config.mock_tools:
+        query_parameters = [
+            bigquery.ArrayQueryParameter(
+                'maintenance_requests', "STRUCT", [
+                    bigquery.StructQueryParameter(
+                        None,
+                        bigquery.ScalarQueryParameter(
+                            'bus_stop_id', "STRING", request.bus_stop_id),
+                        bigquery.ScalarQueryParameter(
+                            'maintenance_start', "STRING",
+                            request.maintenance_start),
+                        bigquery.ScalarQueryParameter(
+                            'reason', "STRING", request.reason),
+                        bigquery.ScalarQueryParameter(
+                            'notification_subject', "STRING",
+                            request.notification_subject),
+                        bigquery.ScalarQueryParameter(
+                            'notification_content', "STRING",
+                            request.notification_content))
+                    for request in requests.values()
+                ])
+        ]
+        try:
+            rows = await bigquery_executor.query(
+                query_parameters=query_parameters,
+                query=f"""
+                DECLARE scheduled_bus_stop_ids ARRAY<STRING>;
+
+                BEGIN TRANSACTION;
+
+                SET scheduled_bus_stop_ids = (
+                    SELECT ARRAY_AGG(DISTINCT bus_stop_id)
+                    FROM `{config.get_bigquery_data_project()}.bus_stop_image_processing.incidents`
+                    WHERE status = 'OPEN' AND bus_stop_id IN (
+                        SELECT bus_stop_id FROM UNNEST(@maintenance_requests)));
+
+                MERGE `{config.get_bigquery_data_project()}.bus_stop_image_processing.incidents` AS target
+                USING (SELECT * FROM UNNEST(@maintenance_requests)) AS source
+                ON target.bus_stop_id = source.bus_stop_id AND target.status = 'OPEN'
+                WHEN MATCHED THEN
+                  UPDATE SET status = 'SCHEDULED', 
+                    maintenance_details = STRUCT(
+                    source.maintenance_start as scheduled_time, 
+                    source.reason as reason, 
+                    source.notification_subject as notification_subject, 
+                    source.notification_content as notification_body);
+
+                COMMIT TRANSACTION;
+
+                SELECT bus_stop_id FROM UNNEST(scheduled_bus_stop_ids) AS bus_stop_id;
+                """
+            )
+            scheduled_bus_stop_ids = {row.bus_stop_id for row in rows}
+            for bus_stop_id in requests:
+                if bus_stop_id not in scheduled_bus_stop_ids:
+                    results[bus_stop_id] = {
+                        "bus_stop_id": bus_stop_id,
+                        "status": "error",
+                        "message": "Bus stop has no open incidents"
+                    }
+        except Exception as ex:
+            logger.error("Call to update incidents failed: %s", str(ex))
+            for bus_stop_id in requests:
+                results[bus_stop_id] = {
+                    "bus_stop_id": bus_stop_id,
+                    "status": "error",
+                    "message": "Failed to update incidents"
+                }
+
+    return {
+        "status": "success" if all(
+            result["status"] == "success" for result in results.values())
+        else "error",
+        "results": list(results.values())
+    }
+
+
 def get_current_time() -> str:
     """
       Returns current time
@@ -324,6 +681,7 @@ def is_time_on_weekend(day: int, month: int, year: int) -> bool:
 get_unresolved_incidents_tool = get_unresolved_incidents
 get_expected_number_of_passengers_tool = get_expected_number_of_passengers
 schedule_maintenance_tool = schedule_maintenance
+schedule_maintenance_batch_tool = schedule_maintenance_batch
 
 if config.use_mcp_toolbox:
     if not config.mcp_toolbox_uri:
@@ -333,3 +691,5 @@ if config.use_mcp_toolbox:
     get_unresolved_incidents_tool = toolbox.load_tool('get-unresolved-incidents')
     get_expected_number_of_passengers_tool = toolbox.load_tool('get-expected-number-of-passengers')
     schedule_maintenance_tool = toolbox.load_tool('schedule-maintenance')
+    schedule_maintenance_batch_tool = toolbox.load_tool(
+        'schedule-maintenance-batch')
@@ -0,0 +1,100 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from maintenance_scheduler.tools.bigquery_executor import BigQueryExecutor
+
+
+class FakeJob:
+    def __init__(self, rows, duration_secs):
+        self.job_id = "fake-job"
+        self.rows = rows
+        self.duration_secs = duration_secs
+        self.cancelled = threading.Event()
+
+    def result(self, timeout=None, max_results=None):
+        if self.cancelled.wait(min(self.duration_secs, timeout)):
+            raise RuntimeError("Job cancelled")
+        if self.duration_secs > timeout:
+            raise TimeoutError()
+        return self.rows
+
+    def cancel(self):
+        self.cancelled.set()
+
+
+class FakeClient:
+    def __init__(self, duration_secs, start_secs=0):
+        self.duration_secs = duration_secs
+        self.start_secs = start_secs
+        self.jobs = []
+        self.queries_without_job = []
+
+    def query(self, query, job_config=None, project=None):
+        time.sleep(self.start_secs)
+        job = FakeJob([query], self.duration_secs)
+        self.jobs.append(job)
+        return job
+
+    def query_and_wait(self, query, job_config=None, project=None,
+                       api_timeout=None, wait_timeout=None, max_results=None):
+        self.queries_without_job.append(query)
+        time.sleep(min(self.duration_secs, wait_timeout))
+        return [query]
+
+
+@pytest.mark.asyncio
+async def test_queries_run_concurrently():
+    client = FakeClient(duration_secs=0.2)
+    executor = BigQueryExecutor(client, "project", max_concurrent_queries=4,
+                                default_timeout_secs=5)
+
+    start = time.monotonic()
+    results = await asyncio.gather(
+        *[executor.query(f"SELECT {i}") for i in range(4)])
+
+    assert time.monotonic() - start < 0.6
+    assert results == [[f"SELECT {i}"] for i in range(4)]
+    # Short queries don't need a job
+    assert not client.jobs
+
+
+@pytest.mark.asyncio
+async def test_query_deadline_cancels_job():
+    client = FakeClient(duration_secs=5)
+    executor = BigQueryExecutor(client, "project", max_concurrent_queries=1,
+                                default_timeout_secs=5)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await executor.query("SELECT 1", timeout_secs=0.1, cancellable=True)
+
+    assert client.jobs[0].cancelled.wait(1)
+
+
+@pytest.mark.asyncio
+async def test_query_deadline_cancels_job_created_after_it():
+    client = FakeClient(duration_secs=5, start_secs=0.3)
+    executor = BigQueryExecutor(client, "project", max_concurrent_queries=1,
+                                default_timeout_secs=5)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await executor.query("SELECT 1", timeout_secs=0.1, cancellable=True)
+
+    await asyncio.sleep(0.5)
+    assert client.jobs[0].cancelled.wait(1)
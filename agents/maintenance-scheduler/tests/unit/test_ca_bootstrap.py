@@ -0,0 +1,107 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import weakref
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("google.cloud.geminidataanalytics")
+
+from google.api_core import exceptions
+
+from maintenance_explorer.tools import ca_bootstrap
+
+
+class FakeDataAgentClient:
+    def __init__(self, exists=True):
+        self.exists = exists
+        self.available = True
+        self.lookups = 0
+        self.created = []
+
+    def get_data_agent(self, name):
+        self.lookups += 1
+        if not self.available:
+            raise exceptions.ServiceUnavailable("unavailable")
+        if not self.exists:
+            raise exceptions.NotFound(name)
+
+    def create_data_agent(self, request):
+        self.created.append(request.data_agent_id)
+        self.exists = True
+
+
+@pytest.fixture
+def data_agent_client(monkeypatch):
+    client = FakeDataAgentClient()
+    clock = SimpleNamespace(now=0.)
+    monkeypatch.setattr(ca_bootstrap, "get_data_agent_client", lambda: client)
+    monkeypatch.setattr(ca_bootstrap, "time",
+                        SimpleNamespace(monotonic=lambda: clock.now))
+    monkeypatch.setattr(ca_bootstrap.configs, "ca_agent_cache_ttl_seconds",
+                        60)
+    ca_bootstrap.invalidate_data_agents()
+    client.clock = clock
+    yield client
+    ca_bootstrap.invalidate_data_agents()
+
+
+def test_data_agent_is_checked_once_per_ttl(data_agent_client):
+    for _ in range(3):
+        assert ca_bootstrap.ensure_data_agent("parent", "agent", "name",
+                                              "project")
+    assert data_agent_client.lookups == 1
+
+    data_agent_client.clock.now = 61
+    assert ca_bootstrap.ensure_data_agent("parent", "agent", "name",
+                                          "project")
+    assert data_agent_client.lookups == 2
+
+
+def test_missing_data_agent_is_created_once(data_agent_client):
+    data_agent_client.exists = False
+
+    assert ca_bootstrap.ensure_data_agent("parent", "agent", "name",
+                                          "project")
+    assert ca_bootstrap.ensure_data_agent("parent", "agent", "name",
+                                          "project")
+
+    assert data_agent_client.created == ["agent"]
+    assert data_agent_client.lookups == 1
+
+
+def test_failed_check_is_retried(data_agent_client):
+    data_agent_client.available = False
+    assert not ca_bootstrap.ensure_data_agent("parent", "agent", "name",
+                                              "project")
+
+    data_agent_client.available = True
+    assert ca_bootstrap.ensure_data_agent("parent", "agent", "name",
+                                          "project")
+    assert data_agent_client.lookups == 2
+
+
+@pytest.mark.asyncio
+async def test_async_chat_clients_are_used_in_turn(monkeypatch):
+    monkeypatch.setattr(ca_bootstrap.configs, "ca_chat_client_pool_size", 2)
+    monkeypatch.setattr(ca_bootstrap.geminidataanalytics,
+                        "DataChatServiceAsyncClient", object)
+    monkeypatch.setattr(ca_bootstrap, "_async_chat_clients",
+                        weakref.WeakKeyDictionary())
+
+    clients = [ca_bootstrap.get_async_data_chat_client() for _ in range(3)]
+
+    assert clients[0] is not clients[1]
+    assert clients[2] is clients[0]
@@ -0,0 +1,104 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+pytest.importorskip("vl_convert")
+pytest.importorskip("google.cloud.geminidataanalytics")
+
+from maintenance_explorer.tools import chart_renderer
+from maintenance_explorer.tools.chart_renderer import ChartRenderer
+
+SPEC = {"mark": "bar", "data": {"values": [{"a": 1}]}}
+
+
+class BrokenExecutor(Executor):
+    def submit(self, fn, /, *args, **kwargs):
+        future = Future()
+        future.set_exception(BrokenProcessPool("worker died"))
+        return future
+
+
+@pytest.fixture
+def conversions(monkeypatch):
+    """Converts in threads, counting the conversions."""
+    calls = []
+    lock = threading.Lock()
+
+    def vegalite_to_svg(spec):
+        with lock:
+            calls.append(spec)
+        time.sleep(0.1)
+        return "<svg/>"
+
+    monkeypatch.setattr(chart_renderer.vl_convert, "vegalite_to_svg",
+                        vegalite_to_svg)
+    monkeypatch.setattr(
+        chart_renderer, "ProcessPoolExecutor",
+        lambda max_workers, mp_context: ThreadPoolExecutor(max_workers))
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_rendered_charts_are_cached(conversions):
+    renderer = ChartRenderer()
+
+    first = await renderer.render(SPEC, "svg")
+    # Key order doesn't matter
+    second = await renderer.render(dict(reversed(SPEC.items())), "svg")
+
+    assert first == second
+    assert first.data == b"<svg/>"
+    assert len(conversions) == 1
+    renderer.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_a_conversion(conversions):
+    renderer = ChartRenderer()
+
+    charts = await asyncio.gather(
+        *[renderer.render(SPEC, "svg") for _ in range(3)])
+
+    assert {chart.spec_hash for chart in charts} == {charts[0].spec_hash}
+    assert len(conversions) == 1
+    renderer.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_vega_specs_are_not_converted(conversions):
+    renderer = ChartRenderer()
+
+    chart = await renderer.render(SPEC, "vega")
+
+    assert chart.mime_type == "application/json"
+    assert conversions == []
+
+
+@pytest.mark.asyncio
+async def test_broken_pool_is_replaced(conversions):
+    renderer = ChartRenderer()
+    renderer._executor = BrokenExecutor()
+
+    chart = await renderer.render(SPEC, "svg")
+
+    assert chart.data == b"<svg/>"
+    assert not isinstance(renderer._executor, BrokenExecutor)
+    renderer.shutdown()
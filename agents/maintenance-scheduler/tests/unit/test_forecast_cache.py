@@ -0,0 +1,109 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+
+import pytest
+
+from maintenance_scheduler.tools.forecast_cache import ForecastCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+
+def test_only_missing_stops_are_reported():
+    cache = ForecastCache(ttl_secs=60, max_bus_stops=10)
+    cache.put("stop-1", [1, 2, 3])
+
+    found, missing = cache.get_many(["stop-1", "stop-2"])
+
+    assert found == {"stop-1": [1, 2, 3]}
+    assert missing == ["stop-2"]
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_entries_expire():
+    clock = FakeClock()
+    cache = ForecastCache(ttl_secs=60, max_bus_stops=10, clock=clock)
+    cache.put("stop-1", [1])
+
+    clock.now = 61
+    found, missing = cache.get_many(["stop-1"])
+
+    assert found == {}
+    assert missing == ["stop-1"]
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ForecastCache(ttl_secs=60, max_bus_stops=2)
+    cache.put("stop-1", [1])
+    cache.put("stop-2", [2])
+    cache.get_many(["stop-1"])
+    cache.put("stop-3", [3])
+
+    found, missing = cache.get_many(["stop-1", "stop-2", "stop-3"])
+
+    assert set(found) == {"stop-1", "stop-3"}
+    assert missing == ["stop-2"]
+
+
+def test_new_data_version_invalidates_entries():
+    cache = ForecastCache(ttl_secs=60, max_bus_stops=10)
+    cache.set_data_version(1)
+    cache.put("stop-1", [1])
+
+    cache.set_data_version(1)
+    assert cache.get_many(["stop-1"])[0] == {"stop-1": [1]}
+
+    cache.set_data_version(2)
+    assert cache.get_many(["stop-1"])[1] == ["stop-1"]
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_forecasts_of_an_older_data_version_are_not_stored():
+    cache = ForecastCache(ttl_secs=60, max_bus_stops=10)
+    cache.get_many(["stop-1"], data_version=1)
+    cache.set_data_version(2)
+
+    cache.put("stop-1", [1], data_version=1)
+
+    assert cache.get_many(["stop-1"], data_version=2)[1] == ["stop-1"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_are_forecasted_once():
+    cache = ForecastCache(ttl_secs=60, max_bus_stops=10)
+    requests = []
+
+    async def forecast(bus_stop_ids):
+        requests.append(bus_stop_ids)
+        await asyncio.sleep(0.05)
+        return {bus_stop_id: [bus_stop_id] for bus_stop_id in bus_stop_ids}
+
+    results = await asyncio.gather(
+        cache.get_or_forecast(["stop-1", "stop-2"], 1, forecast),
+        cache.get_or_forecast(["stop-2", "stop-3"], 1, forecast))
+
+    assert results == [{"stop-1": ["stop-1"], "stop-2": ["stop-2"]},
+                       {"stop-2": ["stop-2"], "stop-3": ["stop-3"]}]
+    assert requests == [["stop-1", "stop-2"], ["stop-3"]]
+    assert await cache.get_or_forecast(["stop-2"], 1, forecast) == {
+        "stop-2": ["stop-2"]}
+    assert len(requests) == 2
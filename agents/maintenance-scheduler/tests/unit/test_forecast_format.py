@@ -0,0 +1,92 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+
+import numpy as np
+
+from maintenance_scheduler.tools.forecast_format import (
+    ForecastSeries, format_series, format_windows
+)
+
+# Saturday 2025-03-08 23:00 in New York, the night before daylight saving time
+START = datetime.datetime(2025, 3, 9, 4, tzinfo=datetime.timezone.utc)
+MINUTE = 60 * 1_000_000
+
+
+def forecast(values, step_minutes=15):
+    return [(START + datetime.timedelta(minutes=i * step_minutes), value)
+            for i, value in enumerate(values)]
+
+
+def test_series_from_forecast_with_gap():
+    points = forecast([1, 2, 3, 4])
+    del points[2]
+
+    series = ForecastSeries.from_forecast(points)
+
+    assert series.step_micros == 15 * MINUTE
+    assert np.array_equal(series.values, [1, 2, np.nan, 4], equal_nan=True)
+    assert format_series(series, "compact", "America/New_York") == {
+        "start": "03/08/2025 23:00", "step_minutes": 15,
+        "number_of_passengers": [1, 2, None, 4]}
+
+
+def test_points_follow_daylight_saving_time():
+    series = ForecastSeries.from_forecast(forecast([5] * 16))
+
+    points = format_series(series, "points", "America/New_York")
+
+    assert [point["time"] for point in points[::4]] == [
+        "03/08/2025 23:00", "03/09/2025 00:00", "03/09/2025 01:00",
+        "03/09/2025 03:00"]
+
+
+def test_hourly_averages():
+    series = ForecastSeries.from_forecast(forecast([10, 20, 30, 40, 2, 4]))
+
+    assert format_series(series, "hourly", "America/New_York") == {
+        "start": "03/08/2025 23:00", "step_minutes": 60,
+        "number_of_passengers": [25, 3]}
+    # Hours of India start at half past the UTC hours
+    assert format_series(series, "hourly", "Asia/Kolkata") == {
+        "start": "03/09/2025 09:00", "step_minutes": 60,
+        "number_of_passengers": [15, 19]}
+
+
+def test_quietest_windows_do_not_overlap():
+    series = ForecastSeries.from_forecast(
+        forecast([9, 1, 1, 9, 9, 2, 2, 9, np.nan, 0, 0]))
+
+    windows = series.quietest_windows(window_minutes=30, count=3)
+
+    # The window after the gap is the quietest
+    assert format_windows(windows, "America/New_York") == [
+        {"start": "03/09/2025 01:15", "end": "03/09/2025 01:45",
+         "number_of_passengers": 0},
+        {"start": "03/08/2025 23:15", "end": "03/08/2025 23:45",
+         "number_of_passengers": 2},
+        {"start": "03/09/2025 00:15", "end": "03/09/2025 00:45",
+         "number_of_passengers": 4}]
+
+
+def test_between_trims_to_the_time_range():
+    series = ForecastSeries.from_forecast(forecast([1, 2, 3, 4]))
+    start = series.start_micros
+
+    trimmed = series.between(start + MINUTE, start + 30 * MINUTE)
+
+    assert trimmed.start_micros == start + 15 * MINUTE
+    assert trimmed.values.tolist() == [2, 3]
+    assert series.between(start + 60 * MINUTE, start + 90 * MINUTE) is None
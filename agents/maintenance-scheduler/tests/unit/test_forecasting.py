@@ -0,0 +1,138 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from maintenance_scheduler.shared_libraries.ridership_simulator import \
+    simulate_ridership
+from maintenance_scheduler.tools.forecasting import (
+    LocalForecastingBackend, MaterializedForecastingBackend, RidershipHistory
+)
+
+START = datetime.datetime(2025, 3, 3, 5, tzinfo=datetime.timezone.utc)
+DAYS = 28
+NOW = START + datetime.timedelta(days=DAYS)
+
+
+class FakeStore:
+    def __init__(self, history):
+        self.history = history
+
+    def version(self):
+        return 1
+
+    def load(self):
+        return self.history
+
+
+def make_store(num_bus_stops, interval_minutes=15):
+    chunks = list(simulate_ridership(
+        [f"stop-{i}" for i in range(num_bus_stops)], START, DAYS,
+        interval_minutes=interval_minutes, bus_stops_per_chunk=10000))
+    return FakeStore(RidershipHistory.from_columns(
+        np.concatenate([chunk["bus_stop_id"] for chunk in chunks]),
+        np.concatenate([chunk["event_ts"] for chunk in chunks]),
+        np.concatenate([chunk["num_riders"] for chunk in chunks])))
+
+
+def test_history_grid():
+    history = make_store(3).history
+
+    assert history.bus_stop_ids == ["stop-0", "stop-1", "stop-2"]
+    assert history.interval_micros == 15 * 60 * 1_000_000
+    assert history.values.shape == (3, DAYS * 96)
+
+
+def test_jittered_timestamps_keep_the_grid_interval():
+    event_ts = (np.datetime64("2025-03-03T05:00")
+                + np.arange(0, 4 * 15, 15).astype("timedelta64[m]"))
+    # One row arrives 3 seconds late
+    event_ts[2] += np.timedelta64(3, "s")
+
+    history = RidershipHistory.from_columns(
+        np.array(["stop-1"] * 4), event_ts, np.array([1, 2, 3, 4]))
+
+    assert history.interval_micros == 15 * 60 * 1_000_000
+    assert history.values.tolist() == [[1, 2, 3, 4]]
+
+
+@pytest.mark.parametrize("method", ["seasonal_naive", "holt_winters"])
+def test_forecast_follows_weekly_pattern(method):
+    store = make_store(5)
+    backend = LocalForecastingBackend(store, method=method, clock=lambda: NOW)
+
+    forecasts = backend.forecast_sync(["stop-1", "stop-4", "unknown"])
+
+    assert set(forecasts) == {"stop-1", "stop-4"}
+    forecast = forecasts["stop-1"]
+    assert forecast[0][0] == NOW
+    assert forecast[-1][0] == NOW + datetime.timedelta(days=3)
+    # The same hours of the last week, the forecast starts on a Monday
+    last_week = store.history.values[store.history.index["stop-1"],
+                                     -7 * 96:-4 * 96 + 1]
+    predicted = np.array([value for _, value in forecast])
+    assert np.abs(predicted - last_week).mean() < 3
+    # No riders at night
+    assert predicted[:4 * 6].max() == 0
+
+
+def test_batch_forecast_is_fast():
+    backend = LocalForecastingBackend(make_store(2000), clock=lambda: NOW)
+    bus_stop_ids = [f"stop-{i}" for i in range(2000)]
+
+    started = time.perf_counter()
+    forecasts = backend.forecast_sync(bus_stop_ids)
+    elapsed = time.perf_counter() - started
+
+    assert len(forecasts) == 2000
+    assert elapsed < 1
+
+
+class FakeExecutor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def query(self, query, query_parameters=None):
+        bus_stop_ids = query_parameters[0].values
+        return [row for row in self.rows if row.bus_stop_id in bus_stop_ids]
+
+
+class FakeBackend:
+    def __init__(self):
+        self.requested = []
+
+    async def forecast(self, bus_stop_ids):
+        self.requested.extend(bus_stop_ids)
+        return {bus_stop_id: [(NOW, 1)] for bus_stop_id in bus_stop_ids}
+
+
+@pytest.mark.asyncio
+async def test_materialized_forecasts_fall_back_for_missing_stops():
+    row = SimpleNamespace(bus_stop_id="stop-1",
+                          forecast_timestamp=NOW.replace(tzinfo=None),
+                          expected_number_of_passengers=12)
+    fallback = FakeBackend()
+    backend = MaterializedForecastingBackend(FakeExecutor([row]),
+                                             "project.dataset.forecasts",
+                                             fallback)
+
+    forecasts = await backend.forecast(["stop-1", "stop-2"])
+
+    assert forecasts == {"stop-1": [(NOW, 12)], "stop-2": [(NOW, 1)]}
+    assert fallback.requested == ["stop-2"]
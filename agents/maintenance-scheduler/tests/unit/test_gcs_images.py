@@ -0,0 +1,125 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+
+import pytest
+
+pytest.importorskip("google.cloud.storage")
+pytest.importorskip("google.cloud.geminidataanalytics")
+Image = pytest.importorskip("PIL.Image")
+
+from google.api_core import exceptions
+
+from maintenance_explorer.tools.gcs_images import GcsImageFetcher, \
+    downscale_image
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self._bucket = bucket
+        self._name = name
+        self.generation = None
+        self.content_type = None
+
+    def download_as_bytes(self, if_generation_not_match=None):
+        self._bucket.downloads.append((self._name, if_generation_not_match))
+        if self._name not in self._bucket.objects:
+            raise exceptions.NotFound(self._name)
+        data, generation = self._bucket.objects[self._name]
+        if generation == if_generation_not_match:
+            raise exceptions.NotModified(self._name)
+        self.generation = generation
+        self.content_type = "application/octet-stream"
+        return data
+
+
+class FakeBucket:
+    def __init__(self):
+        self.objects = {}
+        self.downloads = []
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+
+class FakeClient:
+    def __init__(self):
+        self.fake_bucket = FakeBucket()
+
+    def bucket(self, name):
+        return self.fake_bucket
+
+
+@pytest.mark.asyncio
+async def test_unchanged_image_is_served_from_the_cache():
+    client = FakeClient()
+    client.fake_bucket.objects["a.bin"] = (b"1234", 7)
+    fetcher = GcsImageFetcher(client)
+
+    first = await fetcher.fetch("gs://bucket/a.bin")
+    second = await fetcher.fetch("gs://bucket/a.bin")
+
+    assert second is first
+    assert first.generation == 7
+    assert client.fake_bucket.downloads == [("a.bin", None), ("a.bin", 7)]
+
+
+@pytest.mark.asyncio
+async def test_deleted_image_is_evicted():
+    client = FakeClient()
+    client.fake_bucket.objects["a.bin"] = (b"1234", 7)
+    fetcher = GcsImageFetcher(client)
+    await fetcher.fetch("gs://bucket/a.bin")
+
+    del client.fake_bucket.objects["a.bin"]
+
+    assert await fetcher.fetch("gs://bucket/a.bin") is None
+    client.fake_bucket.objects["a.bin"] = (b"5678", 8)
+    image = await fetcher.fetch("gs://bucket/a.bin")
+    assert image.data == b"5678"
+    # The evicted image wasn't revalidated
+    assert client.fake_bucket.downloads[-1] == ("a.bin", None)
+
+
+@pytest.mark.asyncio
+async def test_cache_is_bounded_by_bytes():
+    client = FakeClient()
+    for name in ("a", "b", "c"):
+        client.fake_bucket.objects[name] = (name.encode() * 40, 1)
+    fetcher = GcsImageFetcher(client, max_cache_bytes=100)
+
+    for name in ("a", "b", "c"):
+        await fetcher.fetch(f"gs://bucket/{name}")
+    client.fake_bucket.downloads.clear()
+    for name in ("c", "b", "a"):
+        await fetcher.fetch(f"gs://bucket/{name}")
+
+    # Only the two most recently stored images fit
+    assert client.fake_bucket.downloads == [("c", 1), ("b", 1), ("a", None)]
+
+
+def test_downscaling_applies_the_exif_orientation():
+    image = Image.new("RGB", (400, 200))
+    exif = image.getexif()
+    # Rotated 90 degrees clockwise
+    exif[0x0112] = 6
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", exif=exif)
+
+    data, mime_type = downscale_image(buffer.getvalue(), "image/jpeg", 100)
+
+    assert mime_type == "image/jpeg"
+    with Image.open(io.BytesIO(data)) as downscaled:
+        assert downscaled.size == (50, 100)
@@ -0,0 +1,106 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+geminidataanalytics = pytest.importorskip("google.cloud.geminidataanalytics")
+
+from maintenance_explorer.tools.lakehouse_response import LakehouseResponse
+
+TextType = geminidataanalytics.TextMessage.TextType
+
+
+def text_reply(text_type, *parts):
+    return geminidataanalytics.Message(
+        system_message=geminidataanalytics.SystemMessage(
+            text=geminidataanalytics.TextMessage(parts=list(parts),
+                                                 text_type=text_type)))
+
+
+def data_reply(sql, columns=None, rows=()):
+    data = geminidataanalytics.DataMessage(generated_sql=sql)
+    if columns is not None:
+        # Repeated Struct fields can't be set from dicts
+        result = geminidataanalytics.DataResult.pb()(name="result")
+        for column in columns:
+            result.schema.fields.add(name=column)
+        for row in rows:
+            result.data.add().update(row)
+        data.result = geminidataanalytics.DataResult.wrap(result)
+    return geminidataanalytics.Message(
+        system_message=geminidataanalytics.SystemMessage(data=data))
+
+
+def test_thoughts_are_dropped():
+    response = LakehouseResponse(max_rows=10)
+    response.add(text_reply(TextType.THOUGHT, "Looking at the schema"))
+    response.add(text_reply(TextType.FINAL_RESPONSE, "There are ", "3."))
+
+    assert response.to_dict() == {"status": "success",
+                                  "answer": "There are 3."}
+
+
+def test_progress_is_dropped_and_followup_questions_are_separate():
+    response = LakehouseResponse(max_rows=10)
+    response.add(text_reply(TextType.PROGRESS,
+                            "Retrieving context for the tables."))
+    response.add(text_reply(TextType.FINAL_RESPONSE,
+                            "There are 3 open incidents."))
+    response.add(text_reply(TextType.FINAL_RESPONSE, "All in New York."))
+    response.add(text_reply(TextType.FOLLOWUP_QUESTIONS,
+                            "Which city has the most?"))
+
+    assert response.to_dict() == {
+        "status": "success",
+        "answer": "There are 3 open incidents.\nAll in New York.",
+        "followup_questions": ["Which city has the most?"],
+    }
+
+
+def test_unspecified_texts_are_answers():
+    response = LakehouseResponse(max_rows=10)
+    response.add(text_reply(TextType.TEXT_TYPE_UNSPECIFIED, "3 incidents"))
+
+    assert response.to_dict()["answer"] == "3 incidents"
+
+
+def test_rows_are_capped_and_counted():
+    response = LakehouseResponse(max_rows=2)
+    sql = "SELECT bus_stop_id, riders FROM bus_ridership"
+    response.add(data_reply(sql))
+    response.add(data_reply(sql, ["bus_stop_id", "riders"],
+                            [{"bus_stop_id": f"stop-{i}", "riders": i}
+                             for i in range(5)]))
+
+    result = response.to_dict()
+
+    # The SQL is repeated by the message with the result
+    assert result["sql"] == [sql]
+    assert result["results"] == [{
+        "name": "result",
+        "columns": ["bus_stop_id", "riders"],
+        # Struct numbers are doubles, whole numbers are returned as ints
+        "rows": [["stop-0", 0], ["stop-1", 1]],
+        "total_rows": 5,
+    }]
+
+
+def test_errors_without_answer_fail():
+    response = LakehouseResponse(max_rows=10)
+    response.add(geminidataanalytics.Message(
+        system_message=geminidataanalytics.SystemMessage(
+            error=geminidataanalytics.ErrorMessage(text="Table not found"))))
+
+    assert response.to_dict() == {"status": "error", "answer": "",
+                                  "errors": ["Table not found"]}
@@ -0,0 +1,67 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+
+from maintenance_scheduler.tools.forecast_format import (
+    ForecastSeries, format_windows
+)
+from maintenance_scheduler.tools.maintenance_windows import (
+    MaintenanceWindowConstraints, rank_maintenance_windows
+)
+
+HOUR = 60 * 60 * 1_000_000
+# Friday 2025-02-07 00:00 in New York
+START = 1738904400 * 1_000_000
+
+
+def hourly_series(days=4):
+    hour_of_day = np.arange(days * 24) % 24
+    # Quiet nights, busy rush hours and a quiet early afternoon
+    values = np.select(
+        [hour_of_day < 6, (hour_of_day >= 7) & (hour_of_day <= 9),
+         (hour_of_day >= 13) & (hour_of_day <= 14)],
+        [0., 50., 5.], default=20.)
+    # Mondays are quieter
+    values[3 * 24:] *= .9
+    return ForecastSeries(start_micros=START, step_micros=HOUR, values=values)
+
+
+def test_business_hours_on_weekdays():
+    constraints = MaintenanceWindowConstraints(
+        duration_minutes=120, time_zone="America/New_York",
+        business_hours_start=8, business_hours_end=16,
+        include_weekends=False)
+
+    windows = rank_maintenance_windows(hourly_series(), constraints, count=3)
+
+    assert format_windows(windows, "America/New_York") == [
+        {"start": "02/10/2025 13:00", "end": "02/10/2025 15:00",
+         "number_of_passengers": 9},
+        {"start": "02/07/2025 13:00", "end": "02/07/2025 15:00",
+         "number_of_passengers": 10},
+        {"start": "02/10/2025 10:00", "end": "02/10/2025 12:00",
+         "number_of_passengers": 36}]
+
+
+def test_any_time_after_the_earliest_start():
+    constraints = MaintenanceWindowConstraints(
+        duration_minutes=180, time_zone="America/New_York",
+        earliest_start_micros=START + 3 * 24 * HOUR)
+
+    windows = rank_maintenance_windows(hourly_series(), constraints, count=1)
+
+    assert format_windows(windows, "America/New_York") == [
+        {"start": "02/10/2025 00:00", "end": "02/10/2025 03:00",
+         "number_of_passengers": 0}]
@@ -0,0 +1,119 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from types import SimpleNamespace
+
+from local_search.query_embedding_cache import (
+    BigQueryQueryEmbeddingCache, CachedQueryEmbedder, QueryEmbeddingKey,
+    SQLiteQueryEmbeddingCache, normalize_query_text
+)
+
+
+class FakeJob:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def result(self):
+        return self.rows
+
+
+class FakeClient:
+    def __init__(self):
+        self.queries = []
+
+    def query(self, query, job_config=None):
+        self.queries.append(job_config.query_parameters[0].value)
+        return FakeJob([SimpleNamespace(embedding=[0.5, 0.25], status="")])
+
+
+def test_normalization():
+    assert normalize_query_text("  Broken\n GLASS ") == "broken glass"
+
+
+def test_sqlite_cache_round_trip(tmp_path):
+    cache = SQLiteQueryEmbeddingCache(str(tmp_path / "cache.db"))
+    key = QueryEmbeddingKey("text-embedding-005", "SEMANTIC_SIMILARITY",
+                            "litter")
+
+    assert cache.get(key) is None
+    cache.put(key, [0.1, -0.2, 0.3])
+    assert cache.get(key) == [0.1, -0.2, 0.3]
+    assert cache.get(QueryEmbeddingKey("text-embedding-005", "",
+                                       "litter")) is None
+
+
+def test_repeated_queries_are_embedded_once(tmp_path):
+    client = FakeClient()
+    local_cache = SQLiteQueryEmbeddingCache(str(tmp_path / "cache.db"))
+    embedder = CachedQueryEmbedder(client, "dataset.model",
+                                   "text-embedding-005",
+                                   "SEMANTIC_SIMILARITY", [local_cache])
+
+    assert embedder.embed("Broken glass") == [0.5, 0.25]
+    assert embedder.embed("broken  glass") == [0.5, 0.25]
+
+    # Only the key is normalized, the first spelling is embedded
+    assert client.queries == ["Broken glass"]
+    assert (embedder.hits, embedder.misses) == (1, 1)
+
+
+def test_slower_backend_hits_fill_faster_backends(tmp_path):
+    local_cache = SQLiteQueryEmbeddingCache(str(tmp_path / "local.db"))
+    shared_cache = SQLiteQueryEmbeddingCache(str(tmp_path / "shared.db"))
+    key = QueryEmbeddingKey("text-embedding-005", "SEMANTIC_SIMILARITY",
+                            "graffiti")
+    shared_cache.put(key, [1.0])
+    client = FakeClient()
+    embedder = CachedQueryEmbedder(client, "dataset.model",
+                                   "text-embedding-005",
+                                   "SEMANTIC_SIMILARITY",
+                                   [local_cache, shared_cache])
+
+    assert embedder.embed("Graffiti") == [1.0]
+
+    assert local_cache.get(key) == [1.0]
+    assert client.queries == []
+
+
+class FakeTableClient:
+    """Answers the queries of BigQueryQueryEmbeddingCache from a dict."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def query(self, query, job_config=None):
+        parameters = {parameter.name: parameter.values
+                      if hasattr(parameter, "values") else parameter.value
+                      for parameter in job_config.query_parameters}
+        key = (parameters["model_id"], parameters["task_type"],
+               parameters["normalized_text"])
+        if query.strip().startswith("MERGE"):
+            self.rows.setdefault(key, parameters["embedding"])
+            return FakeJob([])
+        return FakeJob([SimpleNamespace(embedding=self.rows[key])]
+                       if key in self.rows else [])
+
+
+def test_bigquery_cache_round_trip():
+    client = FakeTableClient()
+    cache = BigQueryQueryEmbeddingCache(client, "project.dataset.table")
+    key = QueryEmbeddingKey("multimodalembedding", "", "graffiti")
+
+    assert cache.get(key) is None
+    cache.put(key, [0.5, 1.0])
+    # Entries are only inserted, never replaced
+    cache.put(key, [2.0])
+
+    assert cache.get(key) == [0.5, 1.0]
+    assert client.rows == {("multimodalembedding", "", "graffiti"): [0.5, 1.0]}
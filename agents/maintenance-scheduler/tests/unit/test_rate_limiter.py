@@ -0,0 +1,131 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+from maintenance_scheduler.shared_libraries import callbacks
+from maintenance_scheduler.shared_libraries.rate_limiter import (
+    InMemoryTokenBucketBackend, ModelRateLimiter, SQLiteTokenBucketBackend,
+    TokenBucket
+)
+
+
+@pytest.mark.asyncio
+async def test_bucket_waits_for_refill():
+    bucket = TokenBucket("model:rpm", capacity=2, period_secs=0.2,
+                         backend=InMemoryTokenBucketBackend())
+
+    assert await bucket.acquire() == 0
+    assert await bucket.acquire() == 0
+    assert await bucket.acquire() > 0
+
+
+@pytest.mark.asyncio
+async def test_waiting_yields_event_loop():
+    bucket = TokenBucket("model:rpm", capacity=1, period_secs=0.3,
+                         backend=InMemoryTokenBucketBackend())
+    await bucket.acquire()
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    ticker = asyncio.create_task(tick())
+    await bucket.acquire()
+    ticker.cancel()
+
+    assert ticks > 5
+
+
+def test_sqlite_backend_is_shared(tmp_path):
+    path = str(tmp_path / "buckets.db")
+    first = SQLiteTokenBucketBackend(path)
+    second = SQLiteTokenBucketBackend(path)
+
+    assert first.try_acquire("model:rpm", 1, 1, 1 / 60) == 0
+    assert second.try_acquire("model:rpm", 1, 1, 1 / 60) > 0
+
+
+def test_consumed_tokens_delay_acquisition():
+    backend = InMemoryTokenBucketBackend()
+    backend.consume("model:tpm", 150, capacity=100, refill_per_sec=100)
+
+    # The bucket is 50 tokens in debt and needs 60 tokens to fit the request.
+    assert 0.5 < backend.try_acquire("model:tpm", 10, 100, 100) <= 0.6
+
+
+class SlowBackend(InMemoryTokenBucketBackend):
+    blocking = True
+
+    def try_acquire(self, key, amount, capacity, refill_per_sec):
+        time.sleep(0.2)
+        return super().try_acquire(key, amount, capacity, refill_per_sec)
+
+
+@pytest.mark.asyncio
+async def test_blocking_backend_runs_off_the_event_loop():
+    bucket = TokenBucket("model:rpm", capacity=1, period_secs=1,
+                         backend=SlowBackend())
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    ticker = asyncio.create_task(tick())
+    await bucket.acquire()
+    ticker.cancel()
+
+    assert ticks > 5
+
+
+@pytest.mark.asyncio
+async def test_token_usage_reconciles_the_prompt_estimate():
+    backend = InMemoryTokenBucketBackend()
+    limiter = ModelRateLimiter("model", rpm_quota=10, tpm_quota=1000,
+                               backend=backend)
+    request = LlmRequest(model="model", contents=[
+        types.Content(role="model", parts=[types.Part(
+            function_call=types.FunctionCall(name="tool", args={}))]),
+        types.Content(role="user", parts=[types.Part(
+            function_response=types.FunctionResponse(
+                name="tool", response={"result": "x" * 400}))]),
+    ])
+    context = SimpleNamespace(state={})
+
+    with mock.patch.dict(callbacks.rate_limiters, {"model": limiter}):
+        await callbacks.rate_limit_callback(context, request)
+        estimated = context.state["temp:rate_limit_charged_prompt_tokens"]
+        await callbacks.record_token_usage(context, LlmResponse(
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=300, candidates_token_count=50)))
+
+    # The function response alone is about 100 tokens
+    assert estimated > 100
+    # 300 prompt and 50 generated tokens are charged in total, so a full
+    # bucket is 350 tokens, or 21 seconds, away
+    assert 20.9 < backend.try_acquire("model:tpm", 1000, 1000,
+                                      1000 / 60) <= 21
@@ -0,0 +1,104 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+
+import numpy as np
+import pytest
+
+from maintenance_scheduler.shared_libraries.ridership_simulator import (
+    BusStopProfiles, local_hour_and_weekday, number_of_riders,
+    simulate_ridership, write_dataset
+)
+
+# Monday 2025-03-03 00:00 in New York
+START = datetime.datetime(2025, 3, 3, 5, tzinfo=datetime.timezone.utc)
+
+
+def riders(hour, weekday, busy_in_morning=False, busy_on_weekend=False,
+           temperature=293.15, precipitation=0.):
+    return number_of_riders(
+        base_number_of_riders=np.array([10] * 1000),
+        busy_in_morning=np.array([busy_in_morning] * 1000),
+        busy_in_evening=np.array([False] * 1000),
+        busy_on_weekend=np.array([busy_on_weekend] * 1000),
+        temperature=temperature,
+        precipitation=precipitation,
+        local_hour=np.array([hour]),
+        local_weekday=np.array([weekday]),
+        rng=np.random.default_rng(0))[:, 0]
+
+
+def test_multipliers_match_sql_function():
+    assert (riders(hour=3, weekday=0) == 0).all()
+    # weekday x2 and +-10% variance
+    weekday = riders(hour=12, weekday=2)
+    assert weekday.min() >= 18 and weekday.max() <= 22
+    assert (riders(hour=12, weekday=6) <= 11).all()
+    assert (riders(hour=12, weekday=6, busy_on_weekend=True) >= 27).all()
+    assert (riders(hour=8, weekday=0, busy_in_morning=True) >= 27).all()
+    assert (riders(hour=12, weekday=0, temperature=310) <= 9).all()
+    assert (riders(hour=12, weekday=0, precipitation=1.) <= 11).all()
+
+
+def test_base_number_of_riders_matches_sql_procedure():
+    profiles = BusStopProfiles.generate([f"stop-{i}" for i in range(20000)],
+                                        np.random.default_rng(0))
+    counts = np.bincount(profiles.base_number_of_riders, minlength=21)[10:]
+    assert counts.sum() == 20000
+    # 10 and 20 are half as likely as 11-19
+    assert 0.35 < counts[0] / counts[5] < 0.65
+    assert 0.35 < counts[10] / counts[5] < 0.65
+
+
+def test_local_time_follows_daylight_saving_time():
+    # 2025-03-09 is the first day of daylight saving time in New York
+    timestamps = np.array([
+        datetime.datetime(2025, 3, 8, 17, tzinfo=datetime.timezone.utc),
+        datetime.datetime(2025, 3, 10, 17, tzinfo=datetime.timezone.utc),
+    ]).astype("datetime64[us]").astype(np.int64)
+
+    hour, weekday = local_hour_and_weekday(timestamps, "America/New_York")
+
+    assert hour.tolist() == [12, 13]
+    assert weekday.tolist() == [5, 0]
+
+
+def test_simulation_is_reproducible():
+    bus_stop_ids = [f"stop-{i}" for i in range(5)]
+
+    chunks = list(simulate_ridership(bus_stop_ids, START, days=2, seed=7,
+                                     bus_stops_per_chunk=2))
+    again = list(simulate_ridership(bus_stop_ids, START, days=2, seed=7,
+                                    bus_stops_per_chunk=2))
+
+    assert [len(chunk["num_riders"]) for chunk in chunks] == [1152, 1152, 576]
+    assert chunks[0]["bus_stop_id"][0] == "stop-0"
+    assert chunks[0]["event_ts"][1] - chunks[0]["event_ts"][0] == \
+        np.timedelta64(5, "m")
+    for chunk, chunk_again in zip(chunks, again):
+        np.testing.assert_array_equal(chunk["num_riders"],
+                                      chunk_again["num_riders"])
+
+
+def test_write_parquet_dataset(tmp_path):
+    parquet = pytest.importorskip("pyarrow.parquet")
+
+    rows = write_dataset(
+        simulate_ridership(["stop-1", "stop-2"], START, days=1,
+                           bus_stops_per_chunk=1),
+        str(tmp_path))
+
+    table = parquet.read_table(str(tmp_path))
+    assert rows == table.num_rows == 2 * 288
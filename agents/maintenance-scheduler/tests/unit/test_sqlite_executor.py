@@ -0,0 +1,78 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from benchmarks.local_dataset import create_dataset
+from benchmarks.sqlite_executor import translate
+from maintenance_scheduler.entities.maintenance_request import \
+    MaintenanceRequest
+from maintenance_scheduler.tools import tools
+
+
+def test_translate_qualify_and_timestamps():
+    statement = translate("""
+        SELECT bus_stop_id, forecast_timestamp
+        FROM `project.dataset.ridership_forecasts`
+        WHERE forecast_run_ts >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL @max_age MINUTE)
+            AND bus_stop_id IN UNNEST(@bus_stop_ids)
+        QUALIFY forecast_run_ts = MAX(forecast_run_ts) OVER (PARTITION BY bus_stop_id)
+        ORDER BY bus_stop_id""", arrays={"bus_stop_ids": []}, variables=set())
+
+    assert " ".join(statement.split()) == (
+        'SELECT bus_stop_id, forecast_timestamp FROM (SELECT *, '
+        '(forecast_run_ts = MAX(forecast_run_ts) OVER '
+        '(PARTITION BY bus_stop_id)) AS _qualify '
+        'FROM "ridership_forecasts" '
+        'WHERE forecast_run_ts >= (:_now - :max_age * 60000000) '
+        'AND bus_stop_id IN (SELECT value FROM json_each(:bus_stop_ids))) '
+        'WHERE _qualify ORDER BY bus_stop_id')
+
+
+@pytest.fixture
+def local_tools(monkeypatch):
+    monkeypatch.setattr(tools.config, "mock_tools", False)
+    dataset = create_dataset(200, max_forecast_bus_stops=5)
+    with dataset.patch_tools(dataset.executor()):
+        yield dataset
+    dataset.connection.close()
+
+
+@pytest.mark.asyncio
+async def test_tools_run_against_local_dataset(local_tools):
+    incidents = await tools.get_unresolved_incidents(page_size=5)
+    assert incidents["status"] == "success"
+    assert len(incidents["bus_stop_incidents"]) == 5
+    assert incidents["bus_stop_incidents"][0].bus_stop.address.state
+
+    forecast = await tools.get_expected_number_of_passengers(
+        local_tools.forecast_bus_stop_ids[:2])
+    assert forecast["status"] == "success"
+    assert all(series["number_of_passengers"]
+               for series in forecast["forecast"].values())
+
+    bus_stop_ids = local_tools.incident_bus_stop_ids[:2]
+    result = await tools.schedule_maintenance_batch([
+        MaintenanceRequest(
+            bus_stop_id=bus_stop_id, maintenance_start="April 2, 2025, 3:00 PM",
+            reason="Broken glass", notification_subject="Subject",
+            notification_content="Content")
+        for bus_stop_id in bus_stop_ids + ["stop-without-incidents"]])
+    assert [item["status"] for item in result["results"]] == [
+        "success", "success", "error"]
+    scheduled = local_tools.connection.execute(
+        "SELECT COUNT(*) FROM incidents WHERE status = 'SCHEDULED' "
+        "AND json_extract(maintenance_details, '$.reason') = 'Broken glass'"
+    ).fetchone()[0]
+    assert scheduled == 2
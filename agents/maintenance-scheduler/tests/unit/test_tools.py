@@ -14,8 +14,13 @@
 
 import re
 
+import pytest
+
+from maintenance_scheduler.entities.maintenance_request import \
+    MaintenanceRequest
 from maintenance_scheduler.tools.tools import (
-    get_unresolved_incidents, get_current_time
+    get_unresolved_incidents, get_current_time, schedule_maintenance_batch,
+    get_expected_number_of_passengers, find_maintenance_windows
 )
 from datetime import datetime, timedelta
 import logging
@@ -24,9 +29,36 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def test_get_unresolved_incidents():
-    result = get_unresolved_incidents()
+@pytest.mark.asyncio
+async def test_get_unresolved_incidents():
+    result = await get_unresolved_incidents()
+    assert result["status"] == "success"
+
+
+@pytest.mark.asyncio
+async def test_get_unresolved_incidents_summary():
+    result = await get_unresolved_incidents(include_descriptions=False)
     assert result["status"] == "success"
+    assert all(incident.description is None
+               for incident in result["bus_stop_incidents"])
+
+
+@pytest.mark.asyncio
+async def test_schedule_maintenance_batch_rejects_duplicate_stops():
+    def request(bus_stop_id):
+        return MaintenanceRequest(
+            bus_stop_id=bus_stop_id, maintenance_start="April 2, 2025, 3:00 PM",
+            reason="Broken glass", notification_subject="Subject",
+            notification_content="Content")
+
+    result = await schedule_maintenance_batch(
+        [request("stop-1"), request("stop-2"), request("stop-1")])
+
+    assert result["status"] == "error"
+    assert result["results"] == [
+        {"bus_stop_id": "stop-1", "status": "error",
+         "message": "Bus stop is listed more than once"},
+        {"bus_stop_id": "stop-2", "status": "success"}]
 
 
 def test_get_current_time():
@@ -34,3 +66,31 @@ def test_get_current_time():
     # Expected result: "Wed 09 Jul 2025, 05:25PM"
     pattern = r"^(Mon|Tue|Wed|Thu|Fri|Sat|Sun) \d{2} (Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec) \d{4}, \d{2}:\d{2}(AM|PM)$"
     assert re.match(pattern, result)
+
+
+@pytest.mark.asyncio
+async def test_get_expected_number_of_passengers_compact():
+    result = await get_expected_number_of_passengers(
+        ["stop-1"], response_format="hourly", quietest_windows=2)
+
+    assert result["status"] == "success"
+    forecast = result["forecast"]["stop-1"]
+    assert forecast["step_minutes"] == 60
+    assert len(forecast["number_of_passengers"]) in (72, 73)
+    assert len(result["quietest_windows"]["stop-1"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_find_maintenance_windows_within_business_hours():
+    result = await find_maintenance_windows(
+        ["stop-1", "stop-2"], duration_minutes=120, number_of_windows=2)
+
+    assert result["status"] == "success"
+    for windows in result["maintenance_windows"].values():
+        assert len(windows) == 2
+        for window in windows:
+            start = datetime.strptime(window["start"], "%m/%d/%Y %H:%M")
+            end = datetime.strptime(window["end"], "%m/%d/%Y %H:%M")
+            assert end - start == timedelta(hours=2)
+            assert start.minute < 15 and start.weekday() < 5
+            assert 8 <= start.hour and end.hour <= 16
@@ -0,0 +1,124 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+
+import numpy as np
+import pytest
+
+from local_search.vector_index import VectorIndex
+
+START = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def make_embeddings(count, dimension=32, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = [f"report-{seed}-{i}" for i in range(count)]
+    vectors = rng.normal(size=(count, dimension)).astype(np.float32)
+    created = [START + datetime.timedelta(seconds=i) for i in range(count)]
+    return ids, vectors, created
+
+
+def exact_top_k(vectors, query, k):
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = normalized @ (query / np.linalg.norm(query))
+    return set(np.argsort(-scores)[:k])
+
+
+@pytest.mark.parametrize("quantization", ["float32", "int8"])
+def test_search_finds_nearest_neighbours(tmp_path, quantization):
+    ids, vectors, created = make_embeddings(2000)
+    index = VectorIndex.build(str(tmp_path), ids, vectors, created,
+                              num_lists=16, quantization=quantization)
+    query = vectors[7] + 0.1
+
+    results = index.search(query, top_k=10, num_probes=16)
+
+    expected = {ids[i] for i in exact_top_k(vectors, query, 10)}
+    assert len({r.report_id for r in results} & expected) >= 9
+    assert results[0].report_id == ids[7]
+    assert [r.rank for r in results] == list(range(1, 11))
+    assert all(a.distance <= b.distance
+               for a, b in zip(results, results[1:]))
+
+
+def test_added_embeddings_are_searchable_and_persisted(tmp_path):
+    ids, vectors, created = make_embeddings(200)
+    index = VectorIndex.build(str(tmp_path), ids, vectors, created)
+    new_ids, new_vectors, new_created = make_embeddings(5, seed=1)
+    new_created = [ts + datetime.timedelta(days=1) for ts in new_created]
+
+    assert index.add(new_ids, new_vectors, new_created) == 5
+    assert index.add(new_ids, new_vectors, new_created) == 0
+
+    reopened = VectorIndex(str(tmp_path))
+    assert len(reopened) == 205
+    assert reopened.delta_size == 5
+    assert reopened.watermark == new_created[-1]
+    assert reopened.search(new_vectors[3], top_k=1)[0].report_id == new_ids[3]
+
+
+def test_rebuild_merges_delta(tmp_path):
+    ids, vectors, created = make_embeddings(200)
+    index = VectorIndex.build(str(tmp_path), ids, vectors, created,
+                              quantization="int8")
+    new_ids, new_vectors, new_created = make_embeddings(20, seed=1)
+    index.add(new_ids, new_vectors, new_created)
+
+    index.rebuild()
+
+    assert index.delta_size == 0
+    assert len(VectorIndex(str(tmp_path))) == 220
+    assert index.search(new_vectors[0], top_k=1,
+                        num_probes=100)[0].report_id == new_ids[0]
+
+
+def test_embeddings_added_during_rebuild_are_kept(tmp_path, monkeypatch):
+    ids, vectors, created = make_embeddings(200)
+    index = VectorIndex.build(str(tmp_path), ids, vectors, created)
+    index.add(*make_embeddings(10, seed=1))
+    late_ids, late_vectors, late_created = make_embeddings(3, seed=2)
+    write_main_segment = VectorIndex._write_main_segment
+
+    def write_and_add(_, *args):
+        write_main_segment(*args)
+        index.add(late_ids, late_vectors, late_created)
+
+    monkeypatch.setattr(VectorIndex, "_write_main_segment", write_and_add)
+    index.rebuild()
+
+    assert len(index) == 213
+    assert index.delta_size == 3
+    reopened = VectorIndex(str(tmp_path))
+    assert (len(reopened), reopened.delta_size) == (213, 3)
+    assert sorted(path.name for path in tmp_path.glob("main*")) == [
+        f"main-1_{name}.npy"
+        for name in ("centroids", "created", "ids", "offsets", "vectors")]
+
+
+def test_interrupted_rebuild_doesnt_duplicate_delta(tmp_path, monkeypatch):
+    ids, vectors, created = make_embeddings(200)
+    index = VectorIndex.build(str(tmp_path), ids, vectors, created)
+    index.add(*make_embeddings(10, seed=1))
+
+    def crash(*args):
+        raise OSError("disk full")
+
+    # The new main segment is live, the delta files weren't removed yet
+    monkeypatch.setattr("local_search.vector_index._remove_segment", crash)
+    with pytest.raises(OSError):
+        index.rebuild()
+
+    reopened = VectorIndex(str(tmp_path))
+    assert (len(reopened), reopened.delta_size) == (210, 0)
@@ -0,0 +1,247 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+  Compares bytes scanned by the watermark based and the change-log based
+  versions of the update_incidents procedure.
+
+  The benchmark creates a scratch dataset with a synthetic reports table
+  (10M reports by default) and an incidents table in both layouts:
+
+  * watermark: reports clustered by bus_stop_id, incidents clustered by
+    bus_stop_id; the MERGE reads every report newer than the watermark and
+    joins the whole incidents table.
+  * change log: reports clustered by bus_stop_id, incidents clustered by
+    status and bus_stop_id; the MERGE reads the change log of the newly
+    published reports only.
+
+  Usage:
+      python update_incidents_bytes_scanned.py --project <project-id>
+
+  The dataset is deleted at the end unless --keep-dataset is specified.
+  Creating the synthetic tables processes several GB of data.
+"""
+
+import argparse
+import logging
+
+from google.cloud import bigquery
+
+logger = logging.getLogger(__name__)
+
+CREATE_REPORTS = """
+CREATE OR REPLACE TABLE `{dataset}.all_reports` AS
+WITH numbers AS (
+  SELECT (a - 1) * 10000 + b AS n
+  FROM UNNEST(GENERATE_ARRAY(1, DIV(@num_reports + 9999, 10000))) a,
+       UNNEST(GENERATE_ARRAY(1, 10000)) b
+)
+SELECT
+  GENERATE_UUID() AS report_id,
+  CONCAT('gs://bucket/images/', CAST(n AS STRING), '.jpeg') AS uri,
+  'image/jpeg' AS content_type,
+  -- Reports are spread evenly over the last year, the newest report is the last one
+  TIMESTAMP_SUB(@now, INTERVAL DIV((@num_reports - n) * 365 * 24 * 3600, @num_reports) SECOND) AS image_created,
+  CONCAT('stop-', CAST(MOD(n * 7919, @num_bus_stops) AS STRING)) AS bus_stop_id,
+  'gemini-2.0-flash-lite-001' AS model_used,
+  IF(MOD(n, 5) = 0, 1, 2) AS cleanliness_level,
+  MOD(n, 3) + 1 AS safety_level,
+  REPEAT('The bus stop has a bench and a shelter. ', 8) AS description,
+  MOD(n, 10) AS number_of_people,
+  TRUE AS is_bus_stop,
+  n
+FROM numbers
+WHERE n <= @num_reports
+"""
+
+CREATE_LAYOUTS = """
+CREATE OR REPLACE TABLE `{dataset}.reports_watermark`
+CLUSTER BY bus_stop_id AS
+SELECT * EXCEPT (n) FROM `{dataset}.all_reports`;
+
+-- One incident per bus stop and dirty report of the older history; the last one of each bus stop stays open
+CREATE OR REPLACE TABLE `{dataset}.incidents_base` AS
+SELECT
+  GENERATE_UUID() AS incident_id,
+  bus_stop_id,
+  IF(ROW_NUMBER() OVER (PARTITION BY bus_stop_id ORDER BY image_created DESC) = 1, 'OPEN', 'RESOLVED') AS status,
+  report_id AS open_report_id,
+  CAST(NULL AS STRING) AS resolve_report_id
+FROM `{dataset}.all_reports`
+WHERE cleanliness_level = 1 AND n <= @num_reports - @new_reports;
+
+CREATE OR REPLACE TABLE `{dataset}.incidents_watermark`
+CLUSTER BY bus_stop_id AS
+SELECT * FROM `{dataset}.incidents_base`;
+
+CREATE OR REPLACE TABLE `{dataset}.incidents_change_log`
+CLUSTER BY status, bus_stop_id AS
+SELECT * FROM `{dataset}.incidents_base`;
+
+CREATE OR REPLACE TABLE `{dataset}.report_changes`
+CLUSTER BY bus_stop_id AS
+SELECT report_id, bus_stop_id, image_created, cleanliness_level
+FROM `{dataset}.all_reports`
+WHERE n > @num_reports - @new_reports;
+
+CREATE OR REPLACE TABLE `{dataset}.watermark` AS
+SELECT MAX(image_created) AS process_time
+FROM `{dataset}.all_reports`
+WHERE n <= @num_reports - @new_reports;
+"""
+
+# The MERGE statement of the update_incidents procedure before the change log
+WATERMARK_MERGE = """
+DECLARE last_process_time TIMESTAMP DEFAULT (SELECT process_time FROM `{dataset}.watermark`);
+
+MERGE `{dataset}.incidents_watermark` AS target
+USING (
+  WITH latest_reports AS (
+    SELECT
+      *,
+      ROW_NUMBER() OVER (PARTITION BY bus_stop_id ORDER BY image_created DESC) AS report_number
+    FROM `{dataset}.reports_watermark`
+    WHERE image_created > last_process_time
+  )
+  SELECT
+    lr.bus_stop_id,
+    lr.cleanliness_level >= 2 AS should_resolve,
+    i.incident_id,
+    lr.report_id,
+    i.open_report_id
+  FROM latest_reports lr
+  LEFT JOIN `{dataset}.incidents_watermark` i
+    ON lr.bus_stop_id = i.bus_stop_id
+    AND i.status = "OPEN"
+  WHERE lr.report_number = 1
+) AS source
+ON target.incident_id = source.incident_id
+WHEN MATCHED AND source.should_resolve THEN
+  UPDATE SET status = "RESOLVED", resolve_report_id = source.report_id
+WHEN NOT MATCHED AND NOT source.should_resolve THEN
+  INSERT (incident_id, bus_stop_id, status, open_report_id)
+  VALUES (GENERATE_UUID(), source.bus_stop_id, "OPEN", source.report_id)
+WHEN MATCHED AND NOT source.should_resolve AND target.open_report_id IS NULL THEN
+  UPDATE SET open_report_id = source.report_id;
+"""
+
+# The MERGE statement of the update_incidents procedure driven by the change log
+CHANGE_LOG_MERGE = """
+CREATE TEMP TABLE new_reports AS
+SELECT report_id, bus_stop_id, image_created, cleanliness_level
+FROM `{dataset}.report_changes`;
+
+MERGE `{dataset}.incidents_change_log` AS target
+USING (
+  WITH latest_reports AS (
+    SELECT *
+    FROM new_reports
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY bus_stop_id ORDER BY image_created DESC) = 1
+  ),
+  open_incidents AS (
+    SELECT incident_id, bus_stop_id, open_report_id
+    FROM `{dataset}.incidents_change_log`
+    WHERE status = "OPEN"
+      AND bus_stop_id IN (SELECT bus_stop_id FROM latest_reports)
+  )
+  SELECT
+    lr.bus_stop_id,
+    lr.cleanliness_level >= 2 AS should_resolve,
+    i.incident_id,
+    lr.report_id,
+    i.open_report_id
+  FROM latest_reports lr
+  LEFT JOIN open_incidents i
+    ON lr.bus_stop_id = i.bus_stop_id
+) AS source
+ON target.status = "OPEN" AND target.incident_id = source.incident_id
+WHEN MATCHED AND source.should_resolve THEN
+  UPDATE SET status = "RESOLVED", resolve_report_id = source.report_id
+WHEN NOT MATCHED AND NOT source.should_resolve THEN
+  INSERT (incident_id, bus_stop_id, status, open_report_id)
+  VALUES (GENERATE_UUID(), source.bus_stop_id, "OPEN", source.report_id)
+WHEN MATCHED AND NOT source.should_resolve AND target.open_report_id IS NULL THEN
+  UPDATE SET open_report_id = source.report_id;
+
+DELETE FROM `{dataset}.report_changes`
+WHERE report_id IN (SELECT report_id FROM new_reports);
+"""
+
+
+def run_script(client: bigquery.Client, script: str, dataset: str,
+               query_parameters=None) -> bigquery.QueryJob:
+    job = client.query(
+        script.format(dataset=dataset),
+        job_config=bigquery.QueryJobConfig(
+            query_parameters=query_parameters or []))
+    job.result()
+    return job
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--project", required=True)
+    parser.add_argument("--location", default="us-central1")
+    parser.add_argument("--dataset", default="update_incidents_benchmark")
+    parser.add_argument("--num-reports", type=int, default=10_000_000)
+    parser.add_argument("--num-bus-stops", type=int, default=50_000)
+    parser.add_argument("--new-reports", type=int, default=1_000,
+                        help="Number of reports published since the last "
+                             "run of update_incidents")
+    parser.add_argument("--keep-dataset", action="store_true")
+    args = parser.parse_args()
+
+    client = bigquery.Client(project=args.project, location=args.location)
+    dataset = f"{args.project}.{args.dataset}"
+    dataset_resource = bigquery.Dataset(dataset)
+    dataset_resource.location = args.location
+    client.create_dataset(dataset_resource, exists_ok=True)
+
+    parameters = [
+        bigquery.ScalarQueryParameter("num_reports", "INT64",
+                                      args.num_reports),
+        bigquery.ScalarQueryParameter("num_bus_stops", "INT64",
+                                      args.num_bus_stops),
+        bigquery.ScalarQueryParameter("new_reports", "INT64",
+                                      args.new_reports),
+    ]
+    try:
+        logger.info("Generating %d reports", args.num_reports)
+        run_script(client, CREATE_REPORTS, dataset, parameters + [
+            bigquery.ScalarQueryParameter("now", "TIMESTAMP",
+                                          "2025-01-01 00:00:00+00")])
+        run_script(client, CREATE_LAYOUTS, dataset, parameters)
+
+        results = {}
+        for name, script in [("watermark", WATERMARK_MERGE),
+                             ("change log", CHANGE_LOG_MERGE)]:
+            logger.info("Running %s MERGE", name)
+            job = run_script(client, script, dataset)
+            results[name] = (job.total_bytes_processed,
+                             job.total_bytes_billed, job.slot_millis)
+
+        print(f"{'version':<12}{'bytes processed':>20}{'bytes billed':>20}"
+              f"{'slot ms':>12}")
+        for name, (processed, billed, slot_millis) in results.items():
+            print(f"{name:<12}{processed or 0:>20,}{billed or 0:>20,}"
+                  f"{slot_millis or 0:>12,}")
+    finally:
+        if not args.keep_dataset:
+            client.delete_dataset(dataset, delete_contents=True,
+                                  not_found_ok=True)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
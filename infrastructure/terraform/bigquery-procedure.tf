@@ -36,6 +36,22 @@ resource "google_bigquery_routine" "clean_generate_text_json_response_function"
 
 }
 
+resource "google_bigquery_routine" "normalize_search_terms_function" {
+  dataset_id   = local.dataset_id
+  routine_id   = "normalize_search_terms"
+  routine_type = "SCALAR_FUNCTION"
+  language     = "SQL"
+
+  definition_body = file("${path.module}/bigquery-routines/normalize-search-terms.sql.tftpl")
+
+  arguments {
+    name      = "input"
+    data_type = "{\"typeKind\" :  \"STRING\"}"
+  }
+  return_type = "{\"typeKind\" :  \"STRING\"}"
+
+}
+
 resource "google_bigquery_routine" "process_images_procedure" {
   dataset_id   = local.dataset_id
   routine_id   = "process_images"
@@ -50,8 +66,11 @@ resource "google_bigquery_routine" "process_images_procedure" {
 
   definition_body = templatefile("${path.module}/bigquery-routines/process-images.sql.tftpl", {
     process_watermark_table           = "${local.fq_dataset_id}.${google_bigquery_table.process_watermark.table_id}"
+    staging_table                     = "${local.fq_dataset_id}.${google_bigquery_table.image_processing_staging.table_id}"
+    failures_table                    = "${local.fq_dataset_id}.${google_bigquery_table.image_processing_failures.table_id}"
     images_table                      = "${local.fq_dataset_id}.${google_bigquery_table.images.table_id}"
     reports_table                     = "${local.fq_dataset_id}.${google_bigquery_table.image_reports.table_id}"
+    report_changes_table              = "${local.fq_dataset_id}.${google_bigquery_table.report_changes.table_id}"
     multimodal_model                  = "${local.fq_dataset_id}.${local.default_model_name}"
     text_embeddings_table             = "${local.fq_dataset_id}.${google_bigquery_table.text_embeddings.table_id}"
     text_embeddings_model             = "${local.fq_dataset_id}.${local.text_embedding_model_name}"
@@ -64,6 +83,9 @@ resource "google_bigquery_routine" "process_images_procedure" {
     temperature                       = local.prompt_config.temperature
     max_output_tokens                 = local.prompt_config.max_output_tokens
     clean_generate_text_json_function = "${local.fq_dataset_id}.${google_bigquery_routine.clean_generate_text_json_response_function.routine_id}"
+    chunk_size                        = var.image_processing_chunk_size
+    max_chunks_per_run                = var.image_processing_max_chunks_per_run
+    max_retries                       = var.image_processing_max_retries
   })
 }
 
@@ -73,13 +95,19 @@ resource "google_bigquery_routine" "semantic_search_text_embeddings_tvf" {
   routine_type = "TABLE_VALUED_FUNCTION"
   language     = "SQL"
 
-  depends_on = [time_sleep.wait_for_text_embedding_model_creation]
+  depends_on = [
+    time_sleep.wait_for_text_embedding_model_creation,
+    google_bigquery_routine.normalize_search_terms_function
+  ]
 
   definition_body = templatefile("${path.module}/bigquery-routines/semantic-search-text-embeddings.sql.tftpl", {
-    text_embeddings_table = "${local.fq_dataset_id}.${google_bigquery_table.text_embeddings.table_id}"
-    text_embedding_model  = "${local.fq_dataset_id}.${local.text_embedding_model_name}"
-    reports_table         = "${local.fq_dataset_id}.${google_bigquery_table.image_reports.table_id}"
-    max_number_of_results = 10
+    text_embeddings_table           = "${local.fq_dataset_id}.${google_bigquery_table.text_embeddings.table_id}"
+    text_embedding_model            = "${local.fq_dataset_id}.${local.text_embedding_model_name}"
+    text_embedding_model_id         = var.text_embeddings_vertex_ai_model
+    reports_table                   = "${local.fq_dataset_id}.${google_bigquery_table.image_reports.table_id}"
+    query_embeddings_table          = "${local.fq_dataset_id}.${google_bigquery_table.query_embeddings.table_id}"
+    normalize_search_terms_function = "${local.fq_dataset_id}.${google_bigquery_routine.normalize_search_terms_function.routine_id}"
+    max_number_of_results           = 10
   })
   arguments {
     name          = "search_terms"
@@ -94,13 +122,19 @@ resource "google_bigquery_routine" "semantic_search_multimodal_embeddings_tvf" {
   routine_type = "TABLE_VALUED_FUNCTION"
   language     = "SQL"
 
-  depends_on = [time_sleep.wait_for_multimodal_embedding_model_creation]
+  depends_on = [
+    time_sleep.wait_for_multimodal_embedding_model_creation,
+    google_bigquery_routine.normalize_search_terms_function
+  ]
 
   definition_body = templatefile("${path.module}/bigquery-routines/semantic-search-multimodal-embeddings.sql.tftpl", {
-    multimodal_embeddings_table = "${local.fq_dataset_id}.${google_bigquery_table.multimodal_embeddings.table_id}"
-    multimodal_embedding_model  = "${local.fq_dataset_id}.${local.multimodal_embedding_model_name}"
-    reports_table               = "${local.fq_dataset_id}.${google_bigquery_table.image_reports.table_id}"
-    max_number_of_results       = 10
+    multimodal_embeddings_table     = "${local.fq_dataset_id}.${google_bigquery_table.multimodal_embeddings.table_id}"
+    multimodal_embedding_model      = "${local.fq_dataset_id}.${local.multimodal_embedding_model_name}"
+    multimodal_embedding_model_id   = var.multimodal_embeddings_vertex_ai_model
+    reports_table                   = "${local.fq_dataset_id}.${google_bigquery_table.image_reports.table_id}"
+    query_embeddings_table          = "${local.fq_dataset_id}.${google_bigquery_table.query_embeddings.table_id}"
+    normalize_search_terms_function = "${local.fq_dataset_id}.${google_bigquery_routine.normalize_search_terms_function.routine_id}"
+    max_number_of_results           = 10
   })
   arguments {
     name          = "search_terms"
@@ -109,6 +143,33 @@ resource "google_bigquery_routine" "semantic_search_multimodal_embeddings_tvf" {
   }
 }
 
+resource "google_bigquery_routine" "cache_query_embeddings_procedure" {
+  dataset_id   = local.dataset_id
+  routine_id   = "cache_query_embeddings"
+  routine_type = "PROCEDURE"
+  language     = "SQL"
+
+  depends_on = [
+    time_sleep.wait_for_text_embedding_model_creation,
+    time_sleep.wait_for_multimodal_embedding_model_creation,
+    google_bigquery_routine.normalize_search_terms_function
+  ]
+
+  definition_body = templatefile("${path.module}/bigquery-routines/cache-query-embeddings.sql.tftpl", {
+    text_embedding_model            = "${local.fq_dataset_id}.${local.text_embedding_model_name}"
+    text_embedding_model_id         = var.text_embeddings_vertex_ai_model
+    multimodal_embedding_model      = "${local.fq_dataset_id}.${local.multimodal_embedding_model_name}"
+    multimodal_embedding_model_id   = var.multimodal_embeddings_vertex_ai_model
+    query_embeddings_table          = "${local.fq_dataset_id}.${google_bigquery_table.query_embeddings.table_id}"
+    normalize_search_terms_function = "${local.fq_dataset_id}.${google_bigquery_routine.normalize_search_terms_function.routine_id}"
+  })
+  arguments {
+    name          = "search_terms"
+    argument_kind = "FIXED_TYPE"
+    data_type     = jsonencode({ "typeKind" : "ARRAY", "arrayElementType" : { "typeKind" : "STRING" } })
+  }
+}
+
 resource "google_bigquery_routine" "update_incidents_procedure" {
   dataset_id      = local.dataset_id
   routine_id      = "update_incidents"
@@ -117,7 +178,7 @@ resource "google_bigquery_routine" "update_incidents_procedure" {
   definition_body = templatefile("${path.module}/bigquery-routines/update-incidents-procedure.sql.tftpl", {
     report_watermark_table = "${local.fq_dataset_id}.${google_bigquery_table.report_watermark.table_id}"
     incidents_table        = "${local.fq_dataset_id}.${google_bigquery_table.incidents.table_id}"
-    reports_table          = "${local.fq_dataset_id}.${google_bigquery_table.image_reports.table_id}"
+    report_changes_table   = "${local.fq_dataset_id}.${google_bigquery_table.report_changes.table_id}"
   })
 }
 
@@ -194,4 +255,17 @@ resource "google_bigquery_routine" "forecast_ridership_using_times_fm_model" {
     argument_kind = "FIXED_TYPE"
     data_type     = jsonencode({ "typeKind" : "ARRAY", "arrayElementType": {"typeKind": "STRING"} })
   }
+}
+
+resource "google_bigquery_routine" "materialize_ridership_forecasts" {
+  dataset_id      = local.dataset_id
+  routine_id      = "materialize_ridership_forecasts"
+  routine_type    = "PROCEDURE"
+  language        = "SQL"
+  definition_body = templatefile("${path.module}/bigquery-routines/materialize-ridership-forecasts.sql.tftpl", {
+    bus_ridership_table       = "${local.fq_dataset_id}.${google_bigquery_table.bus_ridership.table_id}"
+    ridership_forecasts_table = "${local.fq_dataset_id}.${google_bigquery_table.ridership_forecasts.table_id}"
+    history_days              = var.ridership_forecast_history_days
+    horizon                   = var.ridership_forecast_horizon
+  })
 }
\ No newline at end of file
@@ -114,6 +114,24 @@ resource "google_bigquery_table" "process_watermark" {
   schema              = file("${path.module}/bigquery-schema/process_watermark.json")
 }
 
+resource "google_bigquery_table" "image_processing_staging" {
+  deletion_protection = false
+  dataset_id          = local.dataset_id
+  table_id            = "image_processing_staging"
+  description         = "Images which are partially processed. Rows are removed once the image is published to the reports table."
+  clustering          = ["uri"]
+  schema              = file("${path.module}/bigquery-schema/image_processing_staging.json")
+}
+
+resource "google_bigquery_table" "image_processing_failures" {
+  deletion_protection = false
+  dataset_id          = local.dataset_id
+  table_id            = "image_processing_failures"
+  description         = "Images which failed to process and the number of attempts made"
+  clustering          = ["uri"]
+  schema              = file("${path.module}/bigquery-schema/image_processing_failures.json")
+}
+
 resource "random_id" "populate_process_watermark_job_id_suffix" {
   byte_length = 4
   keepers     = {
@@ -160,12 +178,21 @@ resource "google_bigquery_job" "populate_report_watermark" {
   location = var.bigquery_dataset_location
 }
 
+resource "google_bigquery_table" "report_changes" {
+  deletion_protection = false
+  dataset_id          = local.dataset_id
+  table_id            = "report_changes"
+  description         = "Reports published by process_images which are not yet processed by update_incidents"
+  clustering          = ["bus_stop_id"]
+  schema              = file("${path.module}/bigquery-schema/report_changes.json")
+}
+
 resource "google_bigquery_table" "incidents" {
   deletion_protection = false
   dataset_id          = local.dataset_id
   table_id            = "incidents"
   description         = "Incidents generated based on the attributes of the processed images"
-  clustering          = ["bus_stop_id"]
+  clustering          = ["status", "bus_stop_id"]
   schema              = file("${path.module}/bigquery-schema/incidents.json")
 
   table_constraints {
@@ -245,6 +272,15 @@ resource "google_bigquery_table" "multimodal_embeddings" {
   }
 }
 
+resource "google_bigquery_table" "query_embeddings" {
+  deletion_protection = false
+  dataset_id          = local.dataset_id
+  table_id            = "query_embeddings"
+  description         = "Cached embeddings of semantic search queries"
+  clustering          = ["model_id", "task_type", "normalized_text"]
+  schema              = file("${path.module}/bigquery-schema/query_embeddings.json")
+}
+
 resource "google_bigquery_table" "bus_stops" {
   deletion_protection = false
   dataset_id          = local.dataset_id
@@ -318,4 +354,19 @@ resource "google_bigquery_table" "bus_ridership" {
   description         = "Number of riders at a particular bus stop"
   clustering          = ["bus_stop_id"]
   schema              = file("${path.module}/bigquery-schema/bus_ridership.json")
+}
+
+resource "google_bigquery_table" "ridership_forecasts" {
+  deletion_protection = false
+  dataset_id          = local.dataset_id
+  table_id            = "ridership_forecasts"
+  description         = "Ridership forecasts of all bus stops produced by materialize_ridership_forecasts"
+  clustering          = ["bus_stop_id"]
+
+  time_partitioning {
+    type          = "HOUR"
+    field         = "forecast_run_ts"
+    expiration_ms = var.ridership_forecast_retention_days * 24 * 60 * 60 * 1000
+  }
+  schema              = file("${path.module}/bigquery-schema/ridership_forecasts.json")
 }
\ No newline at end of file
@@ -36,6 +36,7 @@ resource "google_cloudfunctions2_function" "processing_invoker" {
     google_storage_bucket_object.staged_image_process_invoker,
     google_bigquery_routine.process_images_procedure,
     google_bigquery_routine.update_incidents_procedure,
+    google_bigquery_routine.materialize_ridership_forecasts,
     google_project_iam_member.cloud_function_build_sa_roles
   ]
   name     = "image-processing-invoker"
@@ -53,7 +53,11 @@ resource "google_bigquery_table_iam_member" "data_processor_sa_bigquery_editor"
   for_each = tomap({
     "reports" = google_bigquery_table.image_reports.id,
     "process_watermark" = google_bigquery_table.process_watermark.id,
+    "image_processing_staging" = google_bigquery_table.image_processing_staging.id,
+    "image_processing_failures" = google_bigquery_table.image_processing_failures.id,
     "report_watermark" = google_bigquery_table.report_watermark.id,
+    "report_changes" = google_bigquery_table.report_changes.id,
+    "ridership_forecasts" = google_bigquery_table.ridership_forecasts.id,
     "incidents" = google_bigquery_table.incidents.id,
     "text_embeddings" = google_bigquery_table.text_embeddings.id,
     "multimodal_embeddings" = google_bigquery_table.multimodal_embeddings.id,
@@ -64,4 +64,45 @@ variable "multimodal_embeddings_vertex_ai_model" {
   description = "Name of the multimodal embedding model"
   type = string
   default = "multimodalembedding@001"
-}
\ No newline at end of file
+}
+variable "image_processing_chunk_size" {
+  description = "Maximum number of images processed and published together by the process_images procedure"
+  type = number
+  default = 500
+}
+
+variable "image_processing_max_chunks_per_run" {
+  description = "Maximum number of chunks processed by a single run of the process_images procedure"
+  type = number
+  default = 10
+}
+
+variable "image_processing_max_retries" {
+  description = "Number of attempts to process an image before it's skipped"
+  type = number
+  default = 3
+}
+
+variable "forecast_materialization_schedule" {
+  description = "Schedule of materializing ridership forecasts of all bus stops"
+  default     = "0 */6 * * *"
+  type        = string
+}
+
+variable "ridership_forecast_history_days" {
+  description = "Number of days of ridership history used to forecast ridership"
+  type = number
+  default = 31
+}
+
+variable "ridership_forecast_horizon" {
+  description = "Number of ridership time points to forecast; must cover the 3 day forecast window plus the time between runs"
+  type = number
+  default = 800
+}
+
+variable "ridership_forecast_retention_days" {
+  description = "Number of days materialized forecast runs are kept"
+  type = number
+  default = 3
+}
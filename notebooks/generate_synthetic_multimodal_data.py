@@ -383,6 +383,14 @@ def gen_random_dates(num_dates):
 # The trick here is to use `SubjectReferenceImage` with `subject_description="bus stop"` in order to prime the model to know what it's supposed to be looking at. Then you can prompt it to make the edit by calling `_generate_images`, providing a `reference_images`, and it will generate a new image based on the original "subject" image.
 #
 # Iterating over the collection of input photos cross-joined with the list of prompts specificed above (in the `image_gen_prompts` table) quickly produces a large amount of data that can be used for analysis!
+#
+# Generating thousands of images one at a time takes many hours, so the generation runs as a pipeline of three stages:
+#
+# 1. **Prefetch**: bus stop ids of all source images are assigned with a single statement, and prompts are read once. The resulting plan of (source image, prompt, bus stop, event date) tasks is saved to the checkpoint directory.
+# 2. **Generation**: up to `MAX_CONCURRENT_GENERATIONS` Imagen calls run in parallel. When the model returns a quota error, all workers pause and the call is retried with exponential backoff.
+# 3. **Upload**: generated images are handed over to a separate pool of uploaders so that the generation workers can start on the next task right away.
+#
+# Every uploaded task is recorded in the checkpoint directory. If the notebook is interrupted, re-running the cells below continues with the remaining tasks of the saved plan. Delete the checkpoint directory to start a new plan.
 
 # %% id="ceUict04dZCK"
 import vertexai
@@ -403,98 +411,234 @@ edit_model = ImageGenerationModel.from_pretrained('imagen-3.0-capability-001')
 
 from google.cloud import storage
 from google.cloud import bigquery
-import uuid
 
 storage_client = storage.Client()
 bucket = storage_client.bucket(BUCKET)
 
 bq_client = bigquery.Client(location=LOCATION)
 
-edited_images = []
-
-for image_row in source_images:
-  gcs_uri = image_row.uri
-  image_name = gcs_uri.split('/')[4].split('.')[0]
-  print('processing', image_name)
-
-  # look up the bus stop id
-  bus_stop_id = None
-  sql = f"select bus_stop_id from bus_d2ai.bus_stop_image_mappings where image_name = '{image_name}'"
-  rows = bq_client.query_and_wait(sql)
-  for row in rows:
-    bus_stop_id = row[0]
-
-  if bus_stop_id == None:
-    sql = f"select bus_stop_id from bus_d2ai.bus_stop_image_mappings where image_name is null order by bus_stop_id limit 1"
-    rows = bq_client.query_and_wait(sql)
-    for row in rows:
-      bus_stop_id = row[0]
-
-    if bus_stop_id == None:
-      print('Error finding available bus stop id')
-      quit()
+# %% id="Xk4bT9sWq2Lm"
+MAX_CONCURRENT_GENERATIONS = 4 # @param {type:"integer"}
+MAX_CONCURRENT_UPLOADS = 8 # @param {type:"integer"}
+MAX_GENERATION_ATTEMPTS = 6 # @param {type:"integer"}
+CHECKPOINT_DIR = 'synthetic-generation-checkpoint' # @param {type:"string"}
 
-    sql = f"update bus_d2ai.bus_stop_image_mappings set image_name = '{image_name}' where bus_stop_id = {bus_stop_id}"
-    bq_client.query_and_wait(sql)
-
-  print(f'bus_stop_id {bus_stop_id} assigned to {image_name}')
-
-  # retrieve some number of prompts by sampling the image_gen_prompts table
-  image_prompts = []
-  if DEMO_MODE:
-    sql = f"select prompt_text from bus_d2ai.image_gen_prompts tablesample system ({DEMO_RANGE} percent)"
-  else:
-    sql = f"select prompt_text from bus_d2ai.image_gen_prompts tablesample system ({DEFAULT_RANGE} percent)"
-
-  rows = client.query_and_wait(sql)
-
-  for row in rows:
-    image_prompts.append(row[0])
-  print(f'retrieved {len(image_prompts)} image_prompts:', image_prompts)
+# %% [markdown] id="Hq8nRcV3pZe1"
+# ### Prefetch
+#
+# The bus stop ids are assigned with a single `MERGE`: images which are not yet in `bus_stop_image_mappings` are paired with unassigned bus stops in `bus_stop_id` order, and the mappings of all source images are then read back as a dict. The statement only claims bus stops which are still unassigned, so generators running at the same time can't claim the same bus stop; BigQuery aborts one of two conflicting `MERGE` statements, which is then retried.
+
+# %% id="Pm2yGd7nUw5c"
+import json
+import os
+import random
+import time
+
+from google.api_core import exceptions as api_exceptions
+
+def assign_bus_stop_ids(image_names, max_attempts=5):
+  """Returns a dict of image name to bus_stop_id, assigning free bus stops to unmapped images."""
+  sql = """
+    merge bus_d2ai.bus_stop_image_mappings m
+    using (
+      with unmapped as (
+        select image_name, row_number() over (order by image_name) as n
+        from (select distinct image_name from unnest(@image_names) as image_name)
+        where image_name not in (
+          select image_name from bus_d2ai.bus_stop_image_mappings where image_name is not null)
+      ),
+      free_stops as (
+        select bus_stop_id, row_number() over (order by bus_stop_id) as n
+        from bus_d2ai.bus_stop_image_mappings
+        where image_name is null
+      )
+      select f.bus_stop_id, u.image_name
+      from unmapped u
+      join free_stops f using (n)
+    ) a
+    on m.bus_stop_id = a.bus_stop_id
+    when matched and m.image_name is null then
+      update set image_name = a.image_name;
+
+    select image_name, bus_stop_id
+    from bus_d2ai.bus_stop_image_mappings
+    where image_name in unnest(@image_names);
+  """
+  job_config = bigquery.QueryJobConfig(query_parameters=[
+      bigquery.ArrayQueryParameter('image_names', 'STRING', image_names)
+  ])
+  for attempt in range(max_attempts):
+    try:
+      rows = bq_client.query_and_wait(sql, job_config=job_config)
+      break
+    except api_exceptions.BadRequest as e:
+      if 'concurrent update' not in str(e) or attempt == max_attempts - 1:
+        raise
+      time.sleep(2 ** attempt * random.uniform(1, 2))
+
+  bus_stop_ids = {row.image_name: row.bus_stop_id for row in rows}
+  unassigned = set(image_names) - bus_stop_ids.keys()
+  if unassigned:
+    raise RuntimeError(f'Not enough available bus stop ids for {len(unassigned)} images')
+  return bus_stop_ids
+
+
+def build_generation_plan():
+  """Creates the list of generation tasks: every source image combined with a sample of the prompts."""
+  image_names = {image_row.uri: image_row.uri.split('/')[4].split('.')[0] for image_row in source_images}
+  bus_stop_ids = assign_bus_stop_ids(list(image_names.values()))
+  for gcs_uri, image_name in image_names.items():
+    print(f'bus_stop_id {bus_stop_ids[image_name]} assigned to {image_name}')
+
+  # the prompts table is small, so it's read once and sampled for each image locally
+  all_prompts = [row[0] for row in bq_client.query_and_wait('select prompt_text from bus_d2ai.image_gen_prompts')]
+  sample_percent = DEMO_RANGE if DEMO_MODE else DEFAULT_RANGE
+  sample_size = max(1, round(len(all_prompts) * sample_percent / 100))
+
+  tasks = []
+  for gcs_uri, image_name in image_names.items():
+    # generate random event dates within a date range
+    # want the number of event dates to equal the number of prompts
+    image_prompts = random.sample(all_prompts, sample_size)
+    event_dates = gen_random_dates(len(image_prompts))
+    for prompt, event_date in zip(image_prompts, event_dates):
+      tasks.append({
+          'task_id': len(tasks),
+          'source_image_uri': gcs_uri,
+          'image_gen_prompt': prompt,
+          'bus_stop_id': bus_stop_ids[image_name],
+          'event_date': str(event_date)
+      })
+  return tasks
+
+
+os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+plan_path = os.path.join(CHECKPOINT_DIR, 'plan.json')
+completed_path = os.path.join(CHECKPOINT_DIR, 'completed.txt')
+
+if os.path.exists(plan_path):
+  with open(plan_path) as plan_file:
+    generation_tasks = json.load(plan_file)
+  print(f'loaded the plan of {len(generation_tasks)} tasks from {plan_path}')
+else:
+  generation_tasks = build_generation_plan()
+  with open(plan_path + '.tmp', 'w') as plan_file:
+    json.dump(generation_tasks, plan_file)
+  os.replace(plan_path + '.tmp', plan_path)
+  print(f'saved the plan of {len(generation_tasks)} tasks to {plan_path}')
+
+# %% [markdown] id="Wf6tLs8oYb2D"
+# ### Generate and upload
+#
+# Run this cell again to resume an interrupted run; tasks listed in the checkpoint are skipped.
 
-  # generate random event dates within a date range
-  # want the number of event dates to equal the number of prompts
-  num_dates = len(image_prompts)
-  event_dates = gen_random_dates(num_dates)
-  print(f'generated {len(event_dates)} event_dates:', event_dates)
+# %% id="Rj8vKc1dNa7E"
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-  for i, prompt in enumerate(image_prompts):
+from google.api_core import exceptions as api_exceptions
 
-    event_date = str(event_dates[i])
+RETRYABLE_ERRORS = (
+    api_exceptions.ResourceExhausted,
+    api_exceptions.TooManyRequests,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.DeadlineExceeded,
+)
 
+checkpoint_lock = threading.Lock()
+quota_lock = threading.Lock()
+quota_pause_until = 0.0
+
+def wait_for_quota():
+  while True:
+    with quota_lock:
+      delay = quota_pause_until - time.monotonic()
+    if delay <= 0:
+      return
+    time.sleep(delay)
+
+def pause_for_quota(delay):
+  """Makes all generation workers wait, so that they don't keep hitting the exhausted quota."""
+  global quota_pause_until
+  with quota_lock:
+    quota_pause_until = max(quota_pause_until, time.monotonic() + delay)
+
+def generate_variants(task):
+  ref_image = Image(gcs_uri=task['source_image_uri'])
+  subject = SubjectReferenceImage(image=ref_image, reference_id=1, subject_type='default', subject_description='bus stop')
+
+  for attempt in range(MAX_GENERATION_ATTEMPTS):
+    wait_for_quota()
     try:
-      ref_image = Image(gcs_uri = gcs_uri)
-      raw = RawReferenceImage(image=ref_image, reference_id=1)
-
-      subject = SubjectReferenceImage(image=ref_image, reference_id=1, subject_type='default',  subject_description='bus stop')
-
-      print(f'generating variants for source image {gcs_uri}...')
-      edited_image_response = edit_model._generate_images(
-          prompt=prompt,
+      return edit_model._generate_images(
+          prompt=task['image_gen_prompt'],
           reference_images=[subject],
           number_of_images=1,
           safety_filter_level='block_few',
           person_generation='allow_adult',
           aspect_ratio='4:3'
       )
-
-      edited_image_metadata = {
-          'source_image_uri': gcs_uri,
-          'image_gen_prompt': prompt,
-          'bus_stop_id': bus_stop_id,
-          'event_date': event_date
-      }
-      for edited_image in edited_image_response:
-        edited_image_id = str(bus_stop_id) + '-' + ''.join(str(uuid.uuid4()).split('-')[0:3])
-        edited_image_name = f'{edited_image_id}.jpg'
-        edited_image_metadata.update({ 'image_id': edited_image_id })
-
-        blob = bucket.blob(f'{EDITED_FOLDER}/{event_date}/{edited_image_name}')
-        blob.metadata = edited_image_metadata
-        blob.upload_from_string(edited_image._image_bytes, "image/jpg")
-        print(f'Uploaded edited image {edited_image_name} generated from source image {gcs_uri}')
-
-    except Exception as e:
-      print('image generation or upload failed; skipping {}'.format(e))
-
-
+    except RETRYABLE_ERRORS as e:
+      if attempt == MAX_GENERATION_ATTEMPTS - 1:
+        raise
+      delay = min(2 ** attempt * 5, 120) * random.uniform(0.8, 1.2)
+      print(f'task {task["task_id"]}: {type(e).__name__}, retrying in {delay:.0f}s')
+      if isinstance(e, (api_exceptions.ResourceExhausted, api_exceptions.TooManyRequests)):
+        pause_for_quota(delay)
+      else:
+        time.sleep(delay)
+
+def upload_variants(task, edited_image_response):
+  for edited_image in edited_image_response:
+    edited_image_id = str(task['bus_stop_id']) + '-' + ''.join(str(uuid.uuid4()).split('-')[0:3])
+    edited_image_name = f'{edited_image_id}.jpg'
+    edited_image_metadata = {
+        'source_image_uri': task['source_image_uri'],
+        'image_gen_prompt': task['image_gen_prompt'],
+        'bus_stop_id': task['bus_stop_id'],
+        'event_date': task['event_date'],
+        'image_id': edited_image_id
+    }
+
+    blob = bucket.blob(f'{EDITED_FOLDER}/{task["event_date"]}/{edited_image_name}')
+    blob.metadata = edited_image_metadata
+    blob.upload_from_string(edited_image._image_bytes, "image/jpg")
+    print(f'Uploaded edited image {edited_image_name} generated from source image {task["source_image_uri"]}')
+
+  with checkpoint_lock:
+    with open(completed_path, 'a') as completed_file:
+      completed_file.write(f'{task["task_id"]}\n')
+
+def run_generation_pipeline(tasks):
+  completed = set()
+  if os.path.exists(completed_path):
+    with open(completed_path) as completed_file:
+      completed = {int(line) for line in completed_file if line.strip()}
+  pending = [task for task in tasks if task['task_id'] not in completed]
+  print(f'{len(completed)} tasks already completed, {len(pending)} tasks to run')
+
+  failed = 0
+  with ThreadPoolExecutor(MAX_CONCURRENT_UPLOADS) as upload_pool, \
+       ThreadPoolExecutor(MAX_CONCURRENT_GENERATIONS) as generation_pool:
+    generation_futures = {generation_pool.submit(generate_variants, task): task for task in pending}
+    upload_futures = {}
+    for future in as_completed(generation_futures):
+      task = generation_futures[future]
+      try:
+        upload_futures[upload_pool.submit(upload_variants, task, future.result())] = task
+      except Exception as e:
+        failed += 1
+        print(f'image generation failed for task {task["task_id"]}; skipping {e}')
+
+    for future in as_completed(upload_futures):
+      try:
+        future.result()
+      except Exception as e:
+        failed += 1
+        print(f'image upload failed for task {upload_futures[future]["task_id"]}; skipping {e}')
+
+  print(f'{len(pending) - failed} tasks completed, {failed} tasks failed')
+
+run_generation_pipeline(generation_tasks)
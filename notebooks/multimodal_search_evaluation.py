@@ -190,13 +190,67 @@ image_reports_df.head()
 # %% [markdown] id="WV_sH-wSFyd-"
 # ### Define search helper function
 
+# %% [markdown] id="Vb3kQe8nLc2S"
+# The evaluation runs many searches, often with the same queries. Generating the embedding of the search query is a remote model call, so the following helper caches the query embeddings in the `query_embeddings` table, keyed by the model, the task type and the normalized query text. Repeated evaluation runs reuse the embeddings. Only the key is normalized, the model embeds the query as written.
+
+# %% id="Vb3kQe8nLc2T"
+import re
+import unicodedata
+
+def normalize_query(query:str):
+  return unicodedata.normalize("NFKC", re.sub(r"[\t\n\f\r ]+", " ", query).strip().casefold())
+
+client.query_and_wait("""
+  CREATE TABLE IF NOT EXISTS `multimodal.query_embeddings` (
+    model STRING,
+    task_type STRING,
+    normalized_query STRING,
+    embedding ARRAY<FLOAT64>,
+    created TIMESTAMP
+  )
+  CLUSTER BY model, task_type, normalized_query
+""")
+
+# Embeddings already read in this session
+query_embedding_cache = {}
+
+def get_query_embedding(query:str, model:str = "multimodal.text_embedding_model", task_type:str = "SEMANTIC_SIMILARITY"):
+  key = (model, task_type, normalize_query(query))
+  if key not in query_embedding_cache:
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter("query", "STRING", query),
+        bigquery.ScalarQueryParameter("model", "STRING", model),
+        bigquery.ScalarQueryParameter("task_type", "STRING", task_type),
+        bigquery.ScalarQueryParameter("normalized_query", "STRING", key[2])])
+    cached_embedding_query = """
+      SELECT embedding FROM `multimodal.query_embeddings`
+      WHERE model = @model AND task_type = @task_type AND normalized_query = @normalized_query
+      LIMIT 1
+    """
+    rows = list(client.query_and_wait(cached_embedding_query, job_config=job_config))
+    if not rows:
+      # The model is only called for queries which weren't searched for before
+      embedding_query = f"""
+        INSERT INTO `multimodal.query_embeddings` (model, task_type, normalized_query, embedding, created)
+        SELECT @model, @task_type, @normalized_query, ml_generate_embedding_result, CURRENT_TIMESTAMP()
+        FROM ML.GENERATE_EMBEDDING(
+          MODEL `{model}`,
+          (SELECT @query AS content),
+          STRUCT('{task_type}' as task_type))
+        WHERE ml_generate_embedding_status = '';
+      """ + cached_embedding_query
+      rows = list(client.query_and_wait(embedding_query, job_config=job_config))
+      if not rows:
+        raise RuntimeError(f"Failed to generate the embedding of '{query}'")
+    query_embedding_cache[key] = list(rows[0].embedding)
+  return query_embedding_cache[key]
+
+
 # %% [markdown] id="zP4TMXJaoq8_"
-# Let's define this utility function for semantic search. This function generates the text embedding for the test query using the same `text_embedding_model` (and same task type), then runs the `VECTOR_SEARCH` query against the base table of embeddings for the vectors, that is `reports_vector_db` table. It then appends the authenticated url link to preview the results including the image.
+# Let's define this utility function for semantic search. This function gets the text embedding for the test query, generated by the same `text_embedding_model` (and same task type), then runs the `VECTOR_SEARCH` query against the base table of embeddings for the vectors, that is `reports_vector_db` table. The query embedding is passed to `VECTOR_SEARCH` as a query parameter. It then appends the authenticated url link to preview the results including the image.
 
 # %% id="bz-RnhB921xi"
 def run_semantic_search(query:str, top_k:int):
-  escaped_query = query.replace("'", "''").replace("\\", "\\\\")
-
   search_terms_embeddings_query = f"""
     SELECT
       query.content AS search, distance,
@@ -208,20 +262,16 @@ def run_semantic_search(query:str, top_k:int):
       VECTOR_SEARCH(
         TABLE `multimodal.image_reports_vector_db`,
         'embedding',
-        (
-          SELECT * FROM ML.GENERATE_EMBEDDING(
-          MODEL `multimodal.text_embedding_model`,
-          (
-            SELECT '{escaped_query}' AS content
-          ),
-          STRUCT('SEMANTIC_SIMILARITY' as task_type))
-        ),
-        top_k => {top_k},
+        (SELECT @query AS content, @query_embedding AS embedding),
+        top_k => {int(top_k)},
         distance_type => 'COSINE'
       )
   """
+  job_config = bigquery.QueryJobConfig(query_parameters=[
+      bigquery.ScalarQueryParameter("query", "STRING", query),
+      bigquery.ArrayQueryParameter("query_embedding", "FLOAT64", get_query_embedding(query))])
 
-  return client.query(search_terms_embeddings_query).to_dataframe()
+  return client.query(search_terms_embeddings_query, job_config=job_config).to_dataframe()
 
 
 # %% [markdown] id="H7hMgttCoApZ"
@@ -143,8 +143,11 @@ pd.set_option('display.max_colwidth', None)
 # We will use the following utility functions, in particular `upload_batch`, to copy images into a given Cloud Storage bucket with specific metadata such as bus stop id and the batch number. This is to simulate the real-world scenario of a transit monitoring solution uploading newly captured bus stop images (tagged with the bus stop ID) and in batches over time e.g. daily.
 
 # %% id="cpezuRaaGSm9"
+import concurrent.futures
+import os
 import re
-from typing import List, Dict, Union
+import threading
+from typing import List, Dict, Optional, Union
 from google.cloud import storage
 
 def parse_gcs_uri(uri: str) -> tuple[str, str]:
@@ -163,10 +166,18 @@ def upload_batch(
     batch: List[Dict[str, str]],
     source: str,
     target: str,
-    batch_number: Union[int, str]
+    batch_number: Union[int, str],
+    max_workers: int = 16,
+    manifest_path: Optional[str] = None
 ):
     """
     Copy images from source Cloud Storage location to target with metadata.
+
+    The images are copied server-side using the rewrite API, so the image bytes never pass through
+    this notebook, and several copies run concurrently. Completed copies are recorded, with the
+    generation of the target object, in a manifest file named after the target location and the batch
+    number. Re-running the same batch skips the copies whose target object still has the recorded
+    generation, so an interrupted upload can be resumed.
     """
     from google.api_core.client_info import ClientInfo
     client = storage.Client(client_info=ClientInfo(user_agent=USER_AGENT))
@@ -177,43 +188,70 @@ def upload_batch(
     source_bucket = client.bucket(source_bucket_name)
     target_bucket = client.bucket(target_bucket_name)
 
+    def target_path_of(item: Dict[str, str]) -> str:
+        return f"{target_prefix}/{item['path']}" if target_prefix else item['path']
+
+    if not manifest_path:
+        target_name = re.sub(r'[^A-Za-z0-9_.-]', '_', f"{target_bucket_name}/{target_prefix}")
+        manifest_path = f"upload-manifest-{target_name}-batch-{batch_number}.txt"
+    # Target object name -> generation of the copy
+    completed = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            for line in f:
+                if line.strip():
+                    name, generation = line.rstrip("\n").rsplit("\t", 1)
+                    completed[name] = int(generation)
+    if completed:
+        # Copies which were deleted or overwritten since are made again
+        existing = {blob.name: blob.generation
+                    for blob in client.list_blobs(target_bucket_name, prefix=target_prefix or None)}
+        completed = {name: generation for name, generation in completed.items()
+                     if existing.get(name) == generation}
+    pending = [item for item in batch if target_path_of(item) not in completed]
+    manifest_lock = threading.Lock()
+
+    def copy_item(item: Dict[str, str]):
+        source_path = (
+            f"{source_prefix}/{item['path']}" if source_prefix
+            else item['path']
+        )
+        target_path = target_path_of(item)
+
+        source_blob = source_bucket.get_blob(source_path)
+        if source_blob is None:
+            raise FileNotFoundError(f"Source file {source_path} not found")
+
+        # Prepare target blob with metadata; the rewrite applies it to the copy
+        target_blob = target_bucket.blob(target_path)
+        target_blob.metadata = {
+            "batch_number": f"batch-{batch_number}",
+            **{k: str(v) for k, v in item.items() if k != "path"}
+        }
+        # The destination resource replaces the source metadata, including the content type
+        target_blob.content_type = source_blob.content_type
+
+        # Large objects or copies across locations can take several rewrite calls
+        token, _, _ = target_blob.rewrite(source_blob)
+        while token is not None:
+            token, _, _ = target_blob.rewrite(source_blob, token=token)
+
+        with manifest_lock:
+            with open(manifest_path, "a") as f:
+                f.write(f"{target_path}\t{target_blob.generation}\n")
+
+    print(f"Copying {len(pending)} images, {len(batch) - len(pending)} already copied")
     count = 0
-    for item in batch:
-        try:
-            source_path = (
-                f"{source_prefix}/{item['path']}" if source_prefix
-                else item['path']
-            )
-            target_path = (
-                f"{target_prefix}/{item['path']}" if target_prefix
-                else item['path']
-            )
-
-            # Get source blob
-            source_blob = source_bucket.blob(source_path)
-            if not source_blob.exists():
-                raise FileNotFoundError(f"Source file {source_path} not found")
-
-            # Download the image bytes
-            image_bytes = source_blob.download_as_bytes()
-
-            # Prepare target blob with metadata
-            target_blob = target_bucket.blob(target_path)
-            target_blob.metadata = {
-                "batch_number": f"batch-{batch_number}",
-                **{k: str(v) for k, v in item.items() if k != "path"}
-            }
-
-            # Upload bytes
-            target_blob.upload_from_string(
-                image_bytes,
-                content_type=source_blob.content_type
-            )
-            count += 1
-            print(f"({count}/{len(batch)}) Uploaded: {item['path']}")
-
-        except Exception as e:
-            print("Error processing {item['path']}: {str(e)}")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(copy_item, item): item for item in pending}
+        for future in concurrent.futures.as_completed(futures):
+            item = futures[future]
+            try:
+                future.result()
+                count += 1
+                print(f"({count}/{len(pending)}) Uploaded: {item['path']}")
+            except Exception as e:
+                print(f"Error processing {item['path']}: {str(e)}")
 
 
 
@@ -923,14 +961,68 @@ OPTIONS (index_type = 'IVF', distance_type = 'COSINE')
 # %% [markdown] id="WV_sH-wSFyd-"
 # ### Define search helper function
 
+# %% [markdown] id="Qc7vRm2eKb1S"
+# Generating the embedding of the search query is a remote model call, which adds to the latency of every search. The following helper caches the query embeddings in the `query_embeddings` table, keyed by the model, the task type and the normalized query text, so repeated searches reuse the embedding, also in later runs of the notebook. Only the key is normalized, the model embeds the query as written.
+
+# %% id="Qc7vRm2eKb1T"
+import re
+import unicodedata
+
+def normalize_query(query:str):
+  return unicodedata.normalize("NFKC", re.sub(r"[\t\n\f\r ]+", " ", query).strip().casefold())
+
+client.query_and_wait("""
+  CREATE TABLE IF NOT EXISTS `multimodal.query_embeddings` (
+    model STRING,
+    task_type STRING,
+    normalized_query STRING,
+    embedding ARRAY<FLOAT64>,
+    created TIMESTAMP
+  )
+  CLUSTER BY model, task_type, normalized_query
+""")
+
+# Embeddings already read in this session
+query_embedding_cache = {}
+
+def get_query_embedding(query:str, model:str = "multimodal.text_embedding_model", task_type:str = "SEMANTIC_SIMILARITY"):
+  key = (model, task_type, normalize_query(query))
+  if key not in query_embedding_cache:
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter("query", "STRING", query),
+        bigquery.ScalarQueryParameter("model", "STRING", model),
+        bigquery.ScalarQueryParameter("task_type", "STRING", task_type),
+        bigquery.ScalarQueryParameter("normalized_query", "STRING", key[2])])
+    cached_embedding_query = """
+      SELECT embedding FROM `multimodal.query_embeddings`
+      WHERE model = @model AND task_type = @task_type AND normalized_query = @normalized_query
+      LIMIT 1
+    """
+    rows = list(client.query_and_wait(cached_embedding_query, job_config=job_config))
+    if not rows:
+      # The model is only called for queries which weren't searched for before
+      embedding_query = f"""
+        INSERT INTO `multimodal.query_embeddings` (model, task_type, normalized_query, embedding, created)
+        SELECT @model, @task_type, @normalized_query, ml_generate_embedding_result, CURRENT_TIMESTAMP()
+        FROM ML.GENERATE_EMBEDDING(
+          MODEL `{model}`,
+          (SELECT @query AS content),
+          STRUCT('{task_type}' as task_type))
+        WHERE ml_generate_embedding_status = '';
+      """ + cached_embedding_query
+      rows = list(client.query_and_wait(embedding_query, job_config=job_config))
+      if not rows:
+        raise RuntimeError(f"Failed to generate the embedding of '{query}'")
+    query_embedding_cache[key] = list(rows[0].embedding)
+  return query_embedding_cache[key]
+
+
 # %% [markdown] id="zP4TMXJaoq8_"
-# Let's define this utility function for semantic search. This function generates the text embedding for the test query using the same `text_embedding_model` (and same task type), then runs the `VECTOR_SEARCH` query against the base table of embeddings for the vectors, that is `image_reports_vector_db` table. It then appends the authenticated url link to preview the results including the image.
+# Let's define this utility function for semantic search. This function gets the text embedding for the test query, generated by the same `text_embedding_model` (and same task type), then runs the `VECTOR_SEARCH` query against the base table of embeddings for the vectors, that is `image_reports_vector_db` table. The query embedding is passed to `VECTOR_SEARCH` as a query parameter. It then appends the authenticated url link to preview the results including the image.
 
 # %% id="bz-RnhB921xi"
 def run_semantic_search(query:str):
-  escaped_query = query.replace("'", "''").replace("\\", "\\\\")
-
-  search_terms_embeddings_query = f"""
+  search_terms_embeddings_query = """
     SELECT
       query.content AS search, distance,
       base.report_id, base.bus_stop_id, base.uri, base.description,
@@ -940,20 +1032,16 @@ def run_semantic_search(query:str):
       VECTOR_SEARCH(
         TABLE `multimodal.image_reports_vector_db`,
         'embedding',
-        (
-          SELECT * FROM ML.GENERATE_EMBEDDING(
-          MODEL `multimodal.text_embedding_model`,
-          (
-            SELECT '{escaped_query}' AS content
-          ),
-          STRUCT('SEMANTIC_SIMILARITY' as task_type))
-        ),
+        (SELECT @query AS content, @query_embedding AS embedding),
         top_k => 3,
         distance_type => 'COSINE'
       )
   """
+  job_config = bigquery.QueryJobConfig(query_parameters=[
+      bigquery.ScalarQueryParameter("query", "STRING", query),
+      bigquery.ArrayQueryParameter("query_embedding", "FLOAT64", get_query_embedding(query))])
 
-  return client.query(search_terms_embeddings_query).to_dataframe()
+  return client.query(search_terms_embeddings_query, job_config=job_config).to_dataframe()
 
 
 # %% [markdown] id="KP6cPK0fpMMM"
@@ -1001,7 +1089,6 @@ HTML(search_results_df[['bus_stop_id', 'uri', 'distance', 'image', 'description'
 
 # %% id="x0d3wxxPtbQD"
 def run_hybrid_search(query:str, keyword:str):
-  escaped_query = query.replace("'", "''").replace("\\", "\\\\")
   escaped_keyword = keyword.replace("'", "''").replace("\\", "\\\\")
 
   search_terms_embeddings_query = f"""
@@ -1014,20 +1101,16 @@ def run_hybrid_search(query:str, keyword:str):
       VECTOR_SEARCH(
         (SELECT * FROM `multimodal.image_reports_vector_db` WHERE SEARCH(description, '`{escaped_keyword}`')),
         'embedding',
-        (
-          SELECT * FROM ML.GENERATE_EMBEDDING(
-          MODEL `multimodal.text_embedding_model`,
-          (
-            SELECT '{escaped_query}' AS content
-          ),
-          STRUCT('SEMANTIC_SIMILARITY' as task_type))
-        ),
+        (SELECT @query AS content, @query_embedding AS embedding),
         top_k => 3,
         distance_type => 'COSINE'
       )
   """
+  job_config = bigquery.QueryJobConfig(query_parameters=[
+      bigquery.ScalarQueryParameter("query", "STRING", query),
+      bigquery.ArrayQueryParameter("query_embedding", "FLOAT64", get_query_embedding(query))])
 
-  return client.query(search_terms_embeddings_query).to_dataframe()
+  return client.query(search_terms_embeddings_query, job_config=job_config).to_dataframe()
 
 
 # %% [markdown] id="Bc-DOScOEgpB"
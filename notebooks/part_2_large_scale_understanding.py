@@ -175,50 +175,304 @@ generation_config = GenerationConfig(
 
 model = GenerativeModel(model_name='gemini-2.0-flash-lite-001', generation_config=generation_config)
 
+# %% [markdown] id="Lr6wQe2nTbXa"
+# Calling the model for one image at a time is fine for a handful of images, but it takes hours for thousands of them. The report runner below has two modes:
+#
+# * **Online**: images are processed concurrently. The number of concurrent requests adapts to the available quota: it grows by one after every `limit` successful requests and is halved when the model returns a quota error (additive increase, multiplicative decrease).
+# * **Batch prediction**: for large backfills, the requests are written to a BigQuery table and processed by a [Vertex AI batch prediction job](https://cloud.google.com/vertex-ai/generative-ai/docs/multimodal/batch-prediction-from-bigquery), which doesn't consume the online request quota.
+#
+# Parsed reports are buffered and streamed to `image_reports` in batches. Responses which can't be parsed or inserted are saved to the `image_report_dead_letters` table for review.
+#
+# `WRITE_REPORTS` is unchecked by default because the next step loads the pre-generated reports; the runner then prints the reports and the dead letters instead of inserting them.
+
 # %% id="mnGIWSqv3gcq"
 from google.cloud import bigquery, storage
+from google.api_core import exceptions as api_exceptions
 from google.api_core.client_info import ClientInfo
-import time, json, pprint
-
-client = bigquery.Client(client_info=ClientInfo(user_agent=USER_AGENT))
-
-ot_sql = f'select * from `multimodal.objects` order by updated desc limit 1'
-query_job = client.query(ot_sql)
-rows = query_job.result()
-
-for i, image in enumerate(rows):
-  # including small delay to avoid potential quota issues
-  time.sleep(3)
+import datetime, time, json, pprint, random, threading
+from concurrent.futures import ThreadPoolExecutor
 
-  image_metadata = { m['name']:m['value'] for m in image.metadata }
-  if 'image_gen_prompt' in image_metadata:
-    image_metadata.pop('image_gen_prompt')
-  if 'source_image_uri' in image_metadata:
-    image_metadata.pop('source_image_uri')
+IMAGE_LIMIT = 1 # @param {type:"integer"}
+WRITE_REPORTS = False # @param {type:"boolean"}
+# image counts at or above this threshold are processed with batch prediction
+BATCH_PREDICTION_THRESHOLD = 1000 # @param {type:"integer"}
+INITIAL_CONCURRENCY = 4 # @param {type:"integer"}
+MAX_CONCURRENCY = 32 # @param {type:"integer"}
+MAX_ATTEMPTS = 5
 
-  prompt_image = Part.from_uri(image.uri, image.content_type)
+client = bigquery.Client(client_info=ClientInfo(user_agent=USER_AGENT))
 
-  prompt = [image_reports_prompt_text, prompt_image]
+images_sql = f'select * from `multimodal.objects` order by updated desc limit {IMAGE_LIMIT}'
+
+if WRITE_REPORTS:
+  client.query_and_wait("""
+    CREATE TABLE IF NOT EXISTS `multimodal.image_report_dead_letters` (
+      uri STRING,
+      response STRING,
+      error STRING,
+      created TIMESTAMP
+    )
+  """)
+
+
+class AdaptiveConcurrencyLimiter:
+  """Limits the number of concurrent requests, adapting the limit to quota errors (AIMD)."""
+
+  def __init__(self, initial_limit, max_limit, decrease_interval=2.0):
+    self.limit = initial_limit
+    self.max_limit = max_limit
+    # quota errors of requests which were already in flight are counted as one decrease
+    self.decrease_interval = decrease_interval
+    self._active = 0
+    self._successes = 0
+    self._last_decrease = 0.0
+    self._condition = threading.Condition()
+
+  def __enter__(self):
+    with self._condition:
+      while self._active >= self.limit:
+        self._condition.wait()
+      self._active += 1
+
+  def __exit__(self, *exc_info):
+    with self._condition:
+      self._active -= 1
+      self._condition.notify_all()
+
+  def on_success(self):
+    with self._condition:
+      self._successes += 1
+      if self._successes >= self.limit and self.limit < self.max_limit:
+        self.limit += 1
+        self._successes = 0
+        self._condition.notify_all()
+
+  def on_throttle(self):
+    with self._condition:
+      now = time.monotonic()
+      if now - self._last_decrease >= self.decrease_interval:
+        self.limit = max(1, self.limit // 2)
+        self._last_decrease = now
+      self._successes = 0
+
+
+class BufferedRowWriter:
+  """Streams rows to a BigQuery table in batches of up to max_rows or every max_delay seconds."""
+
+  def __init__(self, table_id, max_rows=500, max_delay=5.0, dry_run=False, on_error=None):
+    self.table_id = table_id
+    self.max_rows = max_rows
+    self.max_delay = max_delay
+    self.dry_run = dry_run
+    self.on_error = on_error
+    self._rows = []
+    self._last_flush = time.monotonic()
+    self._lock = threading.Lock()
+
+  def add(self, row):
+    with self._lock:
+      self._rows.append(row)
+      if len(self._rows) < self.max_rows and time.monotonic() - self._last_flush < self.max_delay:
+        return
+      rows, self._rows = self._rows, []
+      self._last_flush = time.monotonic()
+    self._insert(rows)
+
+  def flush(self):
+    with self._lock:
+      rows, self._rows = self._rows, []
+      self._last_flush = time.monotonic()
+    self._insert(rows)
+
+  def _insert(self, rows):
+    if not rows:
+      return
+    if self.dry_run:
+      for row in rows:
+        pprint.pp(row)
+      return
+    try:
+      errors = client.insert_rows_json(self.table_id, rows)
+    except Exception as e:
+      errors = [{'index': i, 'errors': str(e)} for i in range(len(rows))]
+    for error in errors:
+      if self.on_error:
+        self.on_error(rows[error['index']], str(error['errors']))
+      else:
+        print(f'failed to insert a row into {self.table_id}: {error["errors"]}')
+
+
+dead_letters = BufferedRowWriter('multimodal.image_report_dead_letters', dry_run=not WRITE_REPORTS)
+
+def add_dead_letter(uri, response, error):
+  dead_letters.add({
+      'uri': uri,
+      'response': response if isinstance(response, str) else json.dumps(response),
+      'error': error,
+      'created': datetime.datetime.now(datetime.timezone.utc).isoformat()
+  })
+
+report_writer = BufferedRowWriter(
+    'multimodal.image_reports',
+    dry_run=not WRITE_REPORTS,
+    on_error=lambda row, error: add_dead_letter(row['uri'], row, f'insert failed: {error}'))
+
+
+def build_report_row(uri, metadata, response_text):
+  image_metadata = { m['name']:m['value'] for m in metadata }
+  image_metadata.pop('image_gen_prompt', None)
+  image_metadata.pop('source_image_uri', None)
+
+  json_response = json.loads(response_text)
+  bq_row = { **json_response, **image_metadata }
+
+  # the Gemini response schema and the object metadata mostly match our table,
+  # but we still need to rename and/or remove a couple things
+  bq_row['updated'] = bq_row.pop('event_date') + " 00:00"
+  bq_row['report_id'] = bq_row.pop('image_id')
+  bq_row['uri'] = uri
+  return bq_row
+
+
+def add_report(uri, metadata, response_text):
   try:
-    response = model.generate_content(prompt)
-    json_response = json.loads(response.text)
+    bq_row = build_report_row(uri, metadata, response_text)
+  except (ValueError, KeyError, TypeError) as e:
+    add_dead_letter(uri, response_text, f'{type(e).__name__}: {e}')
+    return False
+  report_writer.add(bq_row)
+  return True
 
-    bq_row = { **json_response, **image_metadata }
 
-    # the Gemini response schema and the object metadata mostly match our table,
-    # but we still need to rename and/or remove a couple things
-    bq_row['updated'] = bq_row.pop('event_date') + " 00:00"
-    bq_row['report_id'] = bq_row.pop('image_id')
-    bq_row['uri'] = image.uri
+# %% [markdown] id="Vt3kYc8mWpQs"
+# ### Online mode
 
-    pprint.pp(bq_row)
+# %% id="Ua5rNd2fKe8b"
+QUOTA_ERRORS = (api_exceptions.ResourceExhausted, api_exceptions.TooManyRequests)
+RETRYABLE_ERRORS = QUOTA_ERRORS + (api_exceptions.ServiceUnavailable, api_exceptions.DeadlineExceeded)
 
-    # if you're using a script like this to generate data, this is where you
-    # might insert the synthetic record into the BQ table.
-    #client.insert_rows_json(client.get_table('multimodal.image_reports'), [bq_row])
+limiter = AdaptiveConcurrencyLimiter(INITIAL_CONCURRENCY, MAX_CONCURRENCY)
 
-  except Exception as e:
-    print(e)
+def generate_report(image):
+  prompt_image = Part.from_uri(image.uri, image.content_type)
+  prompt = [image_reports_prompt_text, prompt_image]
+
+  for attempt in range(MAX_ATTEMPTS):
+    with limiter:
+      try:
+        response = model.generate_content(prompt)
+      except RETRYABLE_ERRORS as e:
+        if isinstance(e, QUOTA_ERRORS):
+          limiter.on_throttle()
+        if attempt == MAX_ATTEMPTS - 1:
+          raise
+      else:
+        limiter.on_success()
+        break
+    time.sleep(min(2 ** attempt, 60) * random.uniform(0.5, 1.5))
+
+  return add_report(image.uri, image.metadata, response.text)
+
+def generate_reports_online(images):
+  succeeded = failed = 0
+  with ThreadPoolExecutor(MAX_CONCURRENCY) as pool:
+    futures = [(image, pool.submit(generate_report, image)) for image in images]
+    for image, future in futures:
+      try:
+        if future.result():
+          succeeded += 1
+        else:
+          failed += 1
+      except Exception as e:
+        failed += 1
+        add_dead_letter(image.uri, None, f'generation failed: {e}')
+  report_writer.flush()
+  dead_letters.flush()
+  print(f'{succeeded} reports generated, {failed} sent to the dead letter table, final concurrency {limiter.limit}')
+
+
+# %% [markdown] id="Ng3sHyk7MfRw"
+# ### Batch prediction mode
+#
+# The batch prediction job reads the requests from the `image_report_requests` table and writes the responses to the `image_report_predictions` table. Columns other than `request` are copied to the output, so the responses can be matched with the image metadata. Batch jobs typically finish within a few hours, and the cell below waits for the job to complete.
+
+# %% id="Ye3wHk9cPq5z"
+from vertexai.batch_prediction import BatchPredictionJob
+
+def to_api_schema(schema):
+  """Converts the response schema to the REST representation used in batch requests."""
+  if isinstance(schema, dict):
+    return {k: v.upper() if k == 'type' else to_api_schema(v) for k, v in schema.items()}
+  return schema
+
+def generate_reports_batch():
+  requests_table = f'{PROJECT_ID}.multimodal.image_report_requests'
+  predictions_table = f'{PROJECT_ID}.multimodal.image_report_predictions'
+
+  batch_generation_config = {
+      'candidateCount': 1,
+      'maxOutputTokens': 1024,
+      'responseMimeType': 'application/json',
+      'responseSchema': to_api_schema(response_schema)
+  }
+  client.query_and_wait(f"""
+    CREATE OR REPLACE TABLE `{requests_table}` AS
+    SELECT
+      uri,
+      TO_JSON_STRING(metadata) AS metadata,
+      JSON_OBJECT(
+        'contents', [JSON_OBJECT(
+          'role', 'user',
+          'parts', [
+            JSON_OBJECT('text', @prompt),
+            JSON_OBJECT('fileData', JSON_OBJECT('fileUri', uri, 'mimeType', content_type))
+          ])],
+        'generationConfig', PARSE_JSON(@generation_config)
+      ) AS request
+    FROM ({images_sql})
+  """, job_config=bigquery.QueryJobConfig(query_parameters=[
+      bigquery.ScalarQueryParameter('prompt', 'STRING', image_reports_prompt_text),
+      bigquery.ScalarQueryParameter('generation_config', 'STRING', json.dumps(batch_generation_config))
+  ]))
+  client.query_and_wait(f'DROP TABLE IF EXISTS `{predictions_table}`')
+
+  job = BatchPredictionJob.submit(
+      source_model='gemini-2.0-flash-lite-001',
+      input_dataset=f'bq://{requests_table}',
+      output_uri_prefix=f'bq://{predictions_table}'
+  )
+  print(f'submitted batch prediction job {job.resource_name}')
+  while not job.has_ended:
+    time.sleep(60)
+    job.refresh()
+  if not job.has_succeeded:
+    raise RuntimeError(f'batch prediction job failed: {job.error}')
+
+  succeeded = failed = 0
+  for row in client.query_and_wait(f'SELECT uri, metadata, response, status FROM `{predictions_table}`'):
+    response = json.loads(row.response) if isinstance(row.response, str) else row.response
+    try:
+      response_text = response['candidates'][0]['content']['parts'][0]['text']
+    except (KeyError, IndexError, TypeError):
+      add_dead_letter(row.uri, response, f'prediction failed: {row.status}')
+      failed += 1
+      continue
+    if add_report(row.uri, json.loads(row.metadata), response_text):
+      succeeded += 1
+    else:
+      failed += 1
+  report_writer.flush()
+  dead_letters.flush()
+  print(f'{succeeded} reports generated, {failed} sent to the dead letter table')
+
+
+# %% id="Jc2sFv7hRz4m"
+images = list(client.query_and_wait(images_sql))
+
+if len(images) >= BATCH_PREDICTION_THRESHOLD:
+  generate_reports_batch()
+else:
+  generate_reports_online(images)
 
 
 # %% [markdown] id="FBGqU4eTroVz"
@@ -23,6 +23,8 @@ function print_usage_and_exit() {
   echo "Usage: ./upload-batch.sh <batch-metadata>"
   echo "Batch metadata is a multi-line text file, every row is the image URL and the bus stop name, space separated."
   echo "Image URL can be either a local file or any object that can be used as a source of 'gcloud storage cp' command."
+  echo "Images are copied concurrently, UPLOAD_PARALLELISM environment variable sets the number of concurrent copies (default 8)."
+  echo "Copied rows are recorded in <batch-metadata>.done; re-running the script skips them."
   exit 1
 }
 
@@ -31,11 +33,29 @@ if [[ "$#" -ne 1 ]]; then
 fi
 
 filename=$1
+manifest="${filename}.done"
+parallelism=${UPLOAD_PARALLELISM:-8}
 
-while IFS=' ' read -ra COLUMNS; do
-  source=${COLUMNS[0]}
-  bus_stop_id=${COLUMNS[1]}
+function copy_row() {
+  local source=$1
+  local bus_stop_id=$2
+  local destination
   destination=$(basename "$source")
 
-  ./copy-image.sh "$source" "$destination" "$bus_stop_id"
-done < "$filename"
+  # Copies between buckets are done server-side by 'gcloud storage cp'.
+  # 'set -e' isn't inherited by the xargs subshells, so only successful
+  # copies are recorded.
+  ./copy-image.sh "$source" "$destination" "$bus_stop_id" || return 1
+  # Single short line appends are atomic, so concurrent copies can share the manifest
+  echo "$source $bus_stop_id" >> "$manifest"
+}
+export -f copy_row
+export manifest
+
+touch "$manifest"
+# xargs exits with 123 if any copy failed
+if ! grep -v -x -F -f "$manifest" "$filename" \
+  | xargs -P "$parallelism" -L 1 bash -c 'copy_row "$@"' _; then
+  echo "Some images failed to copy. Re-run the script to retry them." >&2
+  exit 1
+fi